@@ -1,26 +1,37 @@
 import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 
 from fastapi import FastAPI
-from tortoise.contrib.fastapi import register_tortoise
+from tortoise.contrib.fastapi import RegisterTortoise
 
+from consulta_pj.client import ClientPool
+from consulta_pj.db_service import migrate, tortoise_config, write_buffer
+from consulta_pj.handler import LitiganteJobs
 from consulta_pj.settings import get_settings
 
-from .routers import causas_router, healthcheck_router, litigantes_router, statistics_router
+from .routers import causas_router, healthcheck_router, jobs_router, litigantes_router, statistics_router
 
 logging.basicConfig(level=logging.INFO)
 
 settings = get_settings()
-app = FastAPI(title=settings.app_title)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    async with orm:
+        await migrate()
+        # Concurrent requests persist their causas through one write buffer
+        async with write_buffer(), ClientPool.from_settings(settings), LitiganteJobs.from_settings(settings):
+            yield
+
+
+app = FastAPI(title=settings.app_title, lifespan=lifespan)
 
 app.include_router(healthcheck_router)
 app.include_router(statistics_router)
 app.include_router(litigantes_router)
 app.include_router(causas_router)
+app.include_router(jobs_router)
 
-register_tortoise(
-    app,
-    db_url=settings.db_uri,
-    modules={"models": ["consulta_pj.db_service.models"]},
-    generate_schemas=True,
-    add_exception_handlers=True,
-)
+orm = RegisterTortoise(app, config=tortoise_config(settings), add_exception_handlers=True)
@@ -1,22 +1,51 @@
+from .cache import ResponseCache
+from .cassette import Cassette
 from .client import ProcesosJudicialesClient, ProcesosJudicialesClientException
+from .limiter import AdaptiveLimiter
+from .pool import ClientPool, client_pool, get_client_pool
+from .rate import RateBudget
+from .retry import RetryBudget
+from .scheduler import upstream_priority
 from .schemas import (
     ActuacionesRequest,
     ActuacionesResponse,
+    CacheStats,
+    CassetteMode,
+    CassetteReplayTiming,
     CausaActor,
     CausaDemandado,
     CausasRequest,
     CausasResponse,
     IncidenteSchema,
     JudicaturaSchema,
+    Lane,
+    LaneStats,
+    LimiterStats,
     LitiganteSchema,
     MovimientoSchema,
     MovimientosResponse,
+    RateBudgetStats,
+    SingleFlightStats,
+    UpstreamStats,
     get_actuaciones_request,
 )
+from .singleflight import SingleFlight
 
 __all__ = [
+    "AdaptiveLimiter",
+    "Cassette",
+    "CassetteMode",
+    "CassetteReplayTiming",
+    "ClientPool",
+    "client_pool",
+    "get_client_pool",
+    "upstream_priority",
     "ProcesosJudicialesClient",
     "ProcesosJudicialesClientException",
+    "RateBudget",
+    "ResponseCache",
+    "RetryBudget",
+    "SingleFlight",
     "ActuacionesRequest",
     "CausaActor",
     "CausaDemandado",
@@ -29,4 +58,11 @@ __all__ = [
     "MovimientoSchema",
     "get_actuaciones_request",
     "ActuacionesResponse",
+    "CacheStats",
+    "Lane",
+    "LaneStats",
+    "LimiterStats",
+    "RateBudgetStats",
+    "SingleFlightStats",
+    "UpstreamStats",
 ]
@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+from .schemas import CacheStats
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS response_cache (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS response_cache_last_access ON response_cache (last_access);
+"""
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        path: str,
+        ttls: dict[str, float],
+        max_size_bytes: int = 512 * 1024 * 1024,
+        dormant_after_days: int | None = None,
+        dormant_ttl: float | None = None,
+    ) -> None:
+        self.path = path
+        self.ttls = ttls
+        self.max_size_bytes = max_size_bytes
+        self.dormant_after_days = dormant_after_days
+        self.dormant_ttl = dormant_ttl
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._size_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._revalidated = 0
+        self._evictions = 0
+
+    @staticmethod
+    def make_key(method: str, url: str, data: str | None) -> str:
+        return hashlib.sha256(f"{method} {url}\n{data or ''}".encode()).hexdigest()
+
+    def is_cacheable(self, endpoint: str) -> bool:
+        return endpoint in self.ttls
+
+    def get_ttl(self, endpoint: str, last_activity: datetime | None = None) -> float:
+        ttl = self.ttls[endpoint]
+        if self.dormant_after_days is None or self.dormant_ttl is None or last_activity is None:
+            return ttl
+        if last_activity.tzinfo is None:
+            last_activity = last_activity.replace(tzinfo=timezone.utc)
+        age_days = (datetime.now(timezone.utc) - last_activity).days
+        return max(ttl, self.dormant_ttl) if age_days >= self.dormant_after_days else ttl
+
+    async def open(self) -> None:
+        await asyncio.to_thread(self._open)
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self._close)
+
+    async def get(self, key: str) -> bytes | None:
+        payload = await asyncio.to_thread(self._get, key)
+        if payload is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        return payload
+
+    async def set(self, key: str, endpoint: str, payload: bytes, last_activity: datetime | None = None) -> None:
+        ttl = self.get_ttl(endpoint, last_activity)
+        await asyncio.to_thread(self._set, key, endpoint, payload, ttl)
+
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            hits=self._hits,
+            misses=self._misses,
+            expired=self._expired,
+            revalidated=self._revalidated,
+            evictions=self._evictions,
+            size_bytes=self._size_bytes,
+        )
+
+    def _open(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                return
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(SCHEMA)
+            (size,) = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM response_cache").fetchone()
+            self._size_bytes = size
+
+    def _close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _get(self, key: str) -> bytes | None:
+        with self._lock:
+            connection = self._get_connection()
+            row = connection.execute(
+                "SELECT payload, expires_at FROM response_cache WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            payload, expires_at = row
+            now = time.time()
+            if expires_at <= now:
+                self._expired += 1
+                return None
+            connection.execute("UPDATE response_cache SET last_access = ? WHERE key = ?", (now, key))
+        return zlib.decompress(payload)
+
+    def _set(self, key: str, endpoint: str, payload: bytes, ttl: float) -> None:
+        compressed = zlib.compress(payload)
+        now = time.time()
+        with self._lock:
+            connection = self._get_connection()
+            row = connection.execute("SELECT payload, size FROM response_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                previous_payload, previous_size = row
+                self._size_bytes -= previous_size
+                if previous_payload == compressed:
+                    self._revalidated += 1
+            connection.execute(
+                "INSERT OR REPLACE INTO response_cache "
+                "(key, endpoint, payload, size, stored_at, expires_at, last_access) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, endpoint, compressed, len(compressed), now, now + ttl, now),
+            )
+            self._size_bytes += len(compressed)
+            self._evict()
+
+    def _evict(self) -> None:
+        connection = self._get_connection()
+        while self._size_bytes > self.max_size_bytes:
+            rows = connection.execute(
+                "SELECT key, size FROM response_cache ORDER BY last_access LIMIT 100",
+            ).fetchall()
+            if not rows:
+                self._size_bytes = 0
+                return
+            for key, size in rows:
+                if self._size_bytes <= self.max_size_bytes:
+                    return
+                connection.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                self._size_bytes -= size
+                self._evictions += 1
+
+    def _get_connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            raise RuntimeError("La caché de respuestas no está abierta")
+        return self._connection
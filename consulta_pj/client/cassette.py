@@ -0,0 +1,70 @@
+import asyncio
+import gzip
+import time
+from collections import deque
+
+import orjson
+
+from .schemas import CassetteMode, CassetteReplayTiming, RecordedExchange
+
+
+class Cassette:
+    def __init__(
+        self, path: str, mode: CassetteMode, timing: CassetteReplayTiming = CassetteReplayTiming.NONE
+    ) -> None:
+        self.path = path
+        self.mode = mode
+        self.timing = timing
+        self._exchanges: dict[tuple[str, str, str], deque[RecordedExchange]] = {}
+        self._file: gzip.GzipFile | None = None
+        self._started_at = 0.0
+        self._recorded = 0
+
+    @property
+    def recorded(self) -> int:
+        return self._recorded
+
+    async def open(self) -> None:
+        if self.mode == CassetteMode.RECORD:
+            self._file = gzip.open(self.path, "ab")
+            self._started_at = time.monotonic()
+        else:
+            await asyncio.to_thread(self._load)
+
+    async def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def record(self, method: str, url: str, data: str | None, status: int, payload: bytes, elapsed: float) -> None:
+        if self._file is None:
+            raise RuntimeError("El cassette no está abierto para grabar")
+        exchange = RecordedExchange(
+            method=method,
+            url=url,
+            data=data,
+            status=status,
+            payload=payload.decode(),
+            elapsed=elapsed,
+            offset=time.monotonic() - self._started_at - elapsed,
+        )
+        self._file.write(orjson.dumps(exchange.model_dump()) + b"\n")
+        self._recorded += 1
+
+    async def replay(self, method: str, url: str, data: str | None) -> RecordedExchange:
+        exchanges = self._exchanges.get((method, url, data or ""))
+        if not exchanges:
+            raise KeyError(f"No hay una respuesta grabada para {method} {url}")
+        # Repeated requests consume the recordings in order and keep serving the last one
+        exchange = exchanges.popleft() if len(exchanges) > 1 else exchanges[0]
+        if self.timing == CassetteReplayTiming.ORIGINAL:
+            await asyncio.sleep(exchange.elapsed)
+        return exchange
+
+    def _load(self) -> None:
+        self._exchanges = {}
+        with gzip.open(self.path, "rb") as f:
+            for line in f:
+                exchange = RecordedExchange(**orjson.loads(line))
+                key = (exchange.method, exchange.url, exchange.data or "")
+                self._exchanges.setdefault(key, deque()).append(exchange)
@@ -1,40 +1,63 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
 from types import TracebackType
-from typing import Self
+from typing import AsyncIterator, Self
 from urllib.parse import urlencode
 
 import aiohttp
-import orjson
 
+from consulta_pj.settings import get_settings
+
+from .cache import ResponseCache
+from .cassette import Cassette
+from .decoding import decode_actuaciones, decode_causas, decode_movimientos
+from .limiter import AdaptiveLimiter
+from .pool import ClientPool
+from .rate import RateBudget
+from .retry import RetryBudget
 from .schemas import (
     ActuacionesRequest,
     ActuacionesResponse,
+    CassetteMode,
     CausasRequest,
     CausasRequestBody,
     CausasResponse,
     ContarCausasRequest,
     MovimientosResponse,
 )
+from .singleflight import SingleFlight
 
 
 class ProcesosJudicialesClientException(Exception):
-    pass
+    def __init__(self, message: str, status: int | None = None) -> None:
+        super().__init__(message)
+        self.status = status
 
 
 class WebClient:
     API_URL: str = ""
     BASE_HEADERS: dict[str, str] = dict()
 
-    def __init__(self) -> None:
+    def __init__(self, pool: ClientPool | None = None) -> None:
+        self.pool = pool
         self.session: aiohttp.ClientSession | None = None
 
     def get_headers(self) -> dict[str, str]:
         return self.BASE_HEADERS
 
     async def __aenter__(self) -> Self:
-        self.session = await aiohttp.ClientSession(
-            headers=self.get_headers(),
-            raise_for_status=self._check_status,
-        ).__aenter__()
+        if self.pool is None:
+            session = aiohttp.ClientSession(headers=self.get_headers(), raise_for_status=self._check_status)
+        else:
+            session = aiohttp.ClientSession(
+                connector=self.pool.connector,
+                connector_owner=False,
+                headers=self.get_headers(),
+                raise_for_status=self._check_status,
+            )
+        self.session = await session.__aenter__()
         return self
 
     async def __aexit__(
@@ -48,7 +71,6 @@ class WebClient:
 
 
 class ProcesosJudicialesClient(WebClient):
-    API_URL = "https://api.funcionjudicial.gob.ec/EXPEL-CONSULTA-CAUSAS-SERVICE/api/consulta-causas/informacion/"
     BASE_HEADERS = {
         "User-Agent": "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:127.0) Gecko/20100101 Firefox/127.0",
         "Accept": "application/json, text/plain, */*",
@@ -65,51 +87,183 @@ class ProcesosJudicialesClient(WebClient):
         "Referer": "https://procesosjudiciales.funcionjudicial.gob.ec/",
     }
 
+    def __init__(self, pool: ClientPool | None = None) -> None:
+        super().__init__(pool)
+        settings = get_settings()
+        self.api_url = settings.UPSTREAM_API_URL
+        self.clex_api_url = settings.UPSTREAM_CLEX_API_URL
+        self.limiter = pool.limiter if pool else AdaptiveLimiter()
+        self.cache: ResponseCache | None = pool.cache if pool else None
+        self.singleflight: SingleFlight[bytes] = pool.singleflight if pool else SingleFlight()
+        self.cassette: Cassette | None = pool.cassette if pool else None
+        self.rate_budget: RateBudget | None = pool.rate_budget if pool else None
+        self.retry_budget = RetryBudget(
+            max_retries=settings.UPSTREAM_MAX_RETRIES,
+            base_delay=settings.UPSTREAM_RETRY_BASE_DELAY,
+            max_delay=settings.UPSTREAM_RETRY_MAX_DELAY,
+            budget_ratio=settings.UPSTREAM_RETRY_BUDGET_RATIO,
+            budget_min=settings.UPSTREAM_RETRY_BUDGET_MIN,
+        )
+        self._causas_last_activity: dict[str, datetime] = {}
+
     async def _check_status(self, response: aiohttp.ClientResponse) -> None:
         if response.status >= 400:
-            raise ProcesosJudicialesClientException(f"Error en la petición: {response.status} - {response.reason}")
+            raise ProcesosJudicialesClientException(
+                f"Error en la petición: {response.status} - {response.reason}", status=response.status
+            )
 
-    async def get_contar_causas(self, request: ContarCausasRequest) -> int:
+    async def _request(
+        self, method: str, url: str, endpoint: str, data: str | None = None, causa_id: str | None = None
+    ) -> bytes:
+        key = ResponseCache.make_key(method, url, data)
+        return await self.singleflight.do(key, lambda: self._cached_fetch(key, method, url, endpoint, data, causa_id))
+
+    async def _cached_fetch(
+        self, key: str, method: str, url: str, endpoint: str, data: str | None, causa_id: str | None
+    ) -> bytes:
+        if self.cache is None or not self.cache.is_cacheable(endpoint):
+            return await self._fetch(method, url, data)
+        cached_payload = await self.cache.get(key)
+        if cached_payload is not None:
+            return cached_payload
+        payload = await self._fetch(method, url, data)
+        last_activity = self._causas_last_activity.get(causa_id) if causa_id else None
+        await self.cache.set(key, endpoint, payload, last_activity)
+        return payload
+
+    async def _fetch(self, method: str, url: str, data: str | None = None) -> bytes:
         if not self.session:
             raise ProcesosJudicialesClientException("No hay una sesión activa")
+        self.retry_budget.on_request()
+        attempt = 0
+        while True:
+            try:
+                return await self._fetch_once(self.session, method, url, data)
+            except Exception as e:
+                if not self.retry_budget.should_retry(e, attempt):
+                    raise
+                attempt += 1
+                logging.warning(f"Reintento {attempt} de {method} {url}: {e}")
+                await asyncio.sleep(self.retry_budget.delay(attempt))
+
+    async def _fetch_once(self, session: aiohttp.ClientSession, method: str, url: str, data: str | None) -> bytes:
+        if self.cassette is not None and self.cassette.mode == CassetteMode.REPLAY:
+            return await self._replay(self.cassette, method, url, data)
+        if self.rate_budget is not None:
+            await self.rate_budget.acquire()
+        async with self.limiter.slot():
+            if self.cassette is None:
+                return await self._send(session, method, url, data)
+            return await self._send_and_record(self.cassette, session, method, url, data)
+
+    async def _send(self, session: aiohttp.ClientSession, method: str, url: str, data: str | None) -> bytes:
+        async with session.request(method, url, data=data) as response:
+            return await response.read()
+
+    async def _send_and_record(
+        self, cassette: Cassette, session: aiohttp.ClientSession, method: str, url: str, data: str | None
+    ) -> bytes:
+        start = time.monotonic()
+        try:
+            payload = await self._send(session, method, url, data)
+        except ProcesosJudicialesClientException as e:
+            if e.status is not None:
+                cassette.record(method, url, data, e.status, b"", time.monotonic() - start)
+            raise
+        cassette.record(method, url, data, 200, payload, time.monotonic() - start)
+        return payload
+
+    async def _replay(self, cassette: Cassette, method: str, url: str, data: str | None) -> bytes:
+        try:
+            exchange = await cassette.replay(method, url, data)
+        except KeyError as e:
+            raise ProcesosJudicialesClientException(str(e)) from e
+        if exchange.status >= 400:
+            raise ProcesosJudicialesClientException(
+                f"Error en la petición: {exchange.status} - grabada", status=exchange.status
+            )
+        return exchange.payload.encode()
+
+    async def get_contar_causas(self, request: ContarCausasRequest) -> int:
         endpoint = "contarCausas"
-        url = f"{self.API_URL}{endpoint}"
-        async with self.session.post(url, data=request.model_dump_json()) as response:
-            total_causas = int(await response.text())
-            return total_causas
+        url = f"{self.api_url}{endpoint}"
+        total_causas = int(await self._request("POST", url, endpoint, data=request.model_dump_json()))
+        return total_causas
 
     async def get_causas(self, request: CausasRequest) -> list[CausasResponse]:
-        if not self.session:
-            raise ProcesosJudicialesClientException("No hay una sesión activa")
-        endpoint = "buscarCausas"
         contar_causas_request = ContarCausasRequest(**request.model_dump())
         total_causas = await self.get_contar_causas(contar_causas_request)
-        pagination = {"page": 1, "size": total_causas}
-        url = f"{self.API_URL}{endpoint}?{urlencode(pagination)}"
+        return await self.get_causas_page(request, page=1, size=total_causas)
+
+    async def get_causas_page(self, request: CausasRequest, page: int, size: int) -> list[CausasResponse]:
+        endpoint = "buscarCausas"
+        pagination = {"page": page, "size": size}
+        url = f"{self.api_url}{endpoint}?{urlencode(pagination)}"
         data = CausasRequestBody(**(request.model_dump() | pagination))
-        async with self.session.post(url, data=data.model_dump_json()) as response:
-            raw_response_data = await response.text()
-            response_data = orjson.loads(raw_response_data)
-            causas_actor = [CausasResponse(**causa) for causa in response_data]
-            return causas_actor
+        raw_response_data = await self._request("POST", url, endpoint, data=data.model_dump_json())
+        causas_actor = decode_causas(raw_response_data)
+        for causa in causas_actor:
+            self._causas_last_activity[causa.idJuicio] = causa.fechaProvidencia or causa.fechaIngreso
+        return causas_actor
+
+    async def iter_causas(
+        self, request: CausasRequest, page_size: int = 50, pages_in_flight: int = 4
+    ) -> AsyncIterator[CausasResponse]:
+        pending: dict[asyncio.Task[list[CausasResponse]], int] = {}
+        cancelled: set[asyncio.Task[list[CausasResponse]]] = set()
+        next_page = 1
+        last_page: int | None = None
+
+        def schedule_pages() -> None:
+            nonlocal next_page
+            while len(pending) < pages_in_flight and (last_page is None or next_page <= last_page):
+                task = asyncio.create_task(self.get_causas_page(request, page=next_page, size=page_size))
+                pending[task] = next_page
+                next_page += 1
+
+        try:
+            schedule_pages()
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task not in pending:
+                        continue
+                    page = pending.pop(task)
+                    causas = task.result()
+                    if len(causas) < page_size:
+                        last_page = page if last_page is None else min(last_page, page)
+                        cancelled.update(self._cancel_pages_after(pending, last_page))
+                    for causa in causas:
+                        yield causa
+                schedule_pages()
+        finally:
+            for task in pending:
+                task.cancel()
+            # The requests of cancelled pages must unwind before the caller closes the session they use
+            await asyncio.gather(*pending, *cancelled, return_exceptions=True)
+
+    @staticmethod
+    def _cancel_pages_after(
+        pending: dict[asyncio.Task[list[CausasResponse]], int], last_page: int
+    ) -> list[asyncio.Task[list[CausasResponse]]]:
+        cancelled = []
+        for task, page in list(pending.items()):
+            if page > last_page:
+                task.cancel()
+                del pending[task]
+                cancelled.append(task)
+        return cancelled
 
     async def get_movimientos(self, causa_id: str) -> MovimientosResponse:
-        if not self.session:
-            raise ProcesosJudicialesClientException("No hay una sesión activa")
-        endpoint = f"getIncidenteJudicatura/{causa_id}"
-        api_url = "https://api.funcionjudicial.gob.ec/EXPEL-CONSULTA-CAUSAS-CLEX-SERVICE/api/consulta-causas-clex/informacion/"
-        url = f"{api_url}{endpoint}"
-        async with self.session.get(url) as response:
-            raw_response_data = await response.text()
-            response_data = orjson.loads(raw_response_data)
-            return MovimientosResponse(movimientos=response_data)
+        endpoint = "getIncidenteJudicatura"
+        url = f"{self.clex_api_url}{endpoint}/{causa_id}"
+        raw_response_data = await self._request("GET", url, endpoint, causa_id=causa_id)
+        return decode_movimientos(raw_response_data)
 
     async def get_actuaciones(self, request: ActuacionesRequest) -> ActuacionesResponse:
-        if not self.session:
-            raise ProcesosJudicialesClientException("No hay una sesión activa")
         endpoint = "actuacionesJudiciales"
-        url = f"{self.API_URL}{endpoint}"
-        async with self.session.post(url, data=request.model_dump_json()) as response:
-            raw_response_data = await response.text()
-            response_data = orjson.loads(raw_response_data)
-            return ActuacionesResponse(actuaciones=response_data)
+        url = f"{self.api_url}{endpoint}"
+        raw_response_data = await self._request(
+            "POST", url, endpoint, data=request.model_dump_json(), causa_id=request.idJuicio
+        )
+        return decode_actuaciones(raw_response_data)
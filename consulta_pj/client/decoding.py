@@ -0,0 +1,23 @@
+import orjson
+from pydantic import TypeAdapter
+
+from .schemas import Actuacion, ActuacionesResponse, CausasResponse, MovimientosResponse
+
+CAUSAS_ADAPTER = TypeAdapter(list[CausasResponse])
+ACTUACIONES_ADAPTER = TypeAdapter(list[Actuacion])
+
+# orjson parses the HTML-heavy actuaciones payloads faster than pydantic's own JSON parser (validate_json), so the
+# raw bytes are parsed with orjson and validated in a single pass, without decoding to str or building models field
+# by field. The small movimientos payloads validate faster through the response model than through a TypeAdapter.
+
+
+def decode_causas(payload: bytes) -> list[CausasResponse]:
+    return CAUSAS_ADAPTER.validate_python(orjson.loads(payload))
+
+
+def decode_movimientos(payload: bytes) -> MovimientosResponse:
+    return MovimientosResponse(movimientos=orjson.loads(payload))
+
+
+def decode_actuaciones(payload: bytes) -> ActuacionesResponse:
+    return ActuacionesResponse.model_construct(actuaciones=ACTUACIONES_ADAPTER.validate_python(orjson.loads(payload)))
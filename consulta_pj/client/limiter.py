@@ -0,0 +1,157 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager, nullcontext
+from typing import AsyncIterator
+
+import aiohttp
+
+from .scheduler import LaneMetrics, current_lane, current_priority, current_request_priority
+from .schemas import Lane, LimiterStats
+
+OVERLOAD_STATUSES = {429, 500, 502, 503, 504}
+DEFAULT_SLOS = {Lane.INTERACTIVE: 2.0, Lane.BULK: 30.0}
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        initial_limit: int = 15,
+        min_limit: int = 1,
+        max_limit: int = 100,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 2.0,
+        smoothing: float = 0.1,
+        slos: dict[Lane, float] | None = None,
+    ) -> None:
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        self._limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self._in_flight = 0
+        self._baseline_latency: float | None = None
+        self._last_decrease = 0.0
+        self._waiters: list[tuple[tuple[int, float], int, asyncio.Future[None]]] = []
+        self._sequence = itertools.count()
+        slos = slos or {}
+        self._lanes = {lane: LaneMetrics(lane, slos.get(lane, DEFAULT_SLOS[lane])) for lane in Lane}
+        self._successes = 0
+        self._overloads = 0
+        self._decreases = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def acquire(self, priority: tuple[int, float] | None = None) -> None:
+        """Waits for a free slot. Free slots go to the waiter with the lowest ``priority``, then first come.
+
+        Without an explicit ``priority`` the waiter moves up as the ``RequestPriority`` of its request is raised.
+        """
+        if self._in_flight < self.limit and not self._waiters:
+            self._in_flight += 1
+            return
+        waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        request = current_request_priority() if priority is None else None
+
+        def enqueue() -> None:
+            # A raised priority queues the waiter again, the entry it leaves behind is skipped once it is served
+            entry_priority = request.value if request else priority or current_priority()
+            heapq.heappush(self._waiters, (entry_priority, next(self._sequence), waiter))
+
+        enqueue()
+        # Entries of served or cancelled waiters may have kept a free slot from the fast path above
+        self._wake_waiters()
+        try:
+            with request.listen(enqueue) if request else nullcontext():
+                await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was granted right before the cancellation, hand it to the next waiter
+                await self.release()
+            raise
+
+    async def release(self) -> None:
+        self._in_flight -= 1
+        self._wake_waiters()
+
+    def _wake_waiters(self) -> None:
+        while self._waiters and self._in_flight < self.limit:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if waiter.done():
+                continue
+            self._in_flight += 1
+            waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        lane = self._lanes[current_lane()]
+        queued = time.monotonic()
+        lane.queued += 1
+        try:
+            await self.acquire()
+        finally:
+            lane.queued -= 1
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if is_overload_error(e):
+                self.on_overload()
+            raise
+        else:
+            self.on_success(time.monotonic() - start)
+        finally:
+            lane.observe(wait=start - queued, latency=time.monotonic() - queued)
+            await self.release()
+
+    def on_success(self, latency: float) -> None:
+        self._successes += 1
+        if self._baseline_latency is None:
+            self._baseline_latency = latency
+            return
+        latency_spike = latency > self._baseline_latency * self.latency_tolerance
+        self._baseline_latency += self.smoothing * (latency - self._baseline_latency)
+        if latency_spike:
+            self._decrease()
+        else:
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            self._wake_waiters()
+
+    def on_overload(self) -> None:
+        self._overloads += 1
+        self._decrease()
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        # Requests already in flight when the limit was cut report the same congestion event
+        if now - self._last_decrease < (self._baseline_latency or 0):
+            return
+        self._last_decrease = now
+        self._decreases += 1
+        self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+
+    def stats(self) -> LimiterStats:
+        return LimiterStats(
+            limit=self.limit,
+            in_flight=self._in_flight,
+            baseline_latency=self._baseline_latency,
+            successes=self._successes,
+            overloads=self._overloads,
+            decreases=self._decreases,
+            lanes=[lane.stats() for lane in self._lanes.values()],
+        )
+
+
+def is_overload_error(error: BaseException) -> bool:
+    status = getattr(error, "status", None)
+    if status is not None:
+        return status in OVERLOAD_STATUSES
+    return isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
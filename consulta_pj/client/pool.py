@@ -0,0 +1,149 @@
+from contextlib import asynccontextmanager
+from types import TracebackType
+from typing import AsyncIterator, Self
+
+import aiohttp
+
+from consulta_pj.settings import Settings, get_settings
+
+from .cache import ResponseCache
+from .cassette import Cassette
+from .limiter import AdaptiveLimiter
+from .rate import RateBudget
+from .schemas import CassetteMode, CassetteReplayTiming, Lane, UpstreamStats
+from .singleflight import SingleFlight
+
+_active_pool: "ClientPool | None" = None
+
+
+class ClientPool:
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 30,
+        dns_cache_ttl: int = 300,
+        keepalive_timeout: float = 30,
+        limiter: AdaptiveLimiter | None = None,
+        cache: ResponseCache | None = None,
+        cassette: Cassette | None = None,
+        rate_budget: RateBudget | None = None,
+    ) -> None:
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.limiter = limiter or AdaptiveLimiter()
+        self.cache = cache
+        self.cassette = cassette
+        self.rate_budget = rate_budget
+        self.singleflight: SingleFlight[bytes] = SingleFlight()
+        self._connector: aiohttp.TCPConnector | None = None
+
+    @classmethod
+    def from_settings(cls, settings: Settings, rate_budget: RateBudget | None = None) -> Self:
+        return cls(
+            limit=settings.UPSTREAM_CONNECTION_LIMIT,
+            limit_per_host=settings.UPSTREAM_CONNECTION_LIMIT_PER_HOST,
+            dns_cache_ttl=settings.UPSTREAM_DNS_CACHE_TTL,
+            keepalive_timeout=settings.UPSTREAM_KEEPALIVE_TIMEOUT,
+            limiter=AdaptiveLimiter(
+                initial_limit=settings.UPSTREAM_INITIAL_CONCURRENCY,
+                min_limit=settings.UPSTREAM_MIN_CONCURRENCY,
+                max_limit=settings.UPSTREAM_MAX_CONCURRENCY,
+                slos={Lane.INTERACTIVE: settings.UPSTREAM_INTERACTIVE_SLO, Lane.BULK: settings.UPSTREAM_BULK_SLO},
+            ),
+            cache=_response_cache_from_settings(settings),
+            cassette=_cassette_from_settings(settings),
+            rate_budget=rate_budget or RateBudget.from_settings(settings),
+        )
+
+    @property
+    def connector(self) -> aiohttp.TCPConnector:
+        if self._connector is None or self._connector.closed:
+            raise RuntimeError("El pool de conexiones no está abierto")
+        return self._connector
+
+    def stats(self) -> UpstreamStats:
+        return UpstreamStats(
+            limiter=self.limiter.stats(),
+            singleflight=self.singleflight.stats(),
+            cache=self.cache.stats() if self.cache else None,
+            rate=self.rate_budget.stats() if self.rate_budget else None,
+        )
+
+    async def open(self) -> None:
+        if self._connector is not None and not self._connector.closed:
+            return
+        self._connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            use_dns_cache=True,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        if self.cache is not None:
+            await self.cache.open()
+        if self.cassette is not None:
+            await self.cassette.open()
+
+    async def close(self) -> None:
+        if self._connector is not None:
+            await self._connector.close()
+            self._connector = None
+        if self.cache is not None:
+            await self.cache.close()
+        if self.cassette is not None:
+            await self.cassette.close()
+
+    async def __aenter__(self) -> Self:
+        global _active_pool
+        await self.open()
+        _active_pool = self
+        return self
+
+    async def __aexit__(
+        self, exc_type: type[BaseException] | None, exc: BaseException | None, tb: TracebackType | None
+    ) -> None:
+        global _active_pool
+        if _active_pool is self:
+            _active_pool = None
+        await self.close()
+
+
+def _response_cache_from_settings(settings: Settings) -> ResponseCache | None:
+    if not settings.UPSTREAM_CACHE_PATH:
+        return None
+    return ResponseCache(
+        settings.UPSTREAM_CACHE_PATH,
+        ttls={
+            "getIncidenteJudicatura": settings.UPSTREAM_CACHE_MOVIMIENTOS_TTL,
+            "actuacionesJudiciales": settings.UPSTREAM_CACHE_ACTUACIONES_TTL,
+        },
+        max_size_bytes=settings.UPSTREAM_CACHE_MAX_BYTES,
+        dormant_after_days=settings.UPSTREAM_CACHE_DORMANT_AFTER_DAYS,
+        dormant_ttl=settings.UPSTREAM_CACHE_DORMANT_TTL,
+    )
+
+
+def _cassette_from_settings(settings: Settings) -> Cassette | None:
+    if not settings.UPSTREAM_CASSETTE_MODE:
+        return None
+    return Cassette(
+        settings.UPSTREAM_CASSETTE_PATH,
+        CassetteMode(settings.UPSTREAM_CASSETTE_MODE),
+        CassetteReplayTiming(settings.UPSTREAM_CASSETTE_TIMING),
+    )
+
+
+def get_client_pool() -> ClientPool | None:
+    return _active_pool
+
+
+@asynccontextmanager
+async def client_pool() -> AsyncIterator[ClientPool]:
+    active_pool = get_client_pool()
+    if active_pool is not None:
+        yield active_pool
+        return
+    async with ClientPool.from_settings(get_settings()) as pool:
+        yield pool
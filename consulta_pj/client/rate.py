@@ -0,0 +1,144 @@
+import asyncio
+import fcntl
+import math
+import mmap
+import multiprocessing
+import os
+import struct
+import time
+from contextlib import contextmanager
+from multiprocessing.context import BaseContext
+from typing import Any, Iterator, Protocol, Self
+
+from consulta_pj.settings import Settings
+
+from .scheduler import is_interactive
+from .schemas import RateBudgetStats
+
+
+class _State(Protocol):
+    def get_lock(self) -> Any: ...
+
+    def __getitem__(self, index: int) -> float: ...
+
+    def __setitem__(self, index: int, value: float) -> None: ...
+
+
+class _FileState:
+    """Bucket state in a memory-mapped file, shared by every process that opens the same path.
+
+    Unrelated processes (the API, ``python -m consulta_pj.jobs`` and its shards) attach to it by path, an exclusive
+    ``flock`` on the file serializes their updates. A new file is all zeros: an empty bucket refilled long ago.
+    """
+
+    _SIZE = 4 * 8
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._open()
+
+    def _open(self) -> None:
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self.get_lock():
+            if os.fstat(self._fd).st_size < self._SIZE:
+                os.ftruncate(self._fd, self._SIZE)
+        self._map = mmap.mmap(self._fd, self._SIZE)
+
+    @contextmanager
+    def get_lock(self) -> Iterator[None]:
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def __getitem__(self, index: int) -> float:
+        value: float = struct.unpack_from("d", self._map, index * 8)[0]
+        return value
+
+    def __setitem__(self, index: int, value: float) -> None:
+        struct.pack_into("d", self._map, index * 8, value)
+
+    def __del__(self) -> None:
+        if hasattr(self, "_map"):
+            self._map.close()
+            os.close(self._fd)
+
+    def __getstate__(self) -> dict[str, str]:
+        return {"path": self.path}
+
+    def __setstate__(self, state: dict[str, str]) -> None:
+        self.path = state["path"]
+        self._open()
+
+
+class RateBudget:
+    """Token bucket in shared memory, so every process it is handed to draws from the same upstream request rate.
+
+    With a ``path`` the bucket lives in a memory-mapped file instead, and every process on the host that opens the
+    same path draws from it, whether it was started by the same parent or not. The last ``interactive_share`` of the
+    bucket is kept for interactive requests: bulk requests only take a token while more than that is left, so
+    interactive requests of any process go ahead of the bulk requests of every other one.
+
+    ``time.monotonic`` is system-wide, which lets processes refill the bucket from each other's timestamps.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int | None = None,
+        context: BaseContext | None = None,
+        interactive_share: float = 0.0,
+        path: str | None = None,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        # A bulk request must always be able to fill the bucket up to its first token
+        self.reserved = min(self.burst - 1, math.ceil(self.burst * interactive_share))
+        # tokens, last refill, granted, throttled
+        self._state: _State
+        if path:
+            self._state = _FileState(path)
+        else:
+            context = context or multiprocessing.get_context("spawn")
+            self._state = context.Array("d", [float(self.burst), time.monotonic(), 0.0, 0.0])
+
+    @classmethod
+    def from_settings(cls, settings: Settings, context: BaseContext | None = None) -> Self | None:
+        if settings.UPSTREAM_RATE_LIMIT <= 0:
+            return None
+        return cls(
+            settings.UPSTREAM_RATE_LIMIT,
+            settings.UPSTREAM_RATE_BURST or None,
+            context,
+            settings.UPSTREAM_RATE_INTERACTIVE_SHARE,
+            settings.UPSTREAM_RATE_BUDGET_PATH,
+        )
+
+    async def acquire(self) -> None:
+        # The lane is read again after every wait, a bulk request raised by an interactive caller takes the reserve
+        while (wait := self._take(0 if is_interactive() else self.reserved)) > 0:
+            await asyncio.sleep(wait)
+
+    def _take(self, reserved: int = 0) -> float:
+        # The lock is held for a few arithmetic operations only, blocking the event loop on it is harmless
+        with self._state.get_lock():
+            now = time.monotonic()
+            # A bucket file outlives a reboot, whose monotonic clock starts over: it is refilled then
+            elapsed = now - self._state[1] if now >= self._state[1] else math.inf
+            tokens: float = min(self.burst, self._state[0] + elapsed * self.rate)
+            self._state[1] = now
+            if tokens >= reserved + 1:
+                self._state[0] = tokens - 1
+                self._state[2] += 1
+                return 0
+            self._state[0] = tokens
+            self._state[3] += 1
+            return (reserved + 1 - tokens) / self.rate
+
+    def stats(self) -> RateBudgetStats:
+        with self._state.get_lock():
+            granted, throttled = self._state[2], self._state[3]
+        return RateBudgetStats(
+            rate=self.rate, burst=self.burst, reserved=self.reserved, granted=int(granted), throttled=int(throttled)
+        )
@@ -0,0 +1,37 @@
+import backoff
+
+from .limiter import is_overload_error
+
+
+class RetryBudget:
+    def __init__(
+        self,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 10.0,
+        budget_ratio: float = 0.2,
+        budget_min: int = 10,
+    ) -> None:
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.budget_min = budget_min
+        self.requests = 0
+        self.retries = 0
+
+    @property
+    def available(self) -> float:
+        return self.budget_min + self.budget_ratio * self.requests - self.retries
+
+    def on_request(self) -> None:
+        self.requests += 1
+
+    def should_retry(self, error: BaseException, attempt: int) -> bool:
+        if attempt >= self.max_retries or not is_overload_error(error) or self.available < 1:
+            return False
+        self.retries += 1
+        return True
+
+    def delay(self, attempt: int) -> float:
+        return float(backoff.full_jitter(min(self.max_delay, self.base_delay * 2**attempt)))
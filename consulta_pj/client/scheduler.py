@@ -0,0 +1,131 @@
+import math
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, Iterator
+
+from .schemas import Lane, LaneStats
+
+INTERACTIVE_PRIORITY = (0, 0.0)
+
+_lane: ContextVar[Lane] = ContextVar("upstream_lane", default=Lane.BULK)
+_recency: ContextVar[datetime | None] = ContextVar("upstream_recency", default=None)
+_request: ContextVar["RequestPriority | None"] = ContextVar("upstream_request", default=None)
+
+
+@contextmanager
+def upstream_priority(lane: Lane | None = None, recency: datetime | None = None) -> Iterator[None]:
+    """Schedules the upstream requests made inside the block, including those of tasks created in it.
+
+    Interactive requests go before any queued bulk request. Bulk requests go by the recency of the causa they
+    belong to, newest first, and requests of no particular causa (e.g. listing pages) go before all of them.
+
+    Lanes order the requests waiting for the ``AdaptiveLimiter`` of one process. Across processes, e.g. the API and
+    the batches run by ``python -m consulta_pj.jobs``, the ``RateBudget`` they share keeps its interactive share for
+    interactive requests.
+    """
+    lane_token = _lane.set(lane) if lane is not None else None
+    recency_token = _recency.set(recency) if recency is not None else None
+    try:
+        yield
+    finally:
+        if recency_token is not None:
+            _recency.reset(recency_token)
+        if lane_token is not None:
+            _lane.reset(lane_token)
+
+
+class RequestPriority:
+    """Priority of one upstream request shared by coalesced callers, raised to that of the most urgent of them."""
+
+    def __init__(self, priority: tuple[int, float]) -> None:
+        self.value = priority
+        self._listeners: list[Callable[[], None]] = []
+
+    def raise_to(self, priority: tuple[int, float]) -> None:
+        if priority >= self.value:
+            return
+        self.value = priority
+        for listener in list(self._listeners):
+            listener()
+
+    @contextmanager
+    def listen(self, listener: Callable[[], None]) -> Iterator[None]:
+        """Calls ``listener`` whenever the priority is raised inside the block."""
+        self._listeners.append(listener)
+        try:
+            yield
+        finally:
+            self._listeners.remove(listener)
+
+
+@contextmanager
+def request_priority(priority: RequestPriority) -> Iterator[None]:
+    """Schedules the upstream requests made inside the block, including those of tasks created in it, at
+    ``priority`` as it is raised."""
+    token = _request.set(priority)
+    try:
+        yield
+    finally:
+        _request.reset(token)
+
+
+def current_request_priority() -> RequestPriority | None:
+    return _request.get()
+
+
+def current_lane() -> Lane:
+    return _lane.get()
+
+
+def is_interactive() -> bool:
+    """Whether the current request goes in the interactive lane, also when an interactive caller coalesced onto it."""
+    return current_priority() <= INTERACTIVE_PRIORITY
+
+
+def current_priority() -> tuple[int, float]:
+    request = _request.get()
+    if request is not None:
+        return request.value
+    lane = _lane.get()
+    if lane == Lane.INTERACTIVE:
+        return INTERACTIVE_PRIORITY
+    recency = _recency.get()
+    return 1, -recency.timestamp() if recency else -math.inf
+
+
+class LaneMetrics:
+    def __init__(self, lane: Lane, slo_seconds: float, window: int = 1000) -> None:
+        self.lane = lane
+        self.slo_seconds = slo_seconds
+        self.requests = 0
+        self.queued = 0
+        self._waits: deque[float] = deque(maxlen=window)
+        self._latencies: deque[float] = deque(maxlen=window)
+
+    def observe(self, wait: float, latency: float) -> None:
+        self.requests += 1
+        self._waits.append(wait)
+        self._latencies.append(latency)
+
+    def stats(self) -> LaneStats:
+        latencies = sorted(self._latencies)
+        within_slo = sum(1 for latency in latencies if latency <= self.slo_seconds)
+        return LaneStats(
+            lane=self.lane,
+            requests=self.requests,
+            queued=self.queued,
+            slo_seconds=self.slo_seconds,
+            slo_attainment=within_slo / len(latencies) if latencies else None,
+            wait_p50=_percentile(sorted(self._waits), 0.5),
+            latency_p50=_percentile(latencies, 0.5),
+            latency_p95=_percentile(latencies, 0.95),
+            latency_p99=_percentile(latencies, 0.99),
+        )
+
+
+def _percentile(values: list[float], quantile: float) -> float | None:
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(quantile * len(values)))]
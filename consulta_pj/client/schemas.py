@@ -1,4 +1,5 @@
 from datetime import datetime
+from enum import StrEnum
 
 from pydantic import BaseModel
 
@@ -125,6 +126,84 @@ class MovimientosResponse(BaseModel):
     movimientos: list[MovimientoSchema]
 
 
+class Lane(StrEnum):
+    INTERACTIVE = "interactive"
+    BULK = "bulk"
+
+
+class CassetteMode(StrEnum):
+    RECORD = "record"
+    REPLAY = "replay"
+
+
+class CassetteReplayTiming(StrEnum):
+    ORIGINAL = "original"
+    NONE = "none"
+
+
+class RecordedExchange(BaseModel):
+    method: str
+    url: str
+    data: str | None
+    status: int
+    payload: str
+    elapsed: float
+    offset: float
+
+
+class LaneStats(BaseModel):
+    lane: Lane
+    requests: int
+    queued: int
+    slo_seconds: float
+    slo_attainment: float | None
+    wait_p50: float | None
+    latency_p50: float | None
+    latency_p95: float | None
+    latency_p99: float | None
+
+
+class LimiterStats(BaseModel):
+    limit: int
+    in_flight: int
+    baseline_latency: float | None
+    successes: int
+    overloads: int
+    decreases: int
+    lanes: list[LaneStats] = []
+
+
+class CacheStats(BaseModel):
+    hits: int
+    misses: int
+    expired: int
+    revalidated: int
+    evictions: int
+    size_bytes: int
+
+
+class SingleFlightStats(BaseModel):
+    executed: int
+    coalesced: int
+    failures: int
+    in_flight: int
+
+
+class RateBudgetStats(BaseModel):
+    rate: float
+    burst: int
+    reserved: int = 0
+    granted: int
+    throttled: int
+
+
+class UpstreamStats(BaseModel):
+    limiter: LimiterStats
+    singleflight: SingleFlightStats
+    cache: CacheStats | None = None
+    rate: RateBudgetStats | None = None
+
+
 def get_actuaciones_request(
     idJuicio: str,
     incidente: IncidenteSchema,
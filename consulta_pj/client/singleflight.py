@@ -0,0 +1,64 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Generic, TypeVar
+
+from .scheduler import RequestPriority, current_priority, request_priority
+from .schemas import SingleFlightStats
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Call(Generic[T]):
+    task: asyncio.Task[T]
+    priority: RequestPriority
+    waiters: int = 0
+
+
+class SingleFlight(Generic[T]):
+    def __init__(self) -> None:
+        self._calls: dict[str, _Call[T]] = {}
+        self._executed = 0
+        self._coalesced = 0
+        self._failures = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            priority = RequestPriority(current_priority())
+            with request_priority(priority):
+                call = _Call(asyncio.ensure_future(func()), priority)
+            self._calls[key] = call
+            self._executed += 1
+            call.task.add_done_callback(lambda done_task: self._forget(key, done_task))
+        else:
+            self._coalesced += 1
+            # A caller of a more urgent lane must not wait at the priority of the caller that started the request
+            call.priority.raise_to(current_priority())
+        call.waiters += 1
+        try:
+            # Shielded so a cancelled caller does not cancel the request for the other waiters
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                # Nobody else waits for the request, stop it and let it unwind before the caller closes its session
+                call.task.cancel()
+                await asyncio.wait([call.task])
+            raise
+        finally:
+            call.waiters -= 1
+
+    def stats(self) -> SingleFlightStats:
+        return SingleFlightStats(
+            executed=self._executed,
+            coalesced=self._coalesced,
+            failures=self._failures,
+            in_flight=len(self._calls),
+        )
+
+    def _forget(self, key: str, task: asyncio.Task[T]) -> None:
+        call = self._calls.get(key)
+        if call is not None and call.task is task:
+            del self._calls[key]
+        if not task.cancelled() and task.exception() is not None:
+            self._failures += 1
@@ -1,20 +1,59 @@
 import asyncio
 import logging
-from typing import Awaitable, Iterable, TypeVar
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Iterable, TypeVar
 
 T = TypeVar("T")
 
 
-async def log_progress(message: str, index: int, total: int, coro: Awaitable[T], level: int = logging.INFO) -> T:
-    logging.log(level, f"Task {message}: {index + 1}/{total}")
+async def log_progress(
+    message: str, index: int, total: int | None, coro: Awaitable[T], level: int = logging.INFO
+) -> T:
+    logging.log(level, f"Task {message}: {index + 1}/{total or '?'}")
     return await coro
 
 
+async def with_semaphore(semaphore: asyncio.Semaphore, coro: Awaitable[T]) -> T:
+    async with semaphore:
+        return await coro
+
+
+async def gather_or_cancel(*aws: Awaitable[T]) -> list[T]:
+    """Like ``asyncio.gather``, but the first failure cancels the other awaitables and waits for them before it is
+    raised, so none of them keeps running detached from its caller."""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        await cancel_and_wait(tasks)
+
+
+async def cancel_and_wait(tasks: Iterable[asyncio.Future[Any]]) -> None:
+    """Cancel the unfinished ``tasks`` and wait for all of them, retrieving their exceptions."""
+    tasks = list(tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
 async def gather_with_concurrency(n: int, coros: Iterable[Awaitable[T]]) -> list[T]:
     semaphore = asyncio.Semaphore(n)
+    return await gather_or_cancel(*(with_semaphore(semaphore, c) for c in coros))
+
+
+async def gather_stream_with_concurrency(n: int, coros: AsyncIterable[Awaitable[T]]) -> list[T]:
+    semaphore = asyncio.Semaphore(n)
+    tasks: list[asyncio.Task[T]] = []
+    try:
+        async for coro in coros:
+            tasks.append(asyncio.create_task(with_semaphore(semaphore, coro)))
+        return await asyncio.gather(*tasks)
+    finally:
+        # A failing task or stream must not leave the started tasks running once the caller tears their resources down
+        await cancel_and_wait(tasks)
 
-    async def sem_coro(coro: Awaitable[T]) -> T:
-        async with semaphore:
-            return await coro
 
-    return await asyncio.gather(*(sem_coro(c) for c in coros))
+async def aenumerate(iterable: AsyncIterable[T]) -> AsyncIterator[tuple[int, T]]:
+    index = 0
+    async for item in iterable:
+        yield index, item
+        index += 1
@@ -1,7 +1,9 @@
 from . import crawler
 from .schemas import (
     ActuacionSchema,
+    CausaMarkers,
     CausaSchema,
+    CrawlProgress,
     ImplicadoSchema,
     IncidenteSchema,
     InformacionLitigante,
@@ -13,7 +15,9 @@ from .schemas import (
 
 __all__ = [
     "crawler",
+    "CausaMarkers",
     "CausaSchema",
+    "CrawlProgress",
     "ActuacionSchema",
     "LitiganteTipo",
     "JudicaturaSchema",
@@ -1,6 +1,7 @@
+import asyncio
 import logging
+from typing import AsyncIterable, AsyncIterator
 
-import backoff
 import orjson
 
 from consulta_pj.client import ActuacionesResponse as ClientActuacionesResponse
@@ -12,17 +13,27 @@ from consulta_pj.client import (
     ProcesosJudicialesClient,
     ProcesosJudicialesClientException,
     get_actuaciones_request,
+    get_client_pool,
+    upstream_priority,
 )
 from consulta_pj.client import IncidenteSchema as ClientIncidenteSchema
 from consulta_pj.client import LitiganteSchema as ClientLitiganteSchema
 from consulta_pj.client import (
     MovimientoSchema as ClientMovimientoSchema,
 )
-from consulta_pj.concurrency import gather_with_concurrency, log_progress
+from consulta_pj.concurrency import (
+    aenumerate,
+    gather_or_cancel,
+    gather_stream_with_concurrency,
+    log_progress,
+    with_semaphore,
+)
 
 from .schemas import (
     ActuacionSchema,
+    CausaMarkers,
     CausaSchema,
+    CrawlProgress,
     ImplicadoSchema,
     IncidenteSchema,
     InformacionLitigante,
@@ -33,49 +44,157 @@ from .schemas import (
 )
 
 
-async def get_actor_info(cedula: str, max_concurrency: int = 15) -> InformacionLitigante:
+async def get_actor_info(
+    cedula: str, max_concurrency: int | None = None, known_causas: dict[str, CausaMarkers] | None = None
+) -> InformacionLitigante:
     litigante = LitiganteSchema(cedula=cedula, tipo=LitiganteTipo.ACTOR)
-    causas_request = CausasRequest(actor=CausaActor(cedulaActor=cedula))
-    return await get_litigante_info(litigante, causas_request, max_concurrency)
+    return await get_litigante_info(litigante, get_causas_request(litigante), max_concurrency, known_causas)
 
 
-async def get_demandado_info(cedula: str, max_concurrency: int = 15) -> InformacionLitigante:
+async def get_demandado_info(
+    cedula: str, max_concurrency: int | None = None, known_causas: dict[str, CausaMarkers] | None = None
+) -> InformacionLitigante:
     litigante = LitiganteSchema(cedula=cedula, tipo=LitiganteTipo.DEMANDADO)
-    causas_request = CausasRequest(demandado=CausaDemandado(cedulaDemandado=cedula))
-    return await get_litigante_info(litigante, causas_request, max_concurrency)
+    return await get_litigante_info(litigante, get_causas_request(litigante), max_concurrency, known_causas)
+
+
+async def crawl_litigante_into(
+    queue: asyncio.Queue[CausaSchema],
+    litigante: LitiganteSchema,
+    causas_request: CausasRequest,
+    max_concurrency: int | None = None,
+    known_causas: dict[str, CausaMarkers] | None = None,
+    progress: CrawlProgress | None = None,
+) -> tuple[list[str], dict[str, str]]:
+    """Put every crawled causa into ``queue`` as soon as it finishes and return the unchanged and the failed ones.
+
+    A crawl slot is held until its causa is accepted by the queue, so a full queue stops new causas from starting.
+    A causa that can not be crawled is returned with its error instead of failing the other causas of the litigante.
+    Listed, unchanged and failed causas are counted in ``progress``, the consumer of the queue counts the others as done.
+    """
+    async with ProcesosJudicialesClient(pool=get_client_pool()) as client:
+        concurrency = max_concurrency or client.limiter.max_limit
+        budget = asyncio.Semaphore(concurrency)
+        unchanged_causas: list[str] = []
+        failed_causas: dict[str, str] = {}
+        causas = _skip_unchanged_causas(
+            client.iter_causas(causas_request), known_causas or {}, unchanged_causas, progress
+        )
+        tasks_with_progress = (
+            log_progress(
+                f"Litigante {litigante.cedula} - Causa {causa.idJuicio}",
+                index,
+                None,
+                _crawl_causa_into(queue, causa, client, budget, failed_causas, progress),
+            )
+            async for index, causa in aenumerate(causas)
+        )
+        await gather_stream_with_concurrency(concurrency, tasks_with_progress)
+        return unchanged_causas, failed_causas
+
+
+async def _crawl_causa_into(
+    queue: asyncio.Queue[CausaSchema],
+    causa: CausasResponse,
+    client: ProcesosJudicialesClient,
+    budget: asyncio.Semaphore,
+    failed_causas: dict[str, str],
+    progress: CrawlProgress | None = None,
+) -> None:
+    try:
+        causa_schema = await get_causa(causa, client, budget)
+    except Exception as e:
+        # get_causa already logged it
+        failed_causas[causa.idJuicio] = str(e)
+        if progress:
+            progress.causas_done += 1
+            progress.errors[causa.idJuicio] = str(e)
+        return
+    await queue.put(causa_schema)
+
+
+def get_causas_request(litigante: LitiganteSchema) -> CausasRequest:
+    if litigante.tipo == LitiganteTipo.ACTOR:
+        return CausasRequest(actor=CausaActor(cedulaActor=litigante.cedula))
+    return CausasRequest(demandado=CausaDemandado(cedulaDemandado=litigante.cedula))
+
+
+async def get_litigante_causas(litigante: LitiganteSchema, client: ProcesosJudicialesClient) -> list[CausasResponse]:
+    return [causa async for causa in client.iter_causas(get_causas_request(litigante))]
 
 
 async def get_litigante_info(
     litigante: LitiganteSchema,
     causas_request: CausasRequest,
-    max_concurrency: int,
+    max_concurrency: int | None = None,
+    known_causas: dict[str, CausaMarkers] | None = None,
 ) -> InformacionLitigante:
-    async with ProcesosJudicialesClient() as client:
-        causas = await client.get_causas(causas_request)
-        total_causas = len(causas)
-        tasks = ((causa.idJuicio, get_causa(causa, client)) for causa in causas)
+    async with ProcesosJudicialesClient(pool=get_client_pool()) as client:
+        concurrency = max_concurrency or client.limiter.max_limit
+        # Upstream requests of every level (causa, movimiento, incidente) share this crawl-wide budget
+        budget = asyncio.Semaphore(concurrency)
+        unchanged_causas: list[str] = []
+        causas = _skip_unchanged_causas(client.iter_causas(causas_request), known_causas or {}, unchanged_causas)
         tasks_with_progress = (
-            log_progress(f"Litigante {litigante.cedula} - Causa {idJuicio}", index, total_causas, task)
-            for index, (idJuicio, task) in enumerate(tasks)
+            log_progress(
+                f"Litigante {litigante.cedula} - Causa {causa.idJuicio}",
+                index,
+                None,
+                get_causa(causa, client, budget),
+            )
+            async for index, causa in aenumerate(causas)
         )
-        causas_info = await gather_with_concurrency(max_concurrency, tasks_with_progress)
-        result = InformacionLitigante(litigante=litigante, causas=causas_info)
+        causas_info = await gather_stream_with_concurrency(concurrency, tasks_with_progress)
+        result = InformacionLitigante(litigante=litigante, causas=causas_info, unchanged_causas=unchanged_causas)
         return result
 
 
-@backoff.on_exception(backoff.expo, ProcesosJudicialesClientException, max_time=60)
-async def get_causa(causa: CausasResponse, client: ProcesosJudicialesClient) -> CausaSchema:
+def is_unchanged_causa(causa: CausasResponse, known_markers: CausaMarkers | None) -> bool:
+    if known_markers is None:
+        return False
+    markers = CausaMarkers.model_validate(causa, from_attributes=True)
+    return not markers.is_empty() and markers == known_markers
+
+
+async def _skip_unchanged_causas(
+    causas: AsyncIterable[CausasResponse],
+    known_causas: dict[str, CausaMarkers],
+    unchanged_causas: list[str],
+    progress: CrawlProgress | None = None,
+) -> AsyncIterator[CausasResponse]:
+    async for causa in causas:
+        if progress:
+            progress.causas_total += 1
+        if is_unchanged_causa(causa, known_causas.get(causa.idJuicio)):
+            unchanged_causas.append(causa.idJuicio)
+            if progress:
+                progress.causas_done += 1
+        else:
+            yield causa
+
+
+async def get_causa(
+    causa: CausasResponse, client: ProcesosJudicialesClient, budget: asyncio.Semaphore | None = None
+) -> CausaSchema:
+    budget = budget or asyncio.Semaphore(client.limiter.max_limit)
     try:
-        movimientos_response = await client.get_movimientos(causa.idJuicio)
-        movimientos_raw = [
-            await _process_movimiento(causa.idJuicio, movimiento, client)
-            for movimiento in movimientos_response.movimientos
-        ]
+        # In the bulk lane, requests of recently active causas are sent first
+        with upstream_priority(recency=causa.fechaProvidencia or causa.fechaIngreso):
+            movimientos_response = await with_semaphore(budget, client.get_movimientos(causa.idJuicio))
+            movimientos_raw = await gather_or_cancel(
+                *(
+                    _process_movimiento(causa.idJuicio, movimiento, client, budget)
+                    for movimiento in movimientos_response.movimientos
+                )
+            )
         movimientos = [movimiento for movimiento in movimientos_raw if movimiento is not None]
         causa_schema = CausaSchema(
             idJuicio=causa.idJuicio,
             nombreDelito=causa.nombreDelito,
             fechaIngreso=causa.fechaIngreso,
+            fechaProvidencia=causa.fechaProvidencia,
+            idEstadoJuicio=causa.idEstadoJuicio,
+            estadoActual=causa.estadoActual,
             movimientos=movimientos,
         )
         return causa_schema
@@ -94,6 +213,7 @@ async def _process_movimiento(
     idJuicio: str,
     movimiento: ClientMovimientoSchema,
     client: ProcesosJudicialesClient,
+    budget: asyncio.Semaphore,
 ) -> MovimientoSchema | None:
     if not movimiento.lstIncidenteJudicatura:
         return None
@@ -103,11 +223,14 @@ async def _process_movimiento(
         for incidente in movimiento.lstIncidenteJudicatura
     ]
 
-    actuaciones_judiciales = [
-        (incidente, await client.get_actuaciones(request)) for incidente, request in actuaciones_requests
-    ]
+    actuaciones_judiciales = await gather_or_cancel(
+        *(with_semaphore(budget, client.get_actuaciones(request)) for _, request in actuaciones_requests)
+    )
 
-    incidentes = [_get_incidentes_schema(incidente, actuaciones) for incidente, actuaciones in actuaciones_judiciales]
+    incidentes = [
+        _get_incidentes_schema(incidente, actuaciones)
+        for (incidente, _), actuaciones in zip(actuaciones_requests, actuaciones_judiciales)
+    ]
 
     idMovimiento = movimiento.lstIncidenteJudicatura[0].idMovimientoJuicioIncidente
     judicatura = JudicaturaSchema(
@@ -50,13 +50,34 @@ class MovimientoSchema(BaseModel):
     incidentes: list[IncidenteSchema]
 
 
+class CausaMarkers(BaseModel):
+    fechaProvidencia: datetime | None = None
+    idEstadoJuicio: int | None = None
+    estadoActual: str | None = None
+
+    def is_empty(self) -> bool:
+        return self.fechaProvidencia is None and self.idEstadoJuicio is None and self.estadoActual is None
+
+
 class CausaSchema(BaseModel):
     idJuicio: str
     nombreDelito: str
     fechaIngreso: datetime
+    fechaProvidencia: datetime | None = None
+    idEstadoJuicio: int | None = None
+    estadoActual: str | None = None
     movimientos: list[MovimientoSchema]
 
 
 class InformacionLitigante(BaseModel):
     litigante: LitiganteSchema
     causas: list[CausaSchema]
+    unchanged_causas: list[str] = []
+
+
+class CrawlProgress(BaseModel):
+    """Causas of a litigante crawl listed so far, finished (persisted, failed or unchanged) and failed."""
+
+    causas_total: int = 0
+    causas_done: int = 0
+    errors: dict[str, str] = {}
@@ -1,4 +1,27 @@
 from .db_service import DBService
-from .schemas import CreateActuacionRequest, CreateIncidenteRequest
+from .explain import sequential_scans
+from .migrations import migrate
+from .pool import pool_stats, tortoise_config, write_connection
+from .replica import read_from_replica, replica_reads
+from .schemas import CreateActuacionRequest, CreateIncidenteRequest, DBPoolStats, JobKind, JobStatus, UpsertResult
+from .write_buffer import WriteBuffer, get_write_buffer, write_buffer
 
-__all__ = ["CreateActuacionRequest", "CreateIncidenteRequest", "DBService"]
+__all__ = [
+    "CreateActuacionRequest",
+    "CreateIncidenteRequest",
+    "DBPoolStats",
+    "DBService",
+    "JobKind",
+    "JobStatus",
+    "UpsertResult",
+    "WriteBuffer",
+    "get_write_buffer",
+    "migrate",
+    "pool_stats",
+    "read_from_replica",
+    "replica_reads",
+    "sequential_scans",
+    "tortoise_config",
+    "write_buffer",
+    "write_connection",
+]
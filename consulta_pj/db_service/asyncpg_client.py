@@ -0,0 +1,27 @@
+"""Tortoise engine of the PostgreSQL connections configured by ``tortoise_config``, only imported with asyncpg."""
+
+import asyncio
+from typing import Any
+
+from tortoise.backends.asyncpg.client import AsyncpgDBClient
+
+from .pool import MeteredPool
+
+
+class MeteredAsyncpgDBClient(AsyncpgDBClient):
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._connecting = asyncio.Lock()
+
+    async def create_connection(self, with_db: bool) -> None:
+        # Tortoise connects on the first query, queries started together would each create a pool of their own and
+        # all but the last one would be left open and unmetered
+        async with self._connecting:
+            if not (with_db and self._pool):
+                await super().create_connection(with_db)
+
+    async def create_pool(self, **kwargs: Any) -> Any:
+        return MeteredPool(await super().create_pool(**kwargs))
+
+
+client_class = MeteredAsyncpgDBClient
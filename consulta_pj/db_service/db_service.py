@@ -1,6 +1,14 @@
+import logging
+
+from pypika import Table
+from tortoise import timezone
+from tortoise.expressions import Subquery
+
 from consulta_pj.crawler import (
+    CausaMarkers,
     CausaSchema,
     ImplicadoSchema,
+    IncidenteSchema,
     JudicaturaSchema,
     LitiganteSchema,
     LitiganteTipo,
@@ -16,8 +24,22 @@ from consulta_pj.db_service.models import (
     Movimiento,
 )
 
-from .schemas import CreateActuacionRequest, CreateIncidenteRequest
+from .pool import write_connection
+from .replica import read_from_replica
+from .rows import (
+    CausaRows,
+    actuacion_row,
+    causa_row,
+    implicado_row,
+    incidente_row,
+    judicatura_row,
+    movimiento_row,
+    write_causas,
+)
+from .schemas import CreateActuacionRequest, CreateIncidenteRequest, UpsertResult
 from .serializers import SerializedActuacionSchema, SerializedCausaSchema, _serialize_causa
+from .upsert import bulk_load
+from .write_buffer import get_write_buffer
 
 
 class DBService:
@@ -31,6 +53,53 @@ class DBService:
         await litigante_object.save()
         return litigante_object.cedula
 
+    async def bulk_associate_litigantes(self, tipo: LitiganteTipo, causas_by_cedula: dict[str, list[str]]) -> int:
+        if not causas_by_cedula:
+            return 0
+        cedulas = list(causas_by_cedula)
+        await Litigante.bulk_create([Litigante(cedula=cedula) for cedula in cedulas], ignore_conflicts=True)
+        await Litigante.filter(cedula__in=cedulas).update(last_updated=timezone.now())
+
+        relation = "causas_actor" if tipo == LitiganteTipo.ACTOR else "causas_demandado"
+        field = Litigante._meta.fields_map[relation]
+        through_table = Table(field.through)  # type: ignore[attr-defined]
+        litigante_key, causa_key = field.backward_key, field.forward_key  # type: ignore[attr-defined]
+        db = Litigante._meta.db
+
+        pairs = {(cedula, causa_id) for cedula, causas_ids in causas_by_cedula.items() for causa_id in causas_ids}
+        if not pairs:
+            return 0
+        insert_query = db.query_class.into(through_table).columns(litigante_key, causa_key)
+        for cedula, causa_id in sorted(pairs):
+            insert_query = insert_query.insert(cedula, causa_id)
+        # Concurrent writers may link the same pairs, existing links are skipped instead of failing the insert
+        _, created_rows = await db.execute_query(
+            f'{insert_query.on_conflict().do_nothing()} RETURNING "{litigante_key}"'
+        )
+        return len(created_rows)
+
+    async def persist_causas(self, causas: list[CausaSchema], chunk_size: int = 100) -> list[tuple[str, str]]:
+        """Writes ``causas`` set-based, one transaction per chunk, and returns ``(idJuicio, error)`` per causa.
+
+        A chunk is written with one statement per table. If that fails, it is rolled back to a savepoint and written
+        again causa by causa, each under its own savepoint, so a bad causa fails alone as with ``process_causa``.
+
+        While a ``WriteBuffer`` is active, the causas are written together with those of other concurrent callers
+        instead, and the call returns once the flush that contains them is committed.
+        """
+        write_buffer = get_write_buffer()
+        if write_buffer is not None:
+            return await write_buffer.write(causas)
+        id_causas: list[tuple[str, str]] = []
+        for start in range(0, len(causas), chunk_size):
+            chunk = causas[start : start + chunk_size]
+            try:
+                id_causas.extend(await write_causas(chunk))
+            except Exception as e:
+                logging.exception(e)
+                id_causas.extend((causa.idJuicio, str(e)) for causa in chunk)
+        return id_causas
+
     async def get_or_create_causa(self, causa: CausaSchema) -> str:
         causa_object, _ = await Causa.get_or_create(
             {
@@ -48,6 +117,13 @@ class DBService:
         )
         return causa_object.idJuicio
 
+    async def update_causa_markers(self, causa: CausaSchema) -> None:
+        await Causa.filter(idJuicio=causa.idJuicio).update(
+            fechaProvidencia=causa.fechaProvidencia,
+            idEstadoJuicio=causa.idEstadoJuicio,
+            estadoActual=causa.estadoActual,
+        )
+
     async def bulk_create_causa(self, causas: list[CausaSchema]) -> list[str]:
         new_causas = [
             Causa(
@@ -60,6 +136,9 @@ class DBService:
         await Causa.bulk_create(new_causas, ignore_conflicts=True)
         return [causa.idJuicio for causa in new_causas]
 
+    async def bulk_upsert_causa(self, causas: list[CausaSchema]) -> UpsertResult:
+        return await bulk_load(write_connection(), Causa, [causa_row(causa) for causa in causas])
+
     async def get_or_create_judicatura(self, judicatura: JudicaturaSchema) -> str:
         judicatura_object, _ = await Judicatura.get_or_create(
             {
@@ -92,6 +171,12 @@ class DBService:
         await Judicatura.bulk_create(new_judicaturas, ignore_conflicts=True)
         return [judicatura.idJudicatura for judicatura in new_judicaturas]
 
+    async def bulk_upsert_judicatura(self, judicaturas: list[JudicaturaSchema]) -> UpsertResult:
+        """Inserts new judicaturas and updates those whose values changed, unlike ``bulk_create_judicatura``."""
+        return await bulk_load(
+            write_connection(), Judicatura, [judicatura_row(judicatura) for judicatura in judicaturas]
+        )
+
     async def get_or_create_movimiento(self, id_movimiento: int, causa_id: str) -> int:
         movimiento, _ = await Movimiento.get_or_create(
             {"causa_id": causa_id},
@@ -113,6 +198,10 @@ class DBService:
         await Movimiento.bulk_create(new_movimientos, ignore_conflicts=True)
         return [movimiento.idMovimientoJuicioIncidente for movimiento in new_movimientos]
 
+    async def bulk_upsert_movimiento(self, movimientos: list[MovimientoSchema], causa_id: str) -> UpsertResult:
+        rows = [movimiento_row(movimiento.idMovimiento, causa_id) for movimiento in movimientos]
+        return await bulk_load(write_connection(), Movimiento, rows)
+
     async def get_or_create_incidente(self, request: CreateIncidenteRequest) -> int:
         incidente_object, _ = await Incidente.get_or_create(
             {
@@ -143,6 +232,10 @@ class DBService:
         await Incidente.bulk_create(new_incidentes, ignore_conflicts=True)
         return [incidente.idIncidente for incidente in new_incidentes]
 
+    async def bulk_upsert_incidente(self, requests: list[CreateIncidenteRequest]) -> UpsertResult:
+        rows = [incidente_row(request.incidente, request.judicatura_id, request.movimiento_id) for request in requests]
+        return await bulk_load(write_connection(), Incidente, rows)
+
     async def get_or_create_implicado(self, implicado: ImplicadoSchema, tipo: LitiganteTipo, incidente_id: int) -> int:
         implicado_object, _ = await Implicado.get_or_create(
             {"nombre": implicado.nombre, "representante": implicado.representante},
@@ -169,6 +262,18 @@ class DBService:
             await implicado_object.incidentes_demandado.add(incidente)
         return implicado_object.id
 
+    async def bulk_update_or_create_implicados(self, incidentes: list[IncidenteSchema]) -> list[int]:
+        """Upserts the actores and demandados of ``incidentes`` with one statement and links each through table with
+        another, instead of several queries per implicado as ``update_or_create_implicado``."""
+        rows = CausaRows()
+        for incidente in incidentes:
+            rows.add_implicados(incidente)
+        await rows.write_implicados(write_connection())
+        return list(rows.implicados)
+
+    async def bulk_upsert_implicado(self, implicados: list[ImplicadoSchema]) -> UpsertResult:
+        return await bulk_load(write_connection(), Implicado, [implicado_row(implicado) for implicado in implicados])
+
     async def get_or_create_actuacion(self, request: CreateActuacionRequest) -> int:
         actuacion_object, _ = await Actuacion.get_or_create(
             {
@@ -217,34 +322,51 @@ class DBService:
         await Actuacion.bulk_create(new_actuaciones, ignore_conflicts=True)
         return [actuacion.uuid for actuacion in new_actuaciones]
 
+    async def bulk_upsert_actuacion(self, requests: list[CreateActuacionRequest]) -> UpsertResult:
+        rows = [actuacion_row(request.actuacion, request.judicatura_id, request.incidente_id) for request in requests]
+        return await bulk_load(write_connection(), Actuacion, rows)
+
+    async def get_causas_markers_by_cedula(self, cedula: str, tipo: LitiganteTipo) -> dict[str, CausaMarkers]:
+        if tipo == LitiganteTipo.ACTOR:
+            queryset = Causa.filter(actores=cedula)
+        else:
+            queryset = Causa.filter(demandados=cedula)
+        rows = await queryset.values("idJuicio", "fechaProvidencia", "idEstadoJuicio", "estadoActual")
+        return {row.pop("idJuicio"): CausaMarkers(**row) for row in rows}
+
+    @read_from_replica
     async def get_causas_ids_by_actor_id(self, cedula: str) -> list[str]:
         actor = await Litigante.get(cedula=cedula).prefetch_related("causas_actor")
         causas: list[str] = await actor.causas_actor.all().values_list("idJuicio", flat=True)  # type: ignore
         return causas
 
+    @read_from_replica
     async def get_causas_ids_by_demandado_id(self, cedula: str) -> list[str]:
         demandado = await Litigante.get(cedula=cedula).prefetch_related("causas_demandado")
         causas: list[str] = await demandado.causas_demandado.all().values_list("idJuicio", flat=True)  # type: ignore
         return causas
 
+    @read_from_replica
     async def get_causas_by_cedula(self, cedula: str, tipo: LitiganteTipo) -> list[SerializedCausaSchema]:
         if tipo == LitiganteTipo.ACTOR:
-            raw_causas = await Causa.filter(actores__cedula=cedula).prefetch_related(
+            raw_causas = await Causa.filter(actores=cedula).prefetch_related(
                 "actores", "demandados", "movimientos__incidentes", "movimientos__incidentes__judicatura"
             )
         else:
-            raw_causas = await Causa.filter(demandados__cedula=cedula).prefetch_related(
+            raw_causas = await Causa.filter(demandados=cedula).prefetch_related(
                 "actores", "demandados", "movimientos__incidentes", "movimientos__incidentes__judicatura"
             )
         causas = [await _serialize_causa(causa) for causa in raw_causas]
         return causas
 
+    @read_from_replica
     async def get_actuaciones_by_incidente(self, incidente_id: int) -> list[SerializedActuacionSchema]:
         incidente = await Incidente.get(idIncidente=incidente_id).prefetch_related("actuaciones")
         actuaciones_raw = await incidente.actuaciones.all()
         actuaciones = [SerializedActuacionSchema.model_validate(actuacion) for actuacion in actuaciones_raw]
         return actuaciones
 
+    @read_from_replica
     async def get_serialized_causas_by_id(self, causas_ids: list[str]) -> list[SerializedCausaSchema]:
         raw_causas = await Causa.filter(idJuicio__in=causas_ids).prefetch_related(
             "actores", "demandados", "movimientos__incidentes", "movimientos__incidentes__judicatura"
@@ -252,11 +374,16 @@ class DBService:
         causas = [await _serialize_causa(causa) for causa in raw_causas]
         return causas
 
+    @read_from_replica
     async def get_all_causas_ids(self) -> list[str]:
         causas: list[str] = await Causa.all().values_list("idJuicio", flat=True)  # type: ignore
         return causas
 
+    @read_from_replica
     async def get_actuaciones_by_causa_id(self, causa_id: str) -> list[SerializedActuacionSchema]:
-        actuaciones_raw = await Actuacion.filter(incidente__movimiento__causa__idJuicio=causa_id)
+        # Tortoise joins with LEFT OUTER JOIN, which SQLite does not reorder: it would scan actuacion first
+        movimientos = Movimiento.filter(causa_id=causa_id).values("idMovimientoJuicioIncidente")
+        incidentes = Incidente.filter(movimiento_id__in=Subquery(movimientos)).values("idIncidente")
+        actuaciones_raw = await Actuacion.filter(incidente_id__in=Subquery(incidentes))
         actuaciones = [SerializedActuacionSchema.model_validate(actuacion) for actuacion in actuaciones_raw]
         return actuaciones
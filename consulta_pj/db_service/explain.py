@@ -0,0 +1,26 @@
+from typing import Any
+
+import orjson
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+
+async def sequential_scans(connection: BaseDBAsyncClient, sql: str, values: list[Any] | None = None) -> list[str]:
+    """Tables the plan of ``sql`` with ``values`` reads in full instead of looking rows up through an index.
+
+    On SQLite these are the ``SCAN`` steps of ``EXPLAIN QUERY PLAN``, on PostgreSQL the ``Seq Scan`` nodes of
+    ``EXPLAIN``. PostgreSQL prefers sequential scans of small or unanalyzed tables, check plans on analyzed data.
+    """
+    if connection.capabilities.dialect == "sqlite":
+        _, rows = await connection.execute_query(f"EXPLAIN QUERY PLAN {sql}", values)
+        return [row["detail"].split()[1] for row in rows if row["detail"].startswith("SCAN ")]
+    _, rows = await connection.execute_query(f"EXPLAIN (FORMAT JSON) {sql}", values)
+    plan = rows[0][0]
+    [root] = orjson.loads(plan) if isinstance(plan, (str, bytes)) else plan
+    return _seq_scans(root["Plan"])
+
+
+def _seq_scans(node: dict[str, Any]) -> list[str]:
+    scans = [node["Relation Name"]] if node["Node Type"] == "Seq Scan" else []
+    for child in node.get("Plans", []):
+        scans.extend(_seq_scans(child))
+    return scans
@@ -0,0 +1,66 @@
+import importlib
+import logging
+import pkgutil
+from dataclasses import dataclass
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.transactions import in_transaction
+
+from consulta_pj.db_service.models import Causa
+
+MIGRATIONS_TABLE = "schema_migration"
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    upgrade: dict[str, str]
+
+    def statements(self, dialect: str) -> list[str]:
+        # Statements end with a semicolon at the end of a line
+        return [statement.strip() for statement in self.upgrade[dialect].split(";\n") if statement.strip()]
+
+
+def load_migrations() -> list[Migration]:
+    """Migrations of this package in version order, from their ``m<version>_<name>`` modules."""
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        version, _, name = module_info.name.removeprefix("m").partition("_")
+        module = importlib.import_module(f"{__name__}.{module_info.name}")
+        migrations.append(Migration(version=int(version), name=name, upgrade=module.UPGRADE))
+    return sorted(migrations, key=lambda migration: migration.version)
+
+
+async def migrate(connection: BaseDBAsyncClient | None = None) -> list[int]:
+    """Applies the migrations ``connection`` is missing, each in its own transaction, and returns their versions.
+
+    This replaces ``generate_schemas``: the initial migration is the schema it created before versioned migrations
+    and only creates what does not exist yet, so such a database adopts it and gets the later migrations applied.
+    """
+    connection = connection or Causa._meta.db
+    dialect = connection.capabilities.dialect
+    await connection.execute_script(
+        f'CREATE TABLE IF NOT EXISTS "{MIGRATIONS_TABLE}" ('
+        '"version" INT NOT NULL PRIMARY KEY, "name" VARCHAR(255) NOT NULL, '
+        '"applied_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)'
+    )
+    applied = []
+    for migration in load_migrations():
+        async with in_transaction(connection.connection_name) as transaction:
+            if dialect == "postgres":
+                # Processes starting together apply each migration once
+                await transaction.execute_query("SELECT pg_advisory_xact_lock(hashtext($1))", [MIGRATIONS_TABLE])
+            _, rows = await transaction.execute_query(
+                f'SELECT 1 FROM "{MIGRATIONS_TABLE}" WHERE "version" = {migration.version}'
+            )
+            if rows:
+                continue
+            for statement in migration.statements(dialect):
+                await transaction.execute_query(statement)
+            await transaction.execute_query(
+                f'INSERT INTO "{MIGRATIONS_TABLE}" ("version", "name") VALUES ({migration.version}, \'{migration.name}\')'
+            )
+        logging.warning(f"Applied migration {migration.version} {migration.name}")
+        applied.append(migration.version)
+    return applied
@@ -0,0 +1,19 @@
+"""Indexes for the read path, foreign keys are not indexed by either database.
+
+- ``get_actuaciones_by_causa_id`` and ``_serialize_grouped_movimientos_list`` walk causa -> movimiento -> incidente ->
+  actuacion, and group the incidentes by judicatura.
+- Serializing a causa or an incidente reads its litigantes and implicados through the M2M tables by causa or
+  incidente, their unique indexes only cover the litigante or implicado side.
+"""
+
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS "idx_movimiento_causa" ON "movimiento" ("causa_id");
+CREATE INDEX IF NOT EXISTS "idx_incidente_movimiento_judicatura" ON "incidente" ("movimiento_id", "judicatura_id");
+CREATE INDEX IF NOT EXISTS "idx_actuacion_incidente" ON "actuacion" ("incidente_id");
+CREATE INDEX IF NOT EXISTS "idx_causa_litigante_actor_causa" ON "causa_litigante_actor" ("causa_id", "litigante_id");
+CREATE INDEX IF NOT EXISTS "idx_causa_litigante_demandado_causa" ON "causa_litigante_demandado" ("causa_id", "litigante_id");
+CREATE INDEX IF NOT EXISTS "idx_incidente_implicado_actor_incidente" ON "incidente_implicado_actor" ("incidente_id", "implicado_id");
+CREATE INDEX IF NOT EXISTS "idx_incidente_implicado_demandado_incidente" ON "incidente_implicado_demandado" ("incidente_id", "implicado_id");
+"""
+
+UPGRADE = {"sqlite": _INDEXES, "postgres": _INDEXES}
@@ -0,0 +1,14 @@
+"""Change markers of a causa for incremental crawls, ``causa`` already holds rows so they are nullable."""
+
+UPGRADE = {
+    "sqlite": """
+ALTER TABLE "causa" ADD COLUMN "fechaProvidencia" TIMESTAMP;
+ALTER TABLE "causa" ADD COLUMN "idEstadoJuicio" INT;
+ALTER TABLE "causa" ADD COLUMN "estadoActual" VARCHAR(64);
+""",
+    "postgres": """
+ALTER TABLE "causa" ADD COLUMN IF NOT EXISTS "fechaProvidencia" TIMESTAMPTZ;
+ALTER TABLE "causa" ADD COLUMN IF NOT EXISTS "idEstadoJuicio" INT;
+ALTER TABLE "causa" ADD COLUMN IF NOT EXISTS "estadoActual" VARCHAR(64);
+""",
+}
@@ -0,0 +1,46 @@
+"""Durable crawl jobs of ``python -m consulta_pj.jobs``."""
+
+UPGRADE = {
+    "sqlite": r"""
+CREATE TABLE IF NOT EXISTS "crawl_job" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "batch" VARCHAR(64) NOT NULL,
+    "kind" VARCHAR(9) NOT NULL  /* LITIGANTE: litigante\nCAUSA: causa */,
+    "key" VARCHAR(64) NOT NULL,
+    "tipo" VARCHAR(16) NOT NULL  DEFAULT '',
+    "status" VARCHAR(7) NOT NULL  DEFAULT 'pending' /* PENDING: pending\nRUNNING: running\nDONE: done\nFAILED: failed */,
+    "attempts" INT NOT NULL  DEFAULT 0,
+    "payload" JSON,
+    "error" TEXT,
+    "worker" VARCHAR(64),
+    "created_at" TIMESTAMP NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "started_at" TIMESTAMP,
+    "heartbeat_at" TIMESTAMP,
+    "finished_at" TIMESTAMP,
+    CONSTRAINT "uid_crawl_job_batch_3df6de" UNIQUE ("batch", "kind", "key", "tipo")
+);
+CREATE INDEX IF NOT EXISTS "idx_crawl_job_batch_b435b5" ON "crawl_job" ("batch", "status");
+""",
+    "postgres": r"""
+CREATE TABLE IF NOT EXISTS "crawl_job" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "batch" VARCHAR(64) NOT NULL,
+    "kind" VARCHAR(9) NOT NULL,
+    "key" VARCHAR(64) NOT NULL,
+    "tipo" VARCHAR(16) NOT NULL  DEFAULT '',
+    "status" VARCHAR(7) NOT NULL  DEFAULT 'pending',
+    "attempts" INT NOT NULL  DEFAULT 0,
+    "payload" JSONB,
+    "error" TEXT,
+    "worker" VARCHAR(64),
+    "created_at" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "started_at" TIMESTAMPTZ,
+    "heartbeat_at" TIMESTAMPTZ,
+    "finished_at" TIMESTAMPTZ,
+    CONSTRAINT "uid_crawl_job_batch_3df6de" UNIQUE ("batch", "kind", "key", "tipo")
+);
+CREATE INDEX IF NOT EXISTS "idx_crawl_job_batch_b435b5" ON "crawl_job" ("batch", "status");
+COMMENT ON COLUMN "crawl_job"."kind" IS 'LITIGANTE: litigante\nCAUSA: causa';
+COMMENT ON COLUMN "crawl_job"."status" IS 'PENDING: pending\nRUNNING: running\nDONE: done\nFAILED: failed';
+""",
+}
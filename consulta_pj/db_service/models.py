@@ -3,6 +3,8 @@ from __future__ import annotations
 from tortoise import fields
 from tortoise.models import Model
 
+from .schemas import JobKind, JobStatus
+
 
 class Litigante(Model):
     cedula = fields.CharField(max_length=24, primary_key=True)
@@ -20,6 +22,9 @@ class Causa(Model):
     idJuicio = fields.CharField(max_length=64, primary_key=True)
     nombreDelito = fields.CharField(max_length=255)
     fechaIngreso = fields.DatetimeField()
+    fechaProvidencia = fields.DatetimeField(null=True)
+    idEstadoJuicio = fields.IntField(null=True)
+    estadoActual = fields.CharField(max_length=64, null=True)
 
     actores: fields.ManyToManyRelation[Litigante]
     demandados: fields.ManyToManyRelation[Litigante]
@@ -87,3 +92,25 @@ class Actuacion(Model):
     tipo = fields.TextField()
     actividad = fields.TextField()
     nombreArchivo = fields.CharField(max_length=255, null=True)
+
+
+class CrawlJob(Model):
+    id = fields.IntField(primary_key=True)
+    batch = fields.CharField(max_length=64)
+    kind = fields.CharEnumField(JobKind)
+    key = fields.CharField(max_length=64)
+    tipo = fields.CharField(max_length=16, default="")
+    status = fields.CharEnumField(JobStatus, default=JobStatus.PENDING)
+    attempts = fields.IntField(default=0)
+    payload = fields.JSONField(null=True)
+    error = fields.TextField(null=True)
+    worker = fields.CharField(max_length=64, null=True)
+    created_at = fields.DatetimeField(auto_now_add=True)
+    started_at = fields.DatetimeField(null=True)
+    heartbeat_at = fields.DatetimeField(null=True)
+    finished_at = fields.DatetimeField(null=True)
+
+    class Meta:
+        table = "crawl_job"
+        unique_together = (("batch", "kind", "key", "tipo"),)
+        indexes = (("batch", "status"),)
@@ -0,0 +1,139 @@
+import time
+from typing import Any
+
+from tortoise import connections
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.backends.base.config_generator import expand_db_url
+from tortoise.exceptions import ConfigurationError
+
+from consulta_pj.settings import Settings
+
+from .models import Causa
+from .replica import REPLICA_CONNECTION
+from .schemas import DBPoolStats
+
+MODELS = ["consulta_pj.db_service.models"]
+WRITE_CONNECTION = "writes"
+ASYNCPG_ENGINE = "consulta_pj.db_service.asyncpg_client"
+
+
+def tortoise_config(settings: Settings) -> dict[str, Any]:
+    """Tortoise config of ``settings``, with the pools sized and tuned by the ``DB_*`` settings on PostgreSQL.
+
+    The default connection serves the API. Bulk writes of the crawler go through a ``writes`` pool of their own,
+    unless ``DB_WRITE_POOL_MAX_SIZE`` is 0, so that a large load can not hold every connection API requests need.
+    With ``DB_REPLICA_URL``, the reads of ``replica_reads`` blocks go to a ``replica`` connection.
+    """
+    default = _connection_config(settings, settings.db_uri, settings.DB_POOL_MIN_SIZE, settings.DB_POOL_MAX_SIZE)
+    db_connections = {"default": default}
+    config: dict[str, Any] = {
+        "connections": db_connections,
+        "apps": {"models": {"models": MODELS, "default_connection": "default"}},
+    }
+    if default["engine"] == ASYNCPG_ENGINE and settings.DB_WRITE_POOL_MAX_SIZE > 0:
+        db_connections[WRITE_CONNECTION] = _connection_config(
+            settings, settings.db_uri, settings.DB_WRITE_POOL_MIN_SIZE, settings.DB_WRITE_POOL_MAX_SIZE
+        )
+    if settings.DB_REPLICA_URL:
+        db_connections[REPLICA_CONNECTION] = _connection_config(
+            settings, settings.DB_REPLICA_URL, settings.DB_POOL_MIN_SIZE, settings.DB_POOL_MAX_SIZE
+        )
+        config["routers"] = ["consulta_pj.db_service.replica.ReplicaRouter"]
+    return config
+
+
+def _connection_config(settings: Settings, url: str, min_size: int, max_size: int) -> dict[str, Any]:
+    connection = expand_db_url(url)
+    if connection["engine"] == "tortoise.backends.asyncpg":
+        connection["engine"] = ASYNCPG_ENGINE
+        connection["credentials"].update(_pool_credentials(settings, min_size, max_size))
+    return connection
+
+
+def _pool_credentials(settings: Settings, min_size: int, max_size: int) -> dict[str, Any]:
+    # Passed on to asyncpg.create_pool
+    return {
+        "minsize": min_size,
+        "maxsize": max_size,
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "command_timeout": settings.DB_COMMAND_TIMEOUT or None,
+        "max_queries": settings.DB_CONNECTION_MAX_QUERIES,
+        "max_inactive_connection_lifetime": settings.DB_CONNECTION_MAX_IDLE,
+    }
+
+
+def write_connection() -> BaseDBAsyncClient:
+    """Connection of the bulk writes, the ``writes`` pool if the config has one and else the models' connection."""
+    try:
+        return connections.get(WRITE_CONNECTION)
+    except ConfigurationError:
+        return Causa._meta.db
+
+
+class MeteredPool:
+    """Connection pool that records how long ``acquire`` waits for a connection, everything else is ``pool``'s."""
+
+    def __init__(self, pool: Any) -> None:
+        self.pool = pool
+        self.acquires = 0
+        self.waited = 0
+        self.waiting = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        # Connections handed out or being acquired, the pool's own size leaves out the ones still connecting
+        self._claimed = 0
+
+    async def acquire(self, *, timeout: float | None = None) -> Any:
+        # Only a full pool makes acquire wait, growing the pool is not counted as waiting
+        saturated = self._claimed >= self.pool.get_max_size()
+        start = time.monotonic()
+        self._claimed += 1
+        self.waiting += saturated
+        try:
+            connection = await self.pool.acquire(timeout=timeout)
+        except BaseException:
+            self._claimed -= 1
+            raise
+        finally:
+            wait = time.monotonic() - start
+            self.acquires += 1
+            if saturated:
+                self.waiting -= 1
+                self.waited += 1
+                self.wait_seconds_total += wait
+                self.wait_seconds_max = max(self.wait_seconds_max, wait)
+        return connection
+
+    async def release(self, connection: Any, *, timeout: float | None = None) -> None:
+        self._claimed -= 1
+        await self.pool.release(connection, timeout=timeout)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.pool, name)
+
+    def stats(self, connection: str) -> DBPoolStats:
+        max_size = self.pool.get_max_size()
+        in_use = self.pool.get_size() - self.pool.get_idle_size()
+        return DBPoolStats(
+            connection=connection,
+            min_size=self.pool.get_min_size(),
+            max_size=max_size,
+            size=self.pool.get_size(),
+            in_use=in_use,
+            waiting=self.waiting,
+            saturation=in_use / max_size if max_size else 0.0,
+            acquires=self.acquires,
+            waited=self.waited,
+            wait_seconds_total=self.wait_seconds_total,
+            wait_seconds_max=self.wait_seconds_max,
+        )
+
+
+def pool_stats() -> list[DBPoolStats]:
+    """Stats of the pools of the configured connections, SQLite connections have none."""
+    stats = []
+    for connection in connections.all():
+        pool = getattr(connection, "_pool", None)
+        if isinstance(pool, MeteredPool):
+            stats.append(pool.stats(connection.connection_name))
+    return stats
@@ -0,0 +1,104 @@
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import AsyncIterator, Awaitable, Callable, ParamSpec, TypeVar
+
+from tortoise import connections
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.exceptions import ConfigurationError
+from tortoise.models import Model
+
+from consulta_pj.settings import get_settings
+
+REPLICA_CONNECTION = "replica"
+
+T = TypeVar("T")
+P = ParamSpec("P")
+
+_read_connection: ContextVar[str | None] = ContextVar("read_connection", default=None)
+
+
+class ReplicaRouter:
+    """Tortoise router that sends the reads of ``replica_reads`` blocks to the replica, everything else to the models'
+    connection."""
+
+    def db_for_read(self, model: type[Model]) -> str | None:
+        return _read_connection.get()
+
+    def db_for_write(self, model: type[Model]) -> str | None:
+        return None
+
+
+class ReplicaLag:
+    """Replication lag of the replica, measured at most once every ``check_interval`` seconds."""
+
+    def __init__(self) -> None:
+        self.lag = 0.0
+        self.checked_at = -math.inf
+
+    async def within(self, connection: BaseDBAsyncClient, max_lag: float, check_interval: float) -> bool:
+        now = time.monotonic()
+        if now - self.checked_at >= check_interval:
+            self.checked_at = now
+            try:
+                self.lag = await measure_replica_lag(connection)
+            except Exception as e:
+                logging.warning(f"Measuring the replica lag failed, reading from the primary: {e}")
+                self.lag = math.inf
+            if self.lag > max_lag:
+                logging.warning(f"Replica lags {self.lag:.1f}s behind the primary, reading from the primary")
+        return self.lag <= max_lag
+
+
+_replica_lag = ReplicaLag()
+
+
+async def measure_replica_lag(connection: BaseDBAsyncClient) -> float:
+    """Seconds the replica is behind its primary, 0 when it has replayed everything it received."""
+    if connection.capabilities.dialect != "postgres":
+        return 0.0
+    # An idle primary sends nothing, so the last replayed transaction only tells the lag while WAL is pending
+    _, rows = await connection.execute_query(
+        "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END AS lag"
+    )
+    return float(rows[0]["lag"])
+
+
+def replica_connection() -> BaseDBAsyncClient | None:
+    try:
+        return connections.get(REPLICA_CONNECTION)
+    except ConfigurationError:
+        return None
+
+
+@asynccontextmanager
+async def replica_reads() -> AsyncIterator[None]:
+    """Sends the reads of the block to the replica, if one is configured and it lags at most ``DB_REPLICA_MAX_LAG``
+    seconds behind the primary. Writes always go to the primary."""
+    replica = replica_connection()
+    settings = get_settings()
+    if replica is None or not await _replica_lag.within(
+        replica, settings.DB_REPLICA_MAX_LAG, settings.DB_REPLICA_LAG_CHECK_INTERVAL
+    ):
+        yield
+        return
+    token = _read_connection.set(REPLICA_CONNECTION)
+    try:
+        yield
+    finally:
+        _read_connection.reset(token)
+
+
+def read_from_replica(func: Callable[P, Awaitable[T]]) -> Callable[P, Awaitable[T]]:
+    """Runs ``func`` inside ``replica_reads``, for read-only methods that can serve slightly stale rows."""
+
+    @wraps(func)
+    async def decorated(*args: P.args, **kwargs: P.kwargs) -> T:
+        async with replica_reads():
+            return await func(*args, **kwargs)
+
+    return decorated
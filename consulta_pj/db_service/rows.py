@@ -0,0 +1,188 @@
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Self
+
+from pypika import Table
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.transactions import in_transaction
+
+from consulta_pj.crawler import (
+    ActuacionSchema,
+    CausaSchema,
+    ImplicadoSchema,
+    IncidenteSchema,
+    JudicaturaSchema,
+)
+
+from .models import Actuacion, Causa, Implicado, Incidente, Judicatura, Movimiento
+from .pool import write_connection
+from .schemas import UpsertResult
+from .upsert import bulk_load
+
+
+def causa_row(causa: CausaSchema) -> Causa:
+    return Causa(
+        idJuicio=causa.idJuicio,
+        nombreDelito=causa.nombreDelito.strip(),
+        fechaIngreso=causa.fechaIngreso,
+        fechaProvidencia=causa.fechaProvidencia,
+        idEstadoJuicio=causa.idEstadoJuicio,
+        estadoActual=causa.estadoActual,
+    )
+
+
+def judicatura_row(judicatura: JudicaturaSchema) -> Judicatura:
+    return Judicatura(
+        idJudicatura=judicatura.idJudicatura,
+        ciudad=judicatura.ciudad.strip(),
+        nombreJudicatura=judicatura.nombre.strip(),
+    )
+
+
+def movimiento_row(id_movimiento: int, causa_id: str) -> Movimiento:
+    return Movimiento(idMovimientoJuicioIncidente=id_movimiento, causa_id=causa_id)
+
+
+def incidente_row(incidente: IncidenteSchema, judicatura_id: str, movimiento_id: int) -> Incidente:
+    return Incidente(
+        idIncidente=incidente.idIncidente,
+        fechaCrea=incidente.fechaCrea,
+        judicatura_id=judicatura_id,
+        movimiento_id=movimiento_id,
+    )
+
+
+def actuacion_row(actuacion: ActuacionSchema, judicatura_id: str, incidente_id: int) -> Actuacion:
+    return Actuacion(
+        uuid=actuacion.uuid,
+        codigo=actuacion.codigo,
+        incidente_id=incidente_id,
+        actividad=actuacion.actividad,
+        fecha=actuacion.fecha,
+        tipo=actuacion.tipo.strip(),
+        judicatura_id=judicatura_id,
+        nombreArchivo=actuacion.nombreArchivo.strip() if actuacion.nombreArchivo else None,
+    )
+
+
+def implicado_row(implicado: ImplicadoSchema) -> Implicado:
+    representante = implicado.representante.strip() if implicado.representante else None
+    return Implicado(id=implicado.idImplicado, nombre=implicado.nombre, representante=representante)
+
+
+class CausaRows:
+    """Rows of every table a set of crawled causas is written to, keyed by primary key so each row is written once."""
+
+    def __init__(self) -> None:
+        self.causas: dict[str, Causa] = {}
+        self.judicaturas: dict[str, Judicatura] = {}
+        self.movimientos: dict[int, Movimiento] = {}
+        self.incidentes: dict[int, Incidente] = {}
+        self.actuaciones: dict[str, Actuacion] = {}
+        self.implicados: dict[int, Implicado] = {}
+        # (implicado, incidente) pairs of the through tables
+        self.incidentes_actor: set[tuple[int, int]] = set()
+        self.incidentes_demandado: set[tuple[int, int]] = set()
+
+    @classmethod
+    def from_causas(cls, causas: list[CausaSchema]) -> Self:
+        rows = cls()
+        for causa in causas:
+            rows.add_causa(causa)
+        return rows
+
+    def add_causa(self, causa: CausaSchema) -> None:
+        # Change markers are written with the rest of the causa, a failed causa is rolled back with its markers
+        self.causas[causa.idJuicio] = causa_row(causa)
+        for movimiento in causa.movimientos:
+            judicatura_id = movimiento.judicatura.idJudicatura
+            self.judicaturas[judicatura_id] = judicatura_row(movimiento.judicatura)
+            self.movimientos[movimiento.idMovimiento] = movimiento_row(movimiento.idMovimiento, causa.idJuicio)
+            for incidente in movimiento.incidentes:
+                self.incidentes[incidente.idIncidente] = incidente_row(
+                    incidente, judicatura_id, movimiento.idMovimiento
+                )
+                for actuacion in incidente.actuaciones:
+                    self.actuaciones[actuacion.uuid] = actuacion_row(actuacion, judicatura_id, incidente.idIncidente)
+                self.add_implicados(incidente)
+
+    def add_implicados(self, incidente: IncidenteSchema) -> None:
+        for actor in incidente.actores:
+            self.implicados[actor.idImplicado] = implicado_row(actor)
+            self.incidentes_actor.add((actor.idImplicado, incidente.idIncidente))
+        for demandado in incidente.demandados:
+            self.implicados[demandado.idImplicado] = implicado_row(demandado)
+            self.incidentes_demandado.add((demandado.idImplicado, incidente.idIncidente))
+
+    async def write(self, connection: BaseDBAsyncClient) -> dict[str, UpsertResult]:
+        """Upserts the rows with one merge per table, parents before children."""
+        results = {
+            "judicatura": await bulk_load(connection, Judicatura, list(self.judicaturas.values())),
+            "causa": await bulk_load(connection, Causa, list(self.causas.values())),
+            "movimiento": await bulk_load(connection, Movimiento, list(self.movimientos.values())),
+            "incidente": await bulk_load(connection, Incidente, list(self.incidentes.values())),
+            "actuacion": await bulk_load(connection, Actuacion, list(self.actuaciones.values())),
+        }
+        results["implicado"] = await self.write_implicados(connection)
+        return results
+
+    async def write_implicados(self, connection: BaseDBAsyncClient) -> UpsertResult:
+        """Upserts the implicados and links them to their incidentes by id, without fetching the incidentes."""
+        result = await bulk_load(connection, Implicado, list(self.implicados.values()))
+        await _link_implicados(connection, "incidentes_actor", self.incidentes_actor)
+        await _link_implicados(connection, "incidentes_demandado", self.incidentes_demandado)
+        return result
+
+
+async def write_causas(causas: list[CausaSchema]) -> list[tuple[str, str]]:
+    """Writes ``causas`` in one transaction and returns ``(idJuicio, error)`` per causa.
+
+    They are first written together under a savepoint. If that fails, they are written again causa by causa, each
+    under its own savepoint, so that a bad causa fails alone.
+    """
+    async with in_transaction(write_connection().connection_name) as connection:
+        try:
+            async with _savepoint(connection, "persist_chunk"):
+                results = await CausaRows.from_causas(causas).write(connection)
+            logging.debug(f"Wrote {len(causas)} causas: {results}")
+            return [(causa.idJuicio, "") for causa in causas]
+        except Exception as e:
+            logging.warning(f"Writing {len(causas)} causas together failed, isolating them: {e}")
+
+        id_causas: list[tuple[str, str]] = []
+        for causa in causas:
+            try:
+                async with _savepoint(connection, "persist_causa"):
+                    await CausaRows.from_causas([causa]).write(connection)
+                id_causas.append((causa.idJuicio, ""))
+            except Exception as e:
+                logging.exception(e)
+                id_causas.append((causa.idJuicio, str(e)))
+        return id_causas
+
+
+@asynccontextmanager
+async def _savepoint(connection: BaseDBAsyncClient, name: str) -> AsyncIterator[None]:
+    # Nested Tortoise transactions do not use savepoints, a failure would roll back the whole outer transaction
+    await connection.execute_query(f"SAVEPOINT {name}")
+    try:
+        yield
+    except BaseException:
+        await connection.execute_query(f"ROLLBACK TO SAVEPOINT {name}")
+        await connection.execute_query(f"RELEASE SAVEPOINT {name}")
+        raise
+    await connection.execute_query(f"RELEASE SAVEPOINT {name}")
+
+
+async def _link_implicados(connection: BaseDBAsyncClient, relation: str, pairs: set[tuple[int, int]]) -> None:
+    if not pairs:
+        return
+    field = Implicado._meta.fields_map[relation]
+    through_table = Table(field.through)  # type: ignore[attr-defined]
+    query = connection.query_class.into(through_table).columns(
+        field.backward_key,  # type: ignore[attr-defined]
+        field.forward_key,  # type: ignore[attr-defined]
+    )
+    for implicado_id, incidente_id in sorted(pairs):
+        query = query.insert(implicado_id, incidente_id)
+    await connection.execute_query(str(query.on_conflict().do_nothing()))
@@ -1,3 +1,5 @@
+from enum import StrEnum
+
 from pydantic import BaseModel
 
 from consulta_pj.crawler import ActuacionSchema as CrawlerActuacionSchema
@@ -14,3 +16,35 @@ class CreateActuacionRequest(BaseModel):
     actuacion: CrawlerActuacionSchema
     judicatura_id: str
     incidente_id: int
+
+
+class JobKind(StrEnum):
+    LITIGANTE = "litigante"
+    CAUSA = "causa"
+
+
+class JobStatus(StrEnum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class UpsertResult(BaseModel):
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
+
+class DBPoolStats(BaseModel):
+    connection: str
+    min_size: int
+    max_size: int
+    size: int
+    in_use: int
+    waiting: int
+    saturation: float
+    acquires: int
+    waited: int
+    wait_seconds_total: float
+    wait_seconds_max: float
@@ -59,9 +59,7 @@ class SerializedCausaSchema(BaseModel):
 
 async def _serialize_grouped_movimientos_list(idJuicio: str) -> list[GroupedMovimientosSchema]:
     incidentes_raw = (
-        await Incidente.filter(movimiento__causa__idJuicio=idJuicio)
-        .prefetch_related("judicatura")
-        .order_by("judicatura__idJudicatura")
+        await Incidente.filter(movimiento__causa_id=idJuicio).prefetch_related("judicatura").order_by("judicatura_id")
     )
     grouped_incidentes = itertools.groupby(incidentes_raw, key=lambda incidente: incidente.judicatura.idJudicatura)
     grouped_movimientos = [
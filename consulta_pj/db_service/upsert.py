@@ -0,0 +1,153 @@
+from typing import Any, Iterator, Sequence
+
+from pypika import Table
+from pypika.enums import Comparator
+from pypika.terms import BasicCriterion, Criterion
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.backends.base.executor import BaseExecutor
+from tortoise.models import Model
+
+from .schemas import UpsertResult
+
+# Below the bind parameter limits of PostgreSQL (32767) and SQLite (32766)
+MAX_STATEMENT_PARAMETERS = 32000
+# Smaller sets are cheaper as multi-row statements than as a staging table
+COPY_MIN_ROWS = 1000
+
+
+class _Distinct(Comparator):
+    # Null-safe inequality, SQLite only supports IS DISTINCT FROM since 3.39
+    is_distinct_from = " IS DISTINCT FROM "
+    is_not = " IS NOT "
+
+
+async def bulk_load(connection: BaseDBAsyncClient, model: type[Model], objects: Sequence[Model]) -> UpsertResult:
+    """Upserts ``objects`` with ``copy_upsert`` when the set is large and ``connection`` is asyncpg, else ``upsert``."""
+    if len(objects) >= COPY_MIN_ROWS and connection.capabilities.dialect == "postgres":
+        async with connection.acquire_connection() as raw_connection:
+            if hasattr(raw_connection, "copy_records_to_table"):
+                return await copy_upsert(raw_connection, connection, model, objects)
+    return await upsert(connection, model, objects)
+
+
+async def upsert(connection: BaseDBAsyncClient, model: type[Model], objects: Sequence[Model]) -> UpsertResult:
+    """Inserts ``objects`` and updates the existing rows whose values changed, with multi-row statements.
+
+    ``INSERT ... ON CONFLICT DO UPDATE ... WHERE <any column IS DISTINCT FROM excluded>`` leaves unchanged rows alone
+    and returns the keys of the inserted and updated ones, which tells them apart from the keys that already existed.
+    """
+    # bulk_create of Tortoise 0.21 runs one statement per row and, with update_fields, repeats the conflict target of
+    # models without generated fields
+    objects = _unique(objects)
+    result = UpsertResult()
+    if not objects:
+        return result
+    executor = connection.executor_class(model=model, db=connection)
+    fields, columns = executor._prepare_insert_columns(include_generated=True)
+    table = model._meta.basetable
+    pk_column = model._meta.db_pk_column
+    excluded = Table("excluded")
+    distinct = _Distinct.is_not if connection.capabilities.dialect == "sqlite" else _Distinct.is_distinct_from
+    update_columns, compared_columns = _update_columns(model, fields, columns)
+
+    rows_per_statement = MAX_STATEMENT_PARAMETERS // len(columns)
+    for start in range(0, len(objects), rows_per_statement):
+        chunk = objects[start : start + rows_per_statement]
+        keys = [instance.pk for instance in chunk]
+        select_query = connection.query_class.from_(table).select(table[pk_column]).where(table[pk_column].isin(keys))
+        _, existing_rows = await connection.execute_query(str(select_query))
+        existing = {row[pk_column] for row in existing_rows}
+
+        query = connection.query_class.into(table).columns(*columns)
+        for row in range(len(chunk)):
+            query = query.insert(*[executor.parameter(row * len(columns) + index) for index in range(len(columns))])
+        query = query.on_conflict(pk_column)
+        if update_columns:
+            for column in update_columns:
+                query = query.do_update(column)
+            query = query.where(
+                Criterion.any(
+                    [BasicCriterion(distinct, table[column], excluded[column]) for column in compared_columns]
+                )
+            )
+        else:
+            query = query.do_nothing()
+        values = [value for record in _records(executor, fields, chunk) for value in record]
+        _, written_rows = await connection.execute_query(f'{query} RETURNING "{pk_column}"', values)
+        written = {row[pk_column] for row in written_rows}
+
+        result.inserted += len(written - existing)
+        result.updated += len(written & existing)
+        result.unchanged += len(existing - written)
+    return result
+
+
+async def copy_upsert(
+    raw_connection: Any, connection: BaseDBAsyncClient, model: type[Model], objects: Sequence[Model]
+) -> UpsertResult:
+    """Upserts ``objects`` like ``upsert``, streaming them with binary ``COPY`` through an asyncpg connection.
+
+    The rows are copied into a temporary staging table shaped like the model's table and merged with one
+    ``INSERT ... SELECT ... ON CONFLICT DO UPDATE``, which counts the inserted and updated rows itself.
+    """
+    objects = _unique(objects)
+    if not objects:
+        return UpsertResult()
+    executor = connection.executor_class(model=model, db=connection)
+    fields, columns = executor._prepare_insert_columns(include_generated=True)
+    table = model._meta.db_table
+    stage = f"stage_{table}"
+    pk_column = model._meta.db_pk_column
+    update_columns, compared_columns = _update_columns(model, fields, columns)
+
+    column_list = ", ".join(f'"{column}"' for column in columns)
+    if update_columns:
+        assignments = ", ".join(f'"{column}" = EXCLUDED."{column}"' for column in update_columns)
+        changed = " OR ".join(
+            f'"{table}"."{column}" IS DISTINCT FROM EXCLUDED."{column}"' for column in compared_columns
+        )
+        conflict = f"DO UPDATE SET {assignments} WHERE {changed}"
+    else:
+        conflict = "DO NOTHING"
+    # xmax is 0 only for the rows this statement inserted
+    merge = (
+        f'WITH merged AS (INSERT INTO "{table}" ({column_list}) SELECT {column_list} FROM "{stage}" '
+        f'ORDER BY "{pk_column}" ON CONFLICT ("{pk_column}") {conflict} RETURNING xmax = 0 AS inserted) '
+        "SELECT count(*) FILTER (WHERE inserted) AS inserted, count(*) FILTER (WHERE NOT inserted) AS updated "
+        "FROM merged"
+    )
+    # Nested in a transaction of the connection this is a savepoint, the staging rows go away when it ends
+    async with raw_connection.transaction():
+        await raw_connection.execute(
+            f'CREATE TEMP TABLE IF NOT EXISTS "{stage}" (LIKE "{table}" INCLUDING DEFAULTS) ON COMMIT DELETE ROWS'
+        )
+        await raw_connection.execute(f'TRUNCATE "{stage}"')
+        await raw_connection.copy_records_to_table(stage, records=_records(executor, fields, objects), columns=columns)
+        merged = await raw_connection.fetchrow(merge)
+    return UpsertResult(
+        inserted=merged["inserted"],
+        updated=merged["updated"],
+        unchanged=len(objects) - merged["inserted"] - merged["updated"],
+    )
+
+
+def _unique(objects: Sequence[Model]) -> list[Model]:
+    # In primary key order, so concurrent writers lock the rows they share in the same order instead of deadlocking
+    return sorted({instance.pk: instance for instance in objects}.values(), key=lambda instance: instance.pk)
+
+
+def _update_columns(model: type[Model], fields: list[str], columns: list[str]) -> tuple[list[str], list[str]]:
+    pk_column = model._meta.db_pk_column
+    update_columns = [column for column in columns if column != pk_column]
+    # auto_now timestamps differ on every write, they are updated along with a change but are not one
+    compared_columns = [
+        column
+        for field, column in zip(fields, columns)
+        if column != pk_column and not getattr(model._meta.fields_map[field], "auto_now", False)
+    ]
+    return update_columns, compared_columns
+
+
+def _records(executor: BaseExecutor, fields: list[str], objects: list[Model]) -> Iterator[tuple[Any, ...]]:
+    for instance in objects:
+        yield tuple(executor.column_map[field](getattr(instance, field), instance) for field in fields)
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from contextlib import AbstractAsyncContextManager, asynccontextmanager
+from types import TracebackType
+from typing import Any, AsyncIterator, Self
+
+from consulta_pj.crawler import CausaSchema
+from consulta_pj.settings import Settings, get_settings
+
+from .rows import write_causas
+
+_active_buffer: "WriteBuffer | None" = None
+
+
+class WriteBuffer:
+    """Write-behind buffer for the causas persisted by concurrent producers, e.g. several ``process_litigante``.
+
+    Causas are collected until ``max_rows`` rows are buffered or ``max_delay`` seconds after the first of them, and
+    then written together: one transaction with one multi-row statement per table, in foreign key order. Each
+    producer gets back the results of its own causas once the flush that contains them is committed.
+
+    Flushes commit one after the other, in the order their causas were buffered, under ``lock`` if one is given.
+    """
+
+    def __init__(
+        self, max_rows: int = 5000, max_delay: float = 0.05, lock: AbstractAsyncContextManager[Any] | None = None
+    ) -> None:
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.flushes = 0
+        self._pending: list[tuple[list[CausaSchema], asyncio.Future[list[tuple[str, str]]]]] = []
+        self._pending_rows = 0
+        self._timer: asyncio.TimerHandle | None = None
+        self._flushing: set[asyncio.Task[None]] = set()
+        self._lock = lock or asyncio.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: Settings, lock: AbstractAsyncContextManager[Any] | None = None) -> Self | None:
+        if settings.DB_WRITE_BUFFER_ROWS <= 0:
+            return None
+        return cls(max_rows=settings.DB_WRITE_BUFFER_ROWS, max_delay=settings.DB_WRITE_BUFFER_DELAY, lock=lock)
+
+    async def write(self, causas: list[CausaSchema]) -> list[tuple[str, str]]:
+        """Buffers ``causas`` and returns ``(idJuicio, error)`` per causa once they are durable."""
+        if not causas:
+            return []
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[list[tuple[str, str]]] = loop.create_future()
+        self._pending.append((causas, future))
+        self._pending_rows += sum(_count_rows(causa) for causa in causas)
+        if self._pending_rows >= self.max_rows:
+            self._flush_pending()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush_pending)
+        # A cancelled producer does not take its causas out of the buffer, they are written anyway
+        return await asyncio.shield(future)
+
+    def _flush_pending(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        pending, self._pending, self._pending_rows = self._pending, [], 0
+        task = asyncio.create_task(self._flush(pending))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _flush(self, pending: list[tuple[list[CausaSchema], asyncio.Future[list[tuple[str, str]]]]]) -> None:
+        causas = [causa for producer_causas, _ in pending for causa in producer_causas]
+        async with self._lock:
+            try:
+                id_causas = await write_causas(causas)
+            except Exception as e:
+                logging.exception(e)
+                id_causas = [(causa.idJuicio, str(e)) for causa in causas]
+            self.flushes += 1
+        start = 0
+        for producer_causas, future in pending:
+            if not future.done():
+                future.set_result(id_causas[start : start + len(producer_causas)])
+            start += len(producer_causas)
+
+    async def flush(self) -> None:
+        """Writes everything buffered so far and waits until it is committed."""
+        self._flush_pending()
+        await asyncio.gather(*self._flushing)
+
+    async def __aenter__(self) -> Self:
+        global _active_buffer
+        _active_buffer = self
+        return self
+
+    async def __aexit__(
+        self, exc_type: type[BaseException] | None, exc: BaseException | None, tb: TracebackType | None
+    ) -> None:
+        global _active_buffer
+        if _active_buffer is self:
+            _active_buffer = None
+        await self.flush()
+
+
+def _count_rows(causa: CausaSchema) -> int:
+    rows = 1
+    for movimiento in causa.movimientos:
+        rows += 2
+        for incidente in movimiento.incidentes:
+            rows += 1 + len(incidente.actuaciones) + 2 * (len(incidente.actores) + len(incidente.demandados))
+    return rows
+
+
+def get_write_buffer() -> WriteBuffer | None:
+    return _active_buffer
+
+
+@asynccontextmanager
+async def write_buffer(lock: AbstractAsyncContextManager[Any] | None = None) -> AsyncIterator[WriteBuffer | None]:
+    """Uses the active write buffer or, if none is and ``DB_WRITE_BUFFER_ROWS`` is set, one for the block."""
+    active_buffer = get_write_buffer()
+    if active_buffer is not None:
+        yield active_buffer
+        return
+    buffer = WriteBuffer.from_settings(get_settings(), lock)
+    if buffer is None:
+        yield None
+        return
+    async with buffer:
+        yield buffer
@@ -1,4 +1,17 @@
+from .background import LitiganteJobs, get_litigante_jobs
 from .handler import process_litigante
-from .schemas import ProcessResponse
+from .planner import BatchPlan, process_actores, process_batch, process_demandados
+from .schemas import BatchResponse, LitiganteJob, ProcessResponse
 
-__all__ = ["ProcessResponse", "process_litigante"]
+__all__ = [
+    "BatchPlan",
+    "BatchResponse",
+    "LitiganteJob",
+    "LitiganteJobs",
+    "ProcessResponse",
+    "get_litigante_jobs",
+    "process_actores",
+    "process_batch",
+    "process_demandados",
+    "process_litigante",
+]
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from types import TracebackType
+from typing import AsyncIterator, Self
+from uuid import uuid4
+
+from consulta_pj.client import Lane, upstream_priority
+from consulta_pj.crawler import LitiganteTipo
+from consulta_pj.db_service import JobStatus
+from consulta_pj.settings import Settings
+
+from .handler import process_litigante
+from .schemas import LitiganteJob
+
+_active_jobs: "LitiganteJobs | None" = None
+
+
+class LitiganteJobs:
+    """Litigante crawls requested through the API, run in the background of this worker process.
+
+    At most ``max_concurrency`` jobs run at once, the others wait as pending. Finished jobs are kept for ``retention``
+    seconds so that their result can still be fetched.
+    """
+
+    def __init__(self, max_concurrency: int = 4, retention: float = 60 * 60) -> None:
+        self.retention = retention
+        self.jobs: dict[str, LitiganteJob] = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> Self:
+        return cls(max_concurrency=settings.API_JOBS_CONCURRENCY, retention=settings.API_JOBS_RETENTION)
+
+    def submit(self, cedula: str, tipo: LitiganteTipo, incremental: bool = False) -> LitiganteJob:
+        self._forget_expired()
+        job = LitiganteJob(
+            id=uuid4().hex, cedula=cedula, tipo=tipo, incremental=incremental, created_at=datetime.now(timezone.utc)
+        )
+        self.jobs[job.id] = job
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id: str) -> LitiganteJob | None:
+        return self.jobs.get(job_id)
+
+    async def watch(self, job_id: str, interval: float = 1.0) -> AsyncIterator[LitiganteJob]:
+        """Yields a snapshot of the job every time it changes, until it finishes."""
+        last = None
+        while (job := self.jobs.get(job_id)) is not None:
+            snapshot = job.model_copy(deep=True)
+            if snapshot != last:
+                yield snapshot
+                last = snapshot
+            if snapshot.finished:
+                return
+            await asyncio.sleep(interval)
+
+    async def _run(self, job: LitiganteJob) -> None:
+        async with self._semaphore:
+            job.status = JobStatus.RUNNING
+            job.started_at = datetime.now(timezone.utc)
+            try:
+                # Someone is waiting for the job, its requests go before bulk crawls as the synchronous endpoints do
+                with upstream_priority(Lane.INTERACTIVE):
+                    job.result = await process_litigante(
+                        job.cedula, job.tipo, raise_on_error=True, incremental=job.incremental, progress=job.progress
+                    )
+                job.status = JobStatus.DONE
+            except Exception as e:
+                logging.exception(e)
+                job.error = str(e)
+                job.status = JobStatus.FAILED
+            finally:
+                job.finished_at = datetime.now(timezone.utc)
+
+    def _forget_expired(self) -> None:
+        expired = datetime.now(timezone.utc) - timedelta(seconds=self.retention)
+        for job_id, job in list(self.jobs.items()):
+            if job.finished_at is not None and job.finished_at < expired:
+                del self.jobs[job_id]
+
+    async def __aenter__(self) -> Self:
+        global _active_jobs
+        _active_jobs = self
+        return self
+
+    async def __aexit__(
+        self, exc_type: type[BaseException] | None, exc: BaseException | None, tb: TracebackType | None
+    ) -> None:
+        global _active_jobs
+        if _active_jobs is self:
+            _active_jobs = None
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+def get_litigante_jobs() -> LitiganteJobs | None:
+    return _active_jobs
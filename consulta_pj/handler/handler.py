@@ -1,39 +1,38 @@
+import asyncio
 import logging
 
-from consulta_pj.concurrency import gather_with_concurrency, log_progress
-from consulta_pj.crawler import CausaSchema, IncidenteSchema, InformacionLitigante, LitiganteTipo, crawler
+from consulta_pj.concurrency import cancel_and_wait
+from consulta_pj.crawler import (
+    CausaMarkers,
+    CausaSchema,
+    CrawlProgress,
+    IncidenteSchema,
+    InformacionLitigante,
+    LitiganteSchema,
+    LitiganteTipo,
+    crawler,
+)
 from consulta_pj.db_service import CreateActuacionRequest, CreateIncidenteRequest, DBService
+from consulta_pj.settings import get_settings
 from consulta_pj.time_decorator import time_async
 
 from .schemas import ProcessResponse
 
 
-async def process_actores(cedulas_actores: list[str], max_concurrency: int = 15) -> None:
-    tasks = [process_litigante(cedula, LitiganteTipo.ACTOR) for cedula in cedulas_actores]
-    tasks_with_progress = (
-        log_progress("Actor", index, len(cedulas_actores), task, level=logging.WARNING)
-        for index, task in enumerate(tasks)
-    )
-    await gather_with_concurrency(max_concurrency, tasks_with_progress)
-
-
-async def process_demandados(cedulas_demandados: list[str], max_concurrency: int = 15) -> None:
-    tasks = [process_litigante(cedula, LitiganteTipo.DEMANDADO) for cedula in cedulas_demandados]
-    tasks_with_progress = (
-        log_progress("Demandado", index, len(cedulas_demandados), task, level=logging.WARNING)
-        for index, task in enumerate(tasks)
-    )
-    await gather_with_concurrency(max_concurrency, tasks_with_progress)
-
-
 @time_async
-async def process_litigante(cedula: str, tipo: LitiganteTipo, raise_on_error: bool = False) -> ProcessResponse | None:
+async def process_litigante(
+    cedula: str,
+    tipo: LitiganteTipo,
+    raise_on_error: bool = False,
+    incremental: bool = False,
+    progress: CrawlProgress | None = None,
+) -> ProcessResponse | None:
     try:
-        if tipo == LitiganteTipo.ACTOR:
-            data = await crawler.get_actor_info(cedula)
-        else:
-            data = await crawler.get_demandado_info(cedula)
-        response = await persist_causas(data)
+        known_causas = await DBService().get_causas_markers_by_cedula(cedula, tipo)
+        litigante = LitiganteSchema(cedula=cedula, tipo=tipo)
+        response = await crawl_and_persist(litigante, known_causas if incremental else None, progress)
+        response.refreshed = len([causa for causa in response.successful if causa in known_causas])
+        response.new = len(response.successful) - response.refreshed
         return response
     except Exception as e:
         logging.exception(e)
@@ -43,16 +42,68 @@ async def process_litigante(cedula: str, tipo: LitiganteTipo, raise_on_error: bo
     return None
 
 
+@time_async
+async def crawl_and_persist(
+    litigante: LitiganteSchema,
+    known_causas: dict[str, CausaMarkers] | None = None,
+    progress: CrawlProgress | None = None,
+) -> ProcessResponse:
+    settings = get_settings()
+    # Bounded so that the crawler waits for the database instead of piling crawled causas up in memory
+    queue: asyncio.Queue[CausaSchema] = asyncio.Queue(maxsize=settings.PIPELINE_QUEUE_SIZE)
+    id_causas: list[tuple[str, str]] = []
+    workers = [
+        asyncio.create_task(_persist_worker(queue, id_causas, settings.PERSIST_CHUNK_SIZE, progress))
+        for _ in range(settings.PIPELINE_PERSIST_WORKERS)
+    ]
+    try:
+        unchanged_causas, failed_causas = await crawler.crawl_litigante_into(
+            queue, litigante, crawler.get_causas_request(litigante), known_causas=known_causas, progress=progress
+        )
+        await queue.join()
+    finally:
+        await cancel_and_wait(workers)
+    id_causas.extend(failed_causas.items())
+    return await associate_litigante(litigante, id_causas, unchanged_causas)
+
+
+async def _persist_worker(
+    queue: asyncio.Queue[CausaSchema],
+    id_causas: list[tuple[str, str]],
+    chunk_size: int,
+    progress: CrawlProgress | None = None,
+) -> None:
+    while True:
+        # Whatever the crawler queued meanwhile is written in the same transaction
+        causas = [await queue.get()]
+        while len(causas) < chunk_size and not queue.empty():
+            causas.append(queue.get_nowait())
+        try:
+            persisted = await DBService().persist_causas(causas, chunk_size)
+            id_causas.extend(persisted)
+            if progress:
+                progress.causas_done += len(persisted)
+                progress.errors.update((id_causa, error) for id_causa, error in persisted if error)
+        finally:
+            for _ in causas:
+                queue.task_done()
+
+
 @time_async
 async def persist_causas(data: InformacionLitigante) -> ProcessResponse:
-    tasks_causas = [process_causa(causa) for causa in data.causas]
-    id_causas = await gather_with_concurrency(1, tasks_causas)
+    id_causas = await DBService().persist_causas(data.causas, get_settings().PERSIST_CHUNK_SIZE)
+    return await associate_litigante(data.litigante, id_causas, data.unchanged_causas)
+
+
+async def associate_litigante(
+    litigante: LitiganteSchema, id_causas: list[tuple[str, str]], unchanged_causas: list[str]
+) -> ProcessResponse:
     successful_causas = [causa for causa, error in id_causas if not error]
     error_causas = {causa: error for causa, error in id_causas if error}
-    response = ProcessResponse(successful=successful_causas, error=error_causas)
+    response = ProcessResponse(successful=successful_causas, error=error_causas, skipped=len(unchanged_causas))
     try:
         db_service = DBService()
-        await db_service.update_or_create_litigante(data.litigante, successful_causas)
+        await db_service.update_or_create_litigante(litigante, successful_causas + unchanged_causas)
         response.litigante_updated = True
     except Exception as e:
         logging.exception(e)
@@ -94,11 +145,10 @@ async def process_causa(causa: CausaSchema) -> tuple[str, str]:
         ]
         await db_service.bulk_create_actuacion(actuaciones_requests)
 
-        incidentes_tasks = [
-            process_implicados(incidente) for movimiento in causa.movimientos for incidente in movimiento.incidentes
-        ]
-        await gather_with_concurrency(1, incidentes_tasks)
+        await db_service.bulk_update_or_create_implicados([request.incidente for request in incidentes])
 
+        # Change markers go last, so a causa that failed halfway is crawled again by the next incremental run
+        await db_service.update_causa_markers(causa)
         return id_causa, ""
     except Exception as e:
         logging.exception(e)
@@ -107,14 +157,7 @@ async def process_causa(causa: CausaSchema) -> tuple[str, str]:
 
 
 async def process_implicados(incidente: IncidenteSchema) -> tuple[list[int], list[int]]:
-    db_service = DBService()
-    id_incidente = incidente.idIncidente
-    actores_implicados = [
-        await db_service.update_or_create_implicado(actor, LitiganteTipo.ACTOR, id_incidente)
-        for actor in incidente.actores
-    ]
-    demandados_implicados = [
-        await db_service.update_or_create_implicado(demandado, LitiganteTipo.DEMANDADO, id_incidente)
-        for demandado in incidente.demandados
-    ]
+    await DBService().bulk_update_or_create_implicados([incidente])
+    actores_implicados = [actor.idImplicado for actor in incidente.actores]
+    demandados_implicados = [demandado.idImplicado for demandado in incidente.demandados]
     return actores_implicados, demandados_implicados
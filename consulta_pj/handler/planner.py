@@ -0,0 +1,127 @@
+import asyncio
+import logging
+
+from consulta_pj.client import CausasResponse, ProcesosJudicialesClient, client_pool
+from consulta_pj.concurrency import gather_with_concurrency, log_progress
+from consulta_pj.crawler import LitiganteSchema, LitiganteTipo, crawler
+from consulta_pj.db_service import DBService, write_buffer
+from consulta_pj.time_decorator import time_async
+
+from .schemas import BatchResponse
+
+
+class BatchPlan:
+    """Distinct causas of a batch of litigantes and the litigantes that reference each of them."""
+
+    def __init__(self, tipo: LitiganteTipo) -> None:
+        self.tipo = tipo
+        self.causas: dict[str, CausasResponse] = {}
+        self.causas_by_cedula: dict[str, list[str]] = {}
+        self.errors: dict[str, str] = {}
+
+    def add_litigante(self, cedula: str, causas: list[CausasResponse]) -> None:
+        self.causas_by_cedula[cedula] = [causa.idJuicio for causa in causas]
+        for causa in causas:
+            self.causas.setdefault(causa.idJuicio, causa)
+
+    @property
+    def references(self) -> int:
+        return sum(len(causas_ids) for causas_ids in self.causas_by_cedula.values())
+
+    @property
+    def dedup_ratio(self) -> float:
+        # Causa references per distinct causa: 5.0 means every causa is crawled once instead of five times
+        return self.references / len(self.causas) if self.causas else 1.0
+
+
+async def process_actores(cedulas_actores: list[str], max_concurrency: int | None = None) -> BatchResponse:
+    return await process_batch(cedulas_actores, LitiganteTipo.ACTOR, max_concurrency)
+
+
+async def process_demandados(cedulas_demandados: list[str], max_concurrency: int | None = None) -> BatchResponse:
+    return await process_batch(cedulas_demandados, LitiganteTipo.DEMANDADO, max_concurrency)
+
+
+async def process_batch(cedulas: list[str], tipo: LitiganteTipo, max_concurrency: int | None = None) -> BatchResponse:
+    async with client_pool() as pool, ProcesosJudicialesClient(pool=pool) as client:
+        concurrency = max_concurrency or pool.limiter.max_limit
+        plan = await plan_batch(cedulas, tipo, client, concurrency)
+        logging.warning(
+            f"Batch {tipo}: {len(cedulas)} litigantes, {plan.references} causas referenciadas, "
+            f"{len(plan.causas)} distintas (dedup {plan.dedup_ratio:.2f})"
+        )
+        return await execute_plan(plan, client, concurrency)
+
+
+@time_async
+async def plan_batch(
+    cedulas: list[str], tipo: LitiganteTipo, client: ProcesosJudicialesClient, max_concurrency: int
+) -> BatchPlan:
+    plan = BatchPlan(tipo)
+    litigantes = [LitiganteSchema(cedula=cedula, tipo=tipo) for cedula in dict.fromkeys(cedulas)]
+    tasks = [_list_causas(litigante, client) for litigante in litigantes]
+    for litigante, (causas, error) in zip(litigantes, await gather_with_concurrency(max_concurrency, tasks)):
+        if error:
+            plan.errors[litigante.cedula] = error
+        else:
+            plan.add_litigante(litigante.cedula, causas)
+    return plan
+
+
+async def _list_causas(
+    litigante: LitiganteSchema, client: ProcesosJudicialesClient
+) -> tuple[list[CausasResponse], str]:
+    try:
+        return await crawler.get_litigante_causas(litigante, client), ""
+    except Exception as e:
+        logging.exception(e)
+        logging.error(f"Error listing causas of litigante {litigante.cedula}")
+        return [], str(e)
+
+
+@time_async
+async def execute_plan(plan: BatchPlan, client: ProcesosJudicialesClient, max_concurrency: int) -> BatchResponse:
+    # Upstream requests of every level share this batch-wide budget
+    budget = asyncio.Semaphore(max_concurrency)
+    # Causas crawled around the same time are written together, one set-based transaction per flush of the buffer
+    async with write_buffer():
+        tasks = (
+            log_progress(f"Causa {causa.idJuicio}", index, len(plan.causas), _crawl_and_persist(causa, client, budget))
+            for index, causa in enumerate(plan.causas.values())
+        )
+        id_causas = await gather_with_concurrency(max_concurrency, tasks)
+    successful_causas = [causa for causa, error in id_causas if not error]
+    error_causas = {causa: error for causa, error in id_causas if error}
+
+    response = BatchResponse(
+        litigantes=len(plan.causas_by_cedula) + len(plan.errors),
+        causas_referenced=plan.references,
+        causas_crawled=len(plan.causas),
+        dedup_ratio=plan.dedup_ratio,
+        successful=successful_causas,
+        error=error_causas,
+        litigantes_error=dict(plan.errors),
+    )
+    persisted = set(successful_causas)
+    associations = {
+        cedula: [causa_id for causa_id in causas_ids if causa_id in persisted]
+        for cedula, causas_ids in plan.causas_by_cedula.items()
+    }
+    try:
+        response.associations_created = await DBService().bulk_associate_litigantes(plan.tipo, associations)
+    except Exception as e:
+        logging.exception(e)
+        logging.error("Error associating litigantes with causas")
+        response.litigantes_error.update({cedula: str(e) for cedula in associations})
+    return response
+
+
+async def _crawl_and_persist(
+    causa: CausasResponse, client: ProcesosJudicialesClient, budget: asyncio.Semaphore
+) -> tuple[str, str]:
+    try:
+        causa_schema = await crawler.get_causa(causa, client, budget)
+    except Exception as e:
+        return causa.idJuicio, str(e)
+    [id_causa] = await DBService().persist_causas([causa_schema])
+    return id_causa
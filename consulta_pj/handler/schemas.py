@@ -1,7 +1,44 @@
+from datetime import datetime
+
 from pydantic import BaseModel
 
+from consulta_pj.crawler import CrawlProgress, LitiganteTipo
+from consulta_pj.db_service import JobStatus
+
 
 class ProcessResponse(BaseModel):
     successful: list[str]
     error: dict[str, str]
     litigante_updated: bool = False
+    new: int = 0
+    refreshed: int = 0
+    skipped: int = 0
+
+
+class BatchResponse(BaseModel):
+    litigantes: int
+    causas_referenced: int
+    causas_crawled: int
+    dedup_ratio: float
+    successful: list[str]
+    error: dict[str, str]
+    litigantes_error: dict[str, str] = {}
+    associations_created: int = 0
+
+
+class LitiganteJob(BaseModel):
+    id: str
+    cedula: str
+    tipo: LitiganteTipo
+    incremental: bool = False
+    status: JobStatus = JobStatus.PENDING
+    progress: CrawlProgress = CrawlProgress()
+    result: ProcessResponse | None = None
+    error: str | None = None
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JobStatus.DONE, JobStatus.FAILED)
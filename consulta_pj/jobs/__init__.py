@@ -0,0 +1,22 @@
+from consulta_pj.db_service import JobKind, JobStatus
+
+from .job_queue import JobQueue
+from .schemas import JobCounts, JobStats, ShardedRunStats, ShardStats, WorkStats
+from .sharded import run_sharded_batch
+from .worker import associate_batch, enqueue_batch, run_batch, work_batch
+
+__all__ = [
+    "JobCounts",
+    "JobKind",
+    "JobQueue",
+    "JobStats",
+    "JobStatus",
+    "ShardStats",
+    "ShardedRunStats",
+    "WorkStats",
+    "associate_batch",
+    "enqueue_batch",
+    "run_batch",
+    "run_sharded_batch",
+    "work_batch",
+]
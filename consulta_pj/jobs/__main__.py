@@ -0,0 +1,50 @@
+import argparse
+import asyncio
+import logging
+
+from tortoise import Tortoise
+
+from consulta_pj.crawler import LitiganteTipo
+from consulta_pj.db_service import migrate, tortoise_config
+from consulta_pj.settings import get_settings
+
+from .job_queue import JobQueue
+from .sharded import run_sharded_batch
+from .worker import enqueue_batch, run_batch
+
+
+async def main(args: argparse.Namespace) -> None:
+    await Tortoise.init(config=tortoise_config(get_settings()))
+    await migrate()
+    try:
+        if args.command == "enqueue":
+            batch = await enqueue_batch(args.cedulas, LitiganteTipo(args.tipo), args.batch)
+            print(batch)
+        elif args.command == "run" and args.processes > 1:
+            sharded_stats = await run_sharded_batch(args.batch, args.processes, args.workers)
+            print(sharded_stats.model_dump_json(indent=2))
+        elif args.command == "run":
+            stats = await run_batch(args.batch, args.workers)
+            print(stats.model_dump_json(indent=2))
+        else:
+            stats = await JobQueue.from_settings().stats(args.batch)
+            print(stats.model_dump_json(indent=2))
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(prog="python -m consulta_pj.jobs", description="Durable crawl batches")
+    commands = parser.add_subparsers(dest="command", required=True)
+    enqueue = commands.add_parser("enqueue", help="Create the jobs of a batch and print its id")
+    enqueue.add_argument("tipo", choices=[tipo.value for tipo in LitiganteTipo])
+    enqueue.add_argument("cedulas", nargs="+")
+    enqueue.add_argument("--batch", help="Add the cedulas to an existing batch")
+    run = commands.add_parser("run", help="Work a batch until it is finished, resuming it if it was interrupted")
+    run.add_argument("batch")
+    run.add_argument("--workers", type=int, help="Worker coroutines per process")
+    run.add_argument("--processes", type=int, default=1, help="Shard the batch across this many processes")
+    stats = commands.add_parser("stats", help="Print the backlog and throughput of a batch")
+    stats.add_argument("batch", nargs="?")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from typing import Any, AsyncIterator, Self
+
+from tortoise import timezone
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.exceptions import OperationalError
+from tortoise.expressions import F
+from tortoise.functions import Count
+from tortoise.queryset import QuerySet
+from tortoise.transactions import in_transaction
+
+from consulta_pj.client import CausasResponse
+from consulta_pj.crawler import LitiganteTipo
+from consulta_pj.db_service import JobKind, JobStatus
+from consulta_pj.db_service.models import CrawlJob
+from consulta_pj.settings import get_settings
+
+from .schemas import JobCounts, JobStats
+
+
+class JobQueue:
+    """Durable crawl jobs of a batch: one job per litigante listing and one per distinct causa.
+
+    A claimed job is leased to its worker, which renews the lease every third of ``lease_timeout`` while it runs.
+    Jobs whose lease expired go back to pending, and only the worker holding the lease can finish a job.
+    """
+
+    def __init__(self, max_attempts: int = 3, lease_timeout: float = 15 * 60) -> None:
+        self.max_attempts = max_attempts
+        self.lease_timeout = lease_timeout
+
+    @classmethod
+    def from_settings(cls) -> Self:
+        settings = get_settings()
+        return cls(max_attempts=settings.JOBS_MAX_ATTEMPTS, lease_timeout=settings.JOBS_LEASE_TIMEOUT)
+
+    async def enqueue_litigantes(self, batch: str, cedulas: list[str], tipo: LitiganteTipo) -> None:
+        jobs = [CrawlJob(batch=batch, kind=JobKind.LITIGANTE, key=cedula, tipo=tipo) for cedula in cedulas]
+        await CrawlJob.bulk_create(jobs, ignore_conflicts=True)
+
+    async def enqueue_causas(self, batch: str, causas: list[CausasResponse]) -> None:
+        # A causa shared by several litigantes of the batch hits the unique constraint and is crawled once
+        jobs = [
+            CrawlJob(batch=batch, kind=JobKind.CAUSA, key=causa.idJuicio, payload=causa.model_dump(mode="json"))
+            for causa in causas
+        ]
+        await CrawlJob.bulk_create(jobs, ignore_conflicts=True)
+
+    @property
+    def heartbeat_interval(self) -> float:
+        return self.lease_timeout / 3
+
+    async def claim(self, batch: str, worker: str, limit: int = 1) -> list[CrawlJob]:
+        connection = CrawlJob._meta.db
+        if connection.capabilities.support_for_update:
+            # SKIP LOCKED lets PostgreSQL workers claim disjoint jobs without waiting on each other
+            async with in_transaction(connection.connection_name) as transaction:
+                ids = await self._claim(transaction, batch, worker, limit)
+        else:
+            # SQLite has no row locks, the status condition of the update keeps its claims exclusive instead. A
+            # transaction around the select would only make processes sharing the file fail to upgrade their locks
+            ids = await self._claim(connection, batch, worker, limit)
+        if not ids:
+            return []
+        return await CrawlJob.filter(id__in=ids, status=JobStatus.RUNNING, worker=worker).order_by("id")
+
+    async def _claim(self, connection: BaseDBAsyncClient, batch: str, worker: str, limit: int) -> list[int]:
+        pending = (
+            CrawlJob.filter(batch=batch, status=JobStatus.PENDING)
+            .order_by("id")
+            .limit(limit)
+            .select_for_update(skip_locked=True)
+            .using_db(connection)
+        )
+        ids: list[int] = await pending.values_list("id", flat=True)  # type: ignore
+        if ids:
+            await (
+                CrawlJob.filter(id__in=ids, status=JobStatus.PENDING)
+                .using_db(connection)
+                .update(
+                    status=JobStatus.RUNNING,
+                    worker=worker,
+                    started_at=timezone.now(),
+                    heartbeat_at=timezone.now(),
+                    attempts=F("attempts") + 1,
+                )
+            )
+        return ids
+
+    async def renew(self, job: CrawlJob) -> bool:
+        """Extends the lease of ``job``, False if its worker lost it."""
+        return bool(await self._leased(job).update(heartbeat_at=timezone.now()))
+
+    @asynccontextmanager
+    async def leased(self, job: CrawlJob) -> AsyncIterator[None]:
+        """Renews the lease of ``job`` while the block runs, however long its crawl takes."""
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            yield
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+
+    async def _heartbeat(self, job: CrawlJob) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                if not await self.renew(job):
+                    logging.warning(f"Job {job.kind} {job.key} lost its lease, another worker may run it again")
+                    return
+            except OperationalError as e:
+                # e.g. a busy SQLite database shared by several processes, the lease still has two intervals left
+                logging.warning(f"Job {job.kind} {job.key}: renewing the lease failed, retrying: {e}")
+
+    async def complete(self, job: CrawlJob, payload: Any = None) -> bool:
+        """Marks ``job`` done, False if its worker lost the lease and the job was left to another worker."""
+        job.status = JobStatus.DONE
+        job.finished_at = timezone.now()
+        values: dict[str, Any] = {"status": job.status, "finished_at": job.finished_at}
+        if payload is not None:
+            job.payload = payload
+            values["payload"] = payload
+        return bool(await self._leased(job).update(**values))
+
+    async def fail(self, job: CrawlJob, error: str) -> JobStatus | None:
+        """Returns ``job`` to pending, or fails it after ``max_attempts``. None if its worker lost the lease."""
+        job.status = JobStatus.FAILED if job.attempts >= self.max_attempts else JobStatus.PENDING
+        job.finished_at = timezone.now()
+        job.error = error
+        if not await self._leased(job).update(status=job.status, finished_at=job.finished_at, error=error):
+            return None
+        return JobStatus(job.status)
+
+    def _leased(self, job: CrawlJob) -> QuerySet[CrawlJob]:
+        return CrawlJob.filter(id=job.id, status=JobStatus.RUNNING, worker=job.worker)
+
+    async def requeue_stale(self, batch: str) -> int:
+        """Returns running jobs whose lease expired to pending, e.g. after their worker died or hung."""
+        expired = timezone.now() - timedelta(seconds=self.lease_timeout)
+        return await CrawlJob.filter(batch=batch, status=JobStatus.RUNNING, heartbeat_at__lt=expired).update(
+            status=JobStatus.PENDING, worker=None
+        )
+
+    async def has_unfinished(self, batch: str) -> bool:
+        return await CrawlJob.filter(batch=batch, status__in=[JobStatus.PENDING, JobStatus.RUNNING]).exists()
+
+    async def litigante_causas(self, batch: str) -> dict[LitiganteTipo, dict[str, list[str]]]:
+        done_causas = set(
+            await CrawlJob.filter(batch=batch, kind=JobKind.CAUSA, status=JobStatus.DONE).values_list("key", flat=True)
+        )
+        litigantes = await CrawlJob.filter(batch=batch, kind=JobKind.LITIGANTE, status=JobStatus.DONE).values(
+            "key", "tipo", "payload"
+        )
+        result: dict[LitiganteTipo, dict[str, list[str]]] = {}
+        for litigante in litigantes:
+            causas_ids = [causa_id for causa_id in litigante["payload"] or [] if causa_id in done_causas]
+            result.setdefault(LitiganteTipo(litigante["tipo"]), {})[litigante["key"]] = causas_ids
+        return result
+
+    async def stats(self, batch: str | None = None, window: float = 60) -> JobStats:
+        queryset = CrawlJob.filter(batch=batch) if batch else CrawlJob.all()
+        rows = await queryset.annotate(count=Count("id")).group_by("kind", "status").values("kind", "status", "count")
+        counts = {kind: JobCounts() for kind in JobKind}
+        for row in rows:
+            setattr(counts[JobKind(row["kind"])], row["status"], row["count"])
+
+        since = timezone.now() - timedelta(seconds=window)
+        recent = await queryset.filter(status=JobStatus.DONE, finished_at__gte=since).values(
+            "started_at", "finished_at"
+        )
+        durations = [(job["finished_at"] - job["started_at"]).total_seconds() for job in recent]
+        return JobStats(
+            batch=batch,
+            litigantes=counts[JobKind.LITIGANTE],
+            causas=counts[JobKind.CAUSA],
+            backlog=sum(count.pending + count.running for count in counts.values()),
+            done_per_minute=len(recent) * 60 / window,
+            avg_duration_seconds=sum(durations) / len(durations) if durations else None,
+        )
@@ -0,0 +1,42 @@
+from pydantic import BaseModel
+
+from consulta_pj.client import UpstreamStats
+
+
+class JobCounts(BaseModel):
+    pending: int = 0
+    running: int = 0
+    done: int = 0
+    failed: int = 0
+
+
+class JobStats(BaseModel):
+    batch: str | None
+    litigantes: JobCounts
+    causas: JobCounts
+    backlog: int
+    done_per_minute: float
+    avg_duration_seconds: float | None
+
+
+class WorkStats(BaseModel):
+    done: int = 0
+    failed: int = 0
+    retried: int = 0
+
+
+class ShardStats(BaseModel):
+    shard: int
+    pid: int
+    work: WorkStats
+    upstream: UpstreamStats
+    elapsed_seconds: float
+    finished: bool = False
+
+
+class ShardedRunStats(BaseModel):
+    batch: JobStats
+    shards: list[ShardStats]
+    work: WorkStats
+    associations: int
+    elapsed_seconds: float
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import time
+from multiprocessing.queues import Queue
+from multiprocessing.synchronize import Lock
+from typing import Any
+
+from tortoise import Tortoise
+
+from consulta_pj.client import ClientPool, RateBudget
+from consulta_pj.db_service import tortoise_config
+from consulta_pj.settings import get_settings
+from consulta_pj.time_decorator import time_async
+
+from .job_queue import JobQueue
+from .schemas import ShardedRunStats, ShardStats, WorkStats
+from .worker import associate_batch, work_batch
+
+
+@time_async
+async def run_sharded_batch(
+    batch: str, processes: int, workers: int | None = None, report_interval: float = 5.0
+) -> ShardedRunStats:
+    """Works ``batch`` from ``processes`` processes, each with its own event loop, HTTP pool and DB connection.
+
+    Shards take jobs from the shared job table, so a slow shard never holds cedulas another one could crawl. The
+    upstream rate budget (``UPSTREAM_RATE_LIMIT``) is shared by all of them and by the API.
+    """
+    settings = get_settings()
+    context = multiprocessing.get_context("spawn")
+    rate_budget = RateBudget.from_settings(settings, context)
+    # SQLite has a single writer and fails transactions of different processes that wait on each other
+    write_lock = context.Lock() if settings.db_uri.startswith("sqlite") else None
+    metrics: Queue[ShardStats] = context.Queue()
+    shards = [
+        context.Process(
+            target=_run_shard,
+            args=(shard, batch, workers, rate_budget, write_lock, metrics, report_interval),
+            name=f"consulta-pj-shard-{shard}",
+        )
+        for shard in range(processes)
+    ]
+    start = time.monotonic()
+    for process in shards:
+        process.start()
+
+    latest: dict[int, ShardStats] = {}
+    while any(process.is_alive() for process in shards):
+        try:
+            shard_stats = await asyncio.to_thread(metrics.get, True, report_interval)
+        except queue.Empty:
+            continue
+        latest[shard_stats.shard] = shard_stats
+        _log_progress(batch, latest, time.monotonic() - start)
+    while True:
+        try:
+            shard_stats = metrics.get_nowait()
+        except queue.Empty:
+            break
+        latest[shard_stats.shard] = shard_stats
+    for process in shards:
+        await asyncio.to_thread(process.join)
+        if process.exitcode != 0:
+            logging.error(f"Batch {batch}: {process.name} exited with code {process.exitcode}")
+
+    # Associations are made once here, shards finishing together would otherwise insert the same rows
+    job_queue = JobQueue.from_settings()
+    associations = await associate_batch(job_queue, batch)
+    shards_stats = [latest[shard] for shard in sorted(latest)]
+    return ShardedRunStats(
+        batch=await job_queue.stats(batch),
+        shards=shards_stats,
+        work=_total_work(shards_stats),
+        associations=associations,
+        elapsed_seconds=time.monotonic() - start,
+    )
+
+
+def _total_work(shards: list[ShardStats]) -> WorkStats:
+    return WorkStats(
+        done=sum(shard.work.done for shard in shards),
+        failed=sum(shard.work.failed for shard in shards),
+        retried=sum(shard.work.retried for shard in shards),
+    )
+
+
+def _log_progress(batch: str, shards: dict[int, ShardStats], elapsed: float) -> None:
+    work = _total_work(list(shards.values()))
+    throttled = sum(shard.upstream.rate.throttled for shard in shards.values() if shard.upstream.rate)
+    logging.warning(
+        f"Batch {batch}: {work.done} jobs done, {work.failed} failed, {work.retried} retried by {len(shards)} "
+        f"shards ({work.done / elapsed:.1f} jobs/s, {throttled} requests throttled by the rate budget)"
+    )
+
+
+class _ProcessLock:
+    def __init__(self, lock: Lock, poll_interval: float = 0.005) -> None:
+        self.lock = lock
+        self.poll_interval = poll_interval
+
+    async def __aenter__(self) -> None:
+        while not self.lock.acquire(block=False):
+            await asyncio.sleep(self.poll_interval)
+
+    async def __aexit__(self, *args: Any) -> None:
+        self.lock.release()
+
+
+def _run_shard(
+    shard: int,
+    batch: str,
+    workers: int | None,
+    rate_budget: RateBudget | None,
+    write_lock: Lock | None,
+    metrics: "Queue[ShardStats]",
+    report_interval: float,
+) -> None:
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(_shard_main(shard, batch, workers, rate_budget, write_lock, metrics, report_interval))
+
+
+async def _shard_main(
+    shard: int,
+    batch: str,
+    workers: int | None,
+    rate_budget: RateBudget | None,
+    write_lock: Lock | None,
+    metrics: "Queue[ShardStats]",
+    report_interval: float,
+) -> None:
+    settings = get_settings()
+    await Tortoise.init(config=tortoise_config(settings))
+    start = time.monotonic()
+    work = WorkStats()
+    try:
+        async with ClientPool.from_settings(settings, rate_budget=rate_budget) as pool:
+
+            def shard_stats(finished: bool = False) -> ShardStats:
+                return ShardStats(
+                    shard=shard,
+                    pid=os.getpid(),
+                    work=work.model_copy(),
+                    upstream=pool.stats(),
+                    elapsed_seconds=time.monotonic() - start,
+                    finished=finished,
+                )
+
+            async def report() -> None:
+                while True:
+                    await asyncio.sleep(report_interval)
+                    metrics.put(shard_stats())
+
+            reporter = asyncio.create_task(report())
+            try:
+                await work_batch(batch, workers, work, _ProcessLock(write_lock) if write_lock else None)
+            finally:
+                reporter.cancel()
+            metrics.put(shard_stats(finished=True))
+    finally:
+        await Tortoise.close_connections()
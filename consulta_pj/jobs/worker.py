@@ -0,0 +1,146 @@
+import asyncio
+import logging
+from contextlib import AbstractAsyncContextManager, nullcontext
+from typing import Any
+from uuid import uuid4
+
+from tortoise.exceptions import OperationalError
+
+from consulta_pj.client import CausasResponse, ProcesosJudicialesClient, client_pool
+from consulta_pj.crawler import LitiganteSchema, LitiganteTipo, crawler
+from consulta_pj.db_service import DBService, JobKind, JobStatus, write_buffer
+from consulta_pj.db_service.models import CrawlJob
+from consulta_pj.settings import get_settings
+from consulta_pj.time_decorator import time_async
+
+from .job_queue import JobQueue
+from .schemas import JobStats, WorkStats
+
+
+async def enqueue_batch(cedulas: list[str], tipo: LitiganteTipo, batch: str | None = None) -> str:
+    batch = batch or uuid4().hex
+    await JobQueue.from_settings().enqueue_litigantes(batch, cedulas, tipo)
+    return batch
+
+
+@time_async
+async def run_batch(batch: str, workers: int | None = None) -> JobStats:
+    """Works the jobs of ``batch`` until none is left. Running it again after a restart resumes the batch."""
+    queue = JobQueue.from_settings()
+    await work_batch(batch, workers)
+    associations = await associate_batch(queue, batch)
+    stats = await queue.stats(batch)
+    logging.warning(f"Batch {batch}: {associations} new litigante-causa associations, {stats.model_dump_json()}")
+    return stats
+
+
+async def work_batch(
+    batch: str,
+    workers: int | None = None,
+    work: WorkStats | None = None,
+    persist_lock: AbstractAsyncContextManager[Any] | None = None,
+) -> WorkStats:
+    """Runs workers until the backlog of ``batch`` is empty, without associating litigantes with causas."""
+    settings = get_settings()
+    queue = JobQueue.from_settings()
+    work = work or WorkStats()
+    if requeued := await queue.requeue_stale(batch):
+        logging.warning(f"Batch {batch}: {requeued} jobs abandoned by a previous run are pending again")
+    async with (
+        client_pool() as pool,
+        ProcesosJudicialesClient(pool=pool) as client,
+        write_buffer(persist_lock) as buffer,
+    ):
+        # Upstream requests of every job share this budget, the number of workers bounds the jobs in flight
+        budget = asyncio.Semaphore(pool.limiter.max_limit)
+        # A write buffer takes the persist lock for its flushes, the workers only wait for their own causas
+        worker_lock = nullcontext() if buffer else persist_lock or nullcontext()
+        await asyncio.gather(
+            *(
+                _worker(queue, batch, client, budget, work, worker_lock, settings.JOBS_POLL_INTERVAL)
+                for _ in range(workers or settings.JOBS_WORKERS)
+            )
+        )
+    return work
+
+
+async def associate_batch(queue: JobQueue, batch: str) -> int:
+    db_service = DBService()
+    associations = 0
+    for tipo, causas_by_cedula in (await queue.litigante_causas(batch)).items():
+        associations += await db_service.bulk_associate_litigantes(tipo, causas_by_cedula)
+    return associations
+
+
+async def _worker(
+    queue: JobQueue,
+    batch: str,
+    client: ProcesosJudicialesClient,
+    budget: asyncio.Semaphore,
+    work: WorkStats,
+    persist_lock: AbstractAsyncContextManager[Any],
+    poll_interval: float,
+) -> None:
+    worker = uuid4().hex
+    while True:
+        try:
+            jobs = await queue.claim(batch, worker)
+        except OperationalError as e:
+            # e.g. a busy SQLite database shared by several processes, the next poll tries again
+            logging.warning(f"Batch {batch}: claim failed, retrying: {e}")
+            await asyncio.sleep(poll_interval)
+            continue
+        if not jobs:
+            # Running litigante jobs may still enqueue causas, so only an empty backlog ends the worker
+            if not await queue.has_unfinished(batch):
+                return
+            await queue.requeue_stale(batch)
+            await asyncio.sleep(poll_interval)
+            continue
+        for job in jobs:
+            await _run_job(queue, batch, job, client, budget, work, persist_lock)
+
+
+async def _run_job(
+    queue: JobQueue,
+    batch: str,
+    job: CrawlJob,
+    client: ProcesosJudicialesClient,
+    budget: asyncio.Semaphore,
+    work: WorkStats,
+    persist_lock: AbstractAsyncContextManager[Any],
+) -> None:
+    try:
+        async with queue.leased(job):
+            if job.kind == JobKind.LITIGANTE:
+                litigante = LitiganteSchema(cedula=job.key, tipo=LitiganteTipo(job.tipo))
+                causas = await crawler.get_litigante_causas(litigante, client)
+                await queue.enqueue_causas(batch, causas)
+                completed = await queue.complete(job, [causa.idJuicio for causa in causas])
+            else:
+                causa = await crawler.get_causa(CausasResponse.model_validate(job.payload), client, budget)
+                async with persist_lock:
+                    [(_, error)] = await DBService().persist_causas([causa])
+                if error:
+                    await _fail_job(queue, job, error, work)
+                    return
+                completed = await queue.complete(job)
+        if completed:
+            work.done += 1
+        else:
+            logging.warning(f"Job {job.kind} {job.key} finished after its lease expired, another worker owns it")
+    except Exception as e:
+        logging.exception(e)
+        await _fail_job(queue, job, str(e), work)
+
+
+async def _fail_job(queue: JobQueue, job: CrawlJob, error: str, work: WorkStats) -> None:
+    status = await queue.fail(job, error)
+    if status is None:
+        logging.warning(f"Job {job.kind} {job.key} failed after its lease expired: {error}")
+        return
+    if status == JobStatus.FAILED:
+        work.failed += 1
+    else:
+        work.retried += 1
+    logging.error(f"Job {job.kind} {job.key} (attempt {job.attempts}) failed, now {status}")
@@ -0,0 +1,45 @@
+from typing import AsyncIterator
+
+from fastapi import APIRouter
+from fastapi.exceptions import HTTPException
+from fastapi.responses import StreamingResponse
+
+from consulta_pj.handler import LitiganteJob, LitiganteJobs, get_litigante_jobs
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str) -> LitiganteJob:
+    """
+    Returns the status of a litigante job, its causas done out of the total listed so far, the causas that failed
+    and, once done, the `ProcessResponse`
+    """
+    job = _active_jobs().get(job_id)
+    if job is None:
+        raise HTTPException(404, detail="Job not found")
+    return job
+
+
+@router.get("/{job_id}/events")
+async def stream_job_events(job_id: str, interval: float = 1.0) -> StreamingResponse:
+    """
+    Server-sent events with the job every time its progress changes, the stream ends when the job finishes
+    """
+    jobs = _active_jobs()
+    if jobs.get(job_id) is None:
+        raise HTTPException(404, detail="Job not found")
+    return StreamingResponse(_job_events(jobs, job_id, interval), media_type="text/event-stream")
+
+
+async def _job_events(jobs: LitiganteJobs, job_id: str, interval: float) -> AsyncIterator[str]:
+    async for job in jobs.watch(job_id, interval):
+        event = job.status if job.finished else "progress"
+        yield f"event: {event}\ndata: {job.model_dump_json()}\n\n"
+
+
+def _active_jobs() -> LitiganteJobs:
+    jobs = get_litigante_jobs()
+    if jobs is None:
+        raise HTTPException(503, detail="Background jobs not active")
+    return jobs
@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Path
+from fastapi.exceptions import HTTPException
 
+from consulta_pj.client import Lane, upstream_priority
 from consulta_pj.crawler import LitiganteTipo
-from consulta_pj.handler import ProcessResponse, handler
+from consulta_pj.handler import LitiganteJob, ProcessResponse, get_litigante_jobs, handler
 
 from .default_examples import ACTORES_EXAMPLES, DEMANDADOS_EXAMPLES
 
@@ -9,12 +11,14 @@ router = APIRouter(prefix="/litigantes", tags=["Litigantes"])
 
 
 @router.get("/")
-async def get_litigantes(cedula: str, tipo: LitiganteTipo) -> ProcessResponse:
+async def get_litigantes(cedula: str, tipo: LitiganteTipo, incremental: bool = False) -> ProcessResponse:
     """
     Returns an object with the ids of the successful and failed processed causas/procesos, and a flag to
-    indicate if the litigante was associated with the new causas/proceso
+    indicate if the litigante was associated with the new causas/proceso. With `incremental`, causas whose
+    change markers did not change since the last sync are skipped
     """
-    response = await handler.process_litigante(cedula, tipo, raise_on_error=True)
+    with upstream_priority(Lane.INTERACTIVE):
+        response = await handler.process_litigante(cedula, tipo, raise_on_error=True, incremental=incremental)
     # just for typing:
     if response is None:
         raise ValueError("Unexpected error while processing litigante data.")
@@ -22,11 +26,16 @@ async def get_litigantes(cedula: str, tipo: LitiganteTipo) -> ProcessResponse:
 
 
 @router.get("/actores/{cedula}")
-async def process_actor_data(cedula: str = Path(..., openapi_examples=ACTORES_EXAMPLES)) -> ProcessResponse:
+async def process_actor_data(
+    cedula: str = Path(..., openapi_examples=ACTORES_EXAMPLES), incremental: bool = False
+) -> ProcessResponse:
     """
     Returns an object with the cedula/id of the successful and failed processed causas/procesos for actores
     """
-    response = await handler.process_litigante(cedula, LitiganteTipo.ACTOR, raise_on_error=True)
+    with upstream_priority(Lane.INTERACTIVE):
+        response = await handler.process_litigante(
+            cedula, LitiganteTipo.ACTOR, raise_on_error=True, incremental=incremental
+        )
     # This is just for typing
     if response is None:
         raise ValueError("Unexpected error while processing litigante data.")
@@ -34,12 +43,52 @@ async def process_actor_data(cedula: str = Path(..., openapi_examples=ACTORES_EX
 
 
 @router.get("/demandantes/{cedula}")
-async def process_demandante_data(cedula: str = Path(..., openapi_examples=DEMANDADOS_EXAMPLES)) -> ProcessResponse:
+async def process_demandante_data(
+    cedula: str = Path(..., openapi_examples=DEMANDADOS_EXAMPLES), incremental: bool = False
+) -> ProcessResponse:
     """
     Returns an object with the cedula/id of the successful and failed processed causas/procesos for demandados
     """
-    response = await handler.process_litigante(cedula, LitiganteTipo.DEMANDADO, raise_on_error=True)
+    with upstream_priority(Lane.INTERACTIVE):
+        response = await handler.process_litigante(
+            cedula, LitiganteTipo.DEMANDADO, raise_on_error=True, incremental=incremental
+        )
     # This is just for typing
     if response is None:
         raise ValueError("Unexpected error while processing litigante data.")
     return response
+
+
+@router.post("/", status_code=202)
+async def submit_litigante(cedula: str, tipo: LitiganteTipo, incremental: bool = False) -> LitiganteJob:
+    """
+    Starts processing the litigante in the background and returns the job to follow at `/jobs/{id}`
+    """
+    return _submit(cedula, tipo, incremental)
+
+
+@router.post("/actores/{cedula}", status_code=202)
+async def submit_actor(
+    cedula: str = Path(..., openapi_examples=ACTORES_EXAMPLES), incremental: bool = False
+) -> LitiganteJob:
+    """
+    Starts processing the actor in the background and returns the job to follow at `/jobs/{id}`
+    """
+    return _submit(cedula, LitiganteTipo.ACTOR, incremental)
+
+
+@router.post("/demandantes/{cedula}", status_code=202)
+async def submit_demandante(
+    cedula: str = Path(..., openapi_examples=DEMANDADOS_EXAMPLES), incremental: bool = False
+) -> LitiganteJob:
+    """
+    Starts processing the demandado in the background and returns the job to follow at `/jobs/{id}`
+    """
+    return _submit(cedula, LitiganteTipo.DEMANDADO, incremental)
+
+
+def _submit(cedula: str, tipo: LitiganteTipo, incremental: bool) -> LitiganteJob:
+    jobs = get_litigante_jobs()
+    if jobs is None:
+        raise HTTPException(503, detail="Background jobs not active")
+    return jobs.submit(cedula, tipo, incremental)
@@ -1,17 +1,49 @@
 from fastapi import APIRouter
+from fastapi.exceptions import HTTPException
 
+from consulta_pj.client import UpstreamStats, get_client_pool
+from consulta_pj.db_service import DBPoolStats, pool_stats, replica_reads
 from consulta_pj.db_service.models import Actuacion, Causa, Implicado, Incidente, Litigante, Movimiento
+from consulta_pj.jobs import JobQueue, JobStats
 
 router = APIRouter(prefix="/stats", tags=["Statistics"])
 
 
 @router.get("")
 async def get_stats() -> dict[str, int]:
-    return {
-        "litigantes": await Litigante.all().count(),
-        "causas": await Causa.all().count(),
-        "movimientos": await Movimiento.all().count(),
-        "actuaciones": await Actuacion.all().count(),
-        "incidentes": await Incidente.all().count(),
-        "implicados": await Implicado.all().count(),
-    }
+    async with replica_reads():
+        return {
+            "litigantes": await Litigante.all().count(),
+            "causas": await Causa.all().count(),
+            "movimientos": await Movimiento.all().count(),
+            "actuaciones": await Actuacion.all().count(),
+            "incidentes": await Incidente.all().count(),
+            "implicados": await Implicado.all().count(),
+        }
+
+
+@router.get("/upstream")
+async def get_upstream_stats() -> UpstreamStats:
+    """
+    Returns the current state of the shared upstream client pool, including the adaptive concurrency limit
+    """
+    pool = get_client_pool()
+    if pool is None:
+        raise HTTPException(503, detail="Upstream client pool not active")
+    return pool.stats()
+
+
+@router.get("/db")
+async def get_db_stats() -> list[DBPoolStats]:
+    """
+    Returns the size, saturation and acquire wait times of the database connection pools (PostgreSQL only)
+    """
+    return pool_stats()
+
+
+@router.get("/jobs")
+async def get_jobs_stats(batch: str | None = None) -> JobStats:
+    """
+    Returns the backlog of the durable crawl jobs, for one batch or all of them, and the recent throughput
+    """
+    return await JobQueue.from_settings().stats(batch)
@@ -1,4 +1,7 @@
+import os
+import tempfile
 from functools import lru_cache
+from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -12,9 +15,68 @@ class Settings(BaseSettings):
     POSTGRES_DB: str = ""
     DB_HOST: str = ""
     DB_PORT: str = ""
+    DB_URL: str = ""
+    DB_POOL_MIN_SIZE: int = 1
+    DB_POOL_MAX_SIZE: int = 10
+    DB_WRITE_POOL_MIN_SIZE: int = 1
+    DB_WRITE_POOL_MAX_SIZE: int = 5
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    DB_COMMAND_TIMEOUT: float = 60
+    DB_CONNECTION_MAX_QUERIES: int = 50000
+    DB_CONNECTION_MAX_IDLE: float = 300
+    DB_REPLICA_URL: str = ""
+    DB_REPLICA_MAX_LAG: float = 10
+    DB_REPLICA_LAG_CHECK_INTERVAL: float = 1
+    UPSTREAM_API_URL: str = (
+        "https://api.funcionjudicial.gob.ec/EXPEL-CONSULTA-CAUSAS-SERVICE/api/consulta-causas/informacion/"
+    )
+    UPSTREAM_CLEX_API_URL: str = (
+        "https://api.funcionjudicial.gob.ec/EXPEL-CONSULTA-CAUSAS-CLEX-SERVICE/api/consulta-causas-clex/informacion/"
+    )
+    UPSTREAM_CONNECTION_LIMIT: int = 100
+    UPSTREAM_CONNECTION_LIMIT_PER_HOST: int = 30
+    UPSTREAM_DNS_CACHE_TTL: int = 300
+    UPSTREAM_KEEPALIVE_TIMEOUT: float = 30
+    UPSTREAM_INITIAL_CONCURRENCY: int = 15
+    UPSTREAM_MIN_CONCURRENCY: int = 1
+    UPSTREAM_MAX_CONCURRENCY: int = 30
+    UPSTREAM_INTERACTIVE_SLO: float = 2.0
+    UPSTREAM_BULK_SLO: float = 30.0
+    UPSTREAM_MAX_RETRIES: int = 5
+    UPSTREAM_RETRY_BASE_DELAY: float = 0.5
+    UPSTREAM_RETRY_MAX_DELAY: float = 10
+    UPSTREAM_RETRY_BUDGET_RATIO: float = 0.2
+    UPSTREAM_RETRY_BUDGET_MIN: int = 10
+    UPSTREAM_RATE_LIMIT: float = 0
+    UPSTREAM_RATE_BURST: int = 0
+    UPSTREAM_RATE_INTERACTIVE_SHARE: float = 0.2
+    UPSTREAM_RATE_BUDGET_PATH: str = os.path.join(tempfile.gettempdir(), "consulta_pj.upstream_rate")
+    UPSTREAM_CACHE_PATH: str = ""
+    UPSTREAM_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    UPSTREAM_CACHE_MOVIMIENTOS_TTL: float = 6 * 60 * 60
+    UPSTREAM_CACHE_ACTUACIONES_TTL: float = 6 * 60 * 60
+    UPSTREAM_CACHE_DORMANT_AFTER_DAYS: int = 365
+    UPSTREAM_CACHE_DORMANT_TTL: float = 7 * 24 * 60 * 60
+    UPSTREAM_CASSETTE_MODE: Literal["", "record", "replay"] = ""
+    UPSTREAM_CASSETTE_PATH: str = "upstream.cassette.gz"
+    UPSTREAM_CASSETTE_TIMING: Literal["original", "none"] = "none"
+    PIPELINE_QUEUE_SIZE: int = 16
+    PIPELINE_PERSIST_WORKERS: int = 4
+    PERSIST_CHUNK_SIZE: int = 100
+    DB_WRITE_BUFFER_ROWS: int = 5000
+    DB_WRITE_BUFFER_DELAY: float = 0.05
+    API_JOBS_CONCURRENCY: int = 4
+    API_JOBS_RETENTION: float = 60 * 60
+    JOBS_WORKERS: int = 8
+    JOBS_MAX_ATTEMPTS: int = 3
+    JOBS_POLL_INTERVAL: float = 1.0
+    JOBS_LEASE_TIMEOUT: float = 15 * 60
 
     @property
     def db_uri(self) -> str:
+        if self.DB_URL:
+            # e.g. sqlite://consulta_pj.sqlite3 for local runs without PostgreSQL
+            return self.DB_URL
         uri = f"postgres://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.POSTGRES_DB}"
         return uri
 
@@ -1,24 +1,87 @@
+import asyncio
 import json
+import os
+import uuid
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any
+from typing import Any, AsyncIterator
+from urllib.parse import urlsplit
 
 import pytest
-from tortoise import Tortoise
-from tortoise.contrib.test import _init_db, getDBConfig
+from tortoise import Tortoise, connections
+from tortoise.contrib.test import getDBConfig
 
 from consulta_pj.client import CausasResponse
 from consulta_pj.crawler.schemas import InformacionLitigante
+from consulta_pj.db_service import migrate
+from consulta_pj.settings import get_settings
+from tests.mocks.upstream import UpstreamConfig, UpstreamServer
 
 
 @pytest.fixture()
 async def in_memory_db():
     config = getDBConfig(app_label="models", modules=["consulta_pj.db_service.models"])
-    await _init_db(config)
+    await Tortoise.init(config, _create_db=True)
+    await migrate()
     yield
     await Tortoise._drop_databases()
 
 
+def database_url(server_url: str, database: str) -> str:
+    return urlsplit(server_url)._replace(path=f"/{database}").geturl()
+
+
+@pytest.fixture
+async def postgres_url(monkeypatch: pytest.MonkeyPatch) -> AsyncIterator[str]:
+    """URL of a new database on the ``TEST_POSTGRES_URL`` server, e.g. ``postgres://postgres@localhost:5432/postgres``,
+    also set as ``DB_URL``. Tests of the PostgreSQL-only code paths are skipped without that server."""
+    server_url = os.environ.get("TEST_POSTGRES_URL")
+    if not server_url:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    asyncpg = pytest.importorskip("asyncpg")
+    database = f"consulta_pj_test_{uuid.uuid4().hex[:12]}"
+    server = await asyncpg.connect(server_url)
+    await server.execute(f'CREATE DATABASE "{database}"')
+    url = database_url(server_url, database)
+    monkeypatch.setenv("DB_URL", url)
+    get_settings.cache_clear()
+    try:
+        yield url
+    finally:
+        # Tortoise keeps the config of closed connections and would connect to them again on its next init
+        await connections.close_all()
+        connections.db_config.clear()
+        await Tortoise._reset_apps()
+        await server.execute(f'DROP DATABASE "{database}" WITH (FORCE)')
+        await server.close()
+        get_settings.cache_clear()
+
+
+@pytest.fixture
+async def postgres_replica_url(postgres_url: str) -> AsyncIterator[str]:
+    """URL of the ``postgres_url`` database on the ``TEST_POSTGRES_REPLICA_URL`` server, a streaming replica of the
+    ``TEST_POSTGRES_URL`` one, once the replica has the database. Replay is resumed after the test."""
+    server_url = os.environ.get("TEST_POSTGRES_REPLICA_URL")
+    if not server_url:
+        pytest.skip("TEST_POSTGRES_REPLICA_URL is not set")
+    asyncpg = pytest.importorskip("asyncpg")
+    url = database_url(server_url, urlsplit(postgres_url).path.lstrip("/"))
+    for _ in range(100):
+        try:
+            await (await asyncpg.connect(url)).close()
+            break
+        except asyncpg.InvalidCatalogNameError:
+            await asyncio.sleep(0.1)
+    else:
+        pytest.fail("The replica did not replay the creation of the test database")
+    try:
+        yield url
+    finally:
+        server = await asyncpg.connect(server_url)
+        await server.execute("SELECT pg_wal_replay_resume()")
+        await server.close()
+
+
 @pytest.fixture
 def causas_response() -> CausasResponse:
     return CausasResponse(
@@ -54,3 +117,20 @@ def informacion_litigante_1234(raw_informacion_litigante_1234: dict[str, Any]) -
 def informacion_litigante_5678(raw_informacion_litigante_5678: dict[str, Any]) -> InformacionLitigante:
     data = InformacionLitigante(**raw_informacion_litigante_5678)
     return data
+
+
+async def start_upstream(config: UpstreamConfig, monkeypatch: pytest.MonkeyPatch) -> UpstreamServer:
+    server = UpstreamServer(config)
+    await server.start()
+    monkeypatch.setenv("UPSTREAM_API_URL", server.api_url)
+    monkeypatch.setenv("UPSTREAM_CLEX_API_URL", server.clex_api_url)
+    get_settings.cache_clear()
+    return server
+
+
+@pytest.fixture
+async def upstream(monkeypatch: pytest.MonkeyPatch) -> AsyncIterator[UpstreamServer]:
+    server = await start_upstream(UpstreamConfig(), monkeypatch)
+    yield server
+    await server.stop()
+    get_settings.cache_clear()
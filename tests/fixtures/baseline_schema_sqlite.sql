@@ -0,0 +1,60 @@
+CREATE TABLE "causa" (
+    "idJuicio" VARCHAR(64) NOT NULL  PRIMARY KEY,
+    "nombreDelito" VARCHAR(255) NOT NULL,
+    "fechaIngreso" TIMESTAMP NOT NULL
+);
+CREATE TABLE "implicado" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "nombre" VARCHAR(255) NOT NULL,
+    "representante" VARCHAR(255)
+);
+CREATE TABLE "judicatura" (
+    "idJudicatura" VARCHAR(16) NOT NULL  PRIMARY KEY,
+    "nombreJudicatura" VARCHAR(255),
+    "ciudad" VARCHAR(255) NOT NULL
+);
+CREATE TABLE "litigante" (
+    "cedula" VARCHAR(24) NOT NULL  PRIMARY KEY,
+    "last_updated" TIMESTAMP NOT NULL  DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE "movimiento" (
+    "idMovimientoJuicioIncidente" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "causa_id" VARCHAR(64) NOT NULL REFERENCES "causa" ("idJuicio") ON DELETE CASCADE
+);
+CREATE TABLE "incidente" (
+    "idIncidente" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "fechaCrea" TIMESTAMP,
+    "last_updated" TIMESTAMP NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "judicatura_id" VARCHAR(16) NOT NULL REFERENCES "judicatura" ("idJudicatura") ON DELETE CASCADE,
+    "movimiento_id" INT NOT NULL REFERENCES "movimiento" ("idMovimientoJuicioIncidente") ON DELETE CASCADE
+);
+CREATE TABLE "actuacion" (
+    "uuid" VARCHAR(64) NOT NULL  PRIMARY KEY,
+    "codigo" INT NOT NULL,
+    "fecha" TIMESTAMP NOT NULL,
+    "tipo" TEXT NOT NULL,
+    "actividad" TEXT NOT NULL,
+    "nombreArchivo" VARCHAR(255),
+    "incidente_id" INT NOT NULL REFERENCES "incidente" ("idIncidente") ON DELETE CASCADE,
+    "judicatura_id" VARCHAR(16) NOT NULL REFERENCES "judicatura" ("idJudicatura") ON DELETE CASCADE
+);
+CREATE TABLE "incidente_implicado_demandado" (
+    "implicado_id" INT NOT NULL REFERENCES "implicado" ("id") ON DELETE CASCADE,
+    "incidente_id" INT NOT NULL REFERENCES "incidente" ("idIncidente") ON DELETE CASCADE
+);
+CREATE UNIQUE INDEX "uidx_incidente_i_implica_a9a620" ON "incidente_implicado_demandado" ("implicado_id", "incidente_id");
+CREATE TABLE "incidente_implicado_actor" (
+    "implicado_id" INT NOT NULL REFERENCES "implicado" ("id") ON DELETE CASCADE,
+    "incidente_id" INT NOT NULL REFERENCES "incidente" ("idIncidente") ON DELETE CASCADE
+);
+CREATE UNIQUE INDEX "uidx_incidente_i_implica_a56ef4" ON "incidente_implicado_actor" ("implicado_id", "incidente_id");
+CREATE TABLE "causa_litigante_actor" (
+    "litigante_id" VARCHAR(24) NOT NULL REFERENCES "litigante" ("cedula") ON DELETE CASCADE,
+    "causa_id" VARCHAR(64) NOT NULL REFERENCES "causa" ("idJuicio") ON DELETE CASCADE
+);
+CREATE UNIQUE INDEX "uidx_causa_litig_litigan_669091" ON "causa_litigante_actor" ("litigante_id", "causa_id");
+CREATE TABLE "causa_litigante_demandado" (
+    "litigante_id" VARCHAR(24) NOT NULL REFERENCES "litigante" ("cedula") ON DELETE CASCADE,
+    "causa_id" VARCHAR(64) NOT NULL REFERENCES "causa" ("idJuicio") ON DELETE CASCADE
+);
+CREATE UNIQUE INDEX "uidx_causa_litig_litigan_782a96" ON "causa_litigante_demandado" ("litigante_id", "causa_id");
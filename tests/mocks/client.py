@@ -1,4 +1,5 @@
 import json
+from typing import AsyncIterator
 from unittest import mock
 
 from consulta_pj.client import ProcesosJudicialesClient
@@ -21,6 +22,14 @@ async def get_causas_mocked_data(_, request: CausasRequest) -> list[CausasRespon
 mock_get_causas = mock.patch.object(ProcesosJudicialesClient, "get_causas", get_causas_mocked_data)
 
 
+async def iter_causas_mocked_data(self, request: CausasRequest, *args, **kwargs) -> AsyncIterator[CausasResponse]:
+    for causa in await get_causas_mocked_data(self, request):
+        yield causa
+
+
+mock_iter_causas = mock.patch.object(ProcesosJudicialesClient, "iter_causas", iter_causas_mocked_data)
+
+
 async def get_movimientos(_, proceso: str) -> MovimientosResponse:
     filename = f"tests/fixtures/movimientos_response_{proceso}.json"
     with open(filename) as f:
@@ -0,0 +1,275 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+from aiohttp import web
+
+API_PATH = "/EXPEL-CONSULTA-CAUSAS-SERVICE/api/consulta-causas/informacion/"
+CLEX_API_PATH = "/EXPEL-CONSULTA-CAUSAS-CLEX-SERVICE/api/consulta-causas-clex/informacion/"
+FIXTURES_PATH = Path(__file__).parent.parent / "fixtures"
+
+
+@dataclass
+class UpstreamConfig:
+    latency_median: float = 0.0
+    latency_sigma: float = 0.5
+    error_rate: float = 0.0
+    rate_limit: float | None = None
+    rate_limit_burst: int = 10
+    causas_per_litigante: int = 20
+    movimientos_per_causa: int = 2
+    incidentes_per_movimiento: int = 2
+    actuaciones_per_incidente: int = 5
+    seed: int = 0
+    fixtures_path: Path | None = field(default=FIXTURES_PATH)
+
+
+class UpstreamServer:
+    def __init__(self, config: UpstreamConfig | None = None) -> None:
+        self.config = config or UpstreamConfig()
+        self.random = random.Random(self.config.seed)
+        self.requests: dict[str, int] = {}
+        self._tokens = float(self.config.rate_limit_burst)
+        self._last_refill = time.monotonic()
+        self._runner: web.AppRunner | None = None
+        self.url = ""
+
+    @property
+    def api_url(self) -> str:
+        return f"{self.url}{API_PATH}"
+
+    @property
+    def clex_api_url(self) -> str:
+        return f"{self.url}{CLEX_API_PATH}"
+
+    def make_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._simulate_conditions])
+        app.router.add_post(f"{API_PATH}contarCausas", self.contar_causas)
+        app.router.add_post(f"{API_PATH}buscarCausas", self.buscar_causas)
+        app.router.add_post(f"{API_PATH}actuacionesJudiciales", self.actuaciones_judiciales)
+        app.router.add_get(f"{CLEX_API_PATH}getIncidenteJudicatura/{{idJuicio}}", self.incidente_judicatura)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = self._runner.addresses[0][1]
+        self.url = f"http://{host}:{bound_port}"
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "UpstreamServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.stop()
+
+    @web.middleware
+    async def _simulate_conditions(self, request: web.Request, handler: Any) -> web.StreamResponse:
+        endpoint = request.path.split("/")[-1] if "getIncidenteJudicatura" not in request.path else "getIncidente"
+        self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+        if not self._take_token():
+            return web.Response(status=429, reason="Too Many Requests")
+        if self.config.latency_median > 0:
+            mu = math.log(self.config.latency_median)
+            await asyncio.sleep(self.random.lognormvariate(mu, self.config.latency_sigma))
+        if self.random.random() < self.config.error_rate:
+            return web.Response(status=500, reason="Internal Server Error")
+        return await handler(request)
+
+    def _take_token(self) -> bool:
+        if self.config.rate_limit is None:
+            return True
+        now = time.monotonic()
+        self._tokens = min(
+            self.config.rate_limit_burst, self._tokens + (now - self._last_refill) * self.config.rate_limit
+        )
+        self._last_refill = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    async def contar_causas(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        return web.Response(text=str(len(self.get_causas(body))))
+
+    async def buscar_causas(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        page = int(request.query.get("page", body.get("page", 1)))
+        size = int(request.query.get("size", body.get("size", 10)))
+        causas = self.get_causas(body)[(page - 1) * size : page * size]
+        return web.json_response(causas)
+
+    async def incidente_judicatura(self, request: web.Request) -> web.Response:
+        return web.json_response(self.get_movimientos(request.match_info["idJuicio"]))
+
+    async def actuaciones_judiciales(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        return web.json_response(self.get_actuaciones(body["idJuicio"], body["idIncidenteJudicatura"]))
+
+    def get_causas(self, body: dict[str, Any]) -> list[dict[str, Any]]:
+        actor, demandado = body.get("actor", {}), body.get("demandado", {})
+        litigante = (
+            actor.get("cedulaActor")
+            or actor.get("nombreActor")
+            or demandado.get("cedulaDemandado")
+            or demandado.get("nombreDemandado")
+            or ""
+        )
+        fixture = self._read_fixture(f"causas_response_{litigante}")
+        if fixture is not None:
+            return fixture
+        prefix = _seed(litigante) % 100000
+        return [
+            self._synthetic_causa(f"{prefix:05d}{index:09d}", index)
+            for index in range(self.config.causas_per_litigante)
+        ]
+
+    def get_movimientos(self, id_juicio: str) -> list[dict[str, Any]]:
+        fixture = self._read_fixture(f"movimientos_response_{id_juicio}")
+        if fixture is not None:
+            return fixture
+        seed = _seed(id_juicio)
+        return [
+            self._synthetic_movimiento(id_juicio, seed + index * 1000)
+            for index in range(self.config.movimientos_per_causa)
+        ]
+
+    def get_actuaciones(self, id_juicio: str, id_incidente: int) -> list[dict[str, Any]]:
+        fixture = self._read_fixture(f"actuaciones_judiciales_response_{id_juicio.strip()}")
+        if fixture is not None:
+            return fixture
+        return [
+            self._synthetic_actuacion(id_juicio, id_incidente, index)
+            for index in range(self.config.actuaciones_per_incidente)
+        ]
+
+    def _read_fixture(self, name: str) -> list[dict[str, Any]] | None:
+        if self.config.fixtures_path is None:
+            return None
+        filename = self.config.fixtures_path / f"{name}.json"
+        if not filename.exists():
+            return None
+        with open(filename) as f:
+            data: list[dict[str, Any]] = json.load(f)
+            return data
+
+    def _synthetic_causa(self, id_juicio: str, index: int) -> dict[str, Any]:
+        fecha = _BASE_DATE - timedelta(days=index * 30)
+        return {
+            "idJuicio": id_juicio,
+            "estadoActual": "A",
+            "nombreDelito": f"DELITO SINTETICO {index}",
+            "fechaIngreso": fecha.isoformat(),
+            "fechaProvidencia": fecha.isoformat(),
+            "idEstadoJuicio": 1,
+        }
+
+    def _synthetic_movimiento(self, id_juicio: str, seed: int) -> dict[str, Any]:
+        id_judicatura = f"{seed % 90000 + 10000}"
+        id_movimiento = seed % 10**8
+        return {
+            "idJudicatura": id_judicatura,
+            "nombreJudicatura": f"UNIDAD JUDICIAL {id_judicatura}",
+            "ciudad": "QUITO",
+            "lstIncidenteJudicatura": [
+                {
+                    "idIncidenteJudicatura": id_movimiento * 10 + index,
+                    "idMovimientoJuicioIncidente": id_movimiento,
+                    "idJudicaturaDestino": id_judicatura,
+                    "fechaCrea": _BASE_DATE.isoformat(),
+                    "incidente": index + 1,
+                    "lstLitiganteActor": [
+                        {
+                            "tipoLitigante": "ACTOR",
+                            "nombresLitigante": "ACTOR SINTETICO",
+                            "representadoPor": None,
+                            "idLitigante": seed % 10**7,
+                        }
+                    ],
+                    "lstLitiganteDemandado": [
+                        {
+                            "tipoLitigante": "DEMANDADO",
+                            "nombresLitigante": "DEMANDADO SINTETICO",
+                            "representadoPor": None,
+                            "idLitigante": seed % 10**7 + 1,
+                        }
+                    ],
+                }
+                for index in range(self.config.incidentes_per_movimiento)
+            ],
+        }
+
+    def _synthetic_actuacion(self, id_juicio: str, id_incidente: int, index: int) -> dict[str, Any]:
+        return {
+            "codigo": id_incidente * 100 + index,
+            "idJudicatura": "00000",
+            "idJuicio": id_juicio,
+            "fecha": (_BASE_DATE - timedelta(days=index)).isoformat(),
+            "tipo": "PROVIDENCIA",
+            "actividad": "<p>Actuación sintética</p>" * 20,
+            "visible": "SI",
+            "origen": "SATJE",
+            "idMovimientoJuicioIncidente": id_incidente // 10,
+            "ieTablaReferencia": "",
+            "ieDocumentoAdjunto": "",
+            "escapeOut": "false",
+            "uuid": f"{id_juicio}-{id_incidente}-{index}",
+            "alias": "",
+            "nombreArchivo": "",
+            "tipoIngreso": "",
+            "idTablaReferencia": "",
+        }
+
+
+_BASE_DATE = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+def _seed(value: str) -> int:
+    return int.from_bytes(hashlib.sha256(value.encode()).digest()[:8], "big")
+
+
+async def serve(config: UpstreamConfig, host: str, port: int) -> None:
+    server = UpstreamServer(config)
+    await server.start(host, port)
+    print(f"UPSTREAM_API_URL={server.api_url}")
+    print(f"UPSTREAM_CLEX_API_URL={server.clex_api_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Procesos Judiciales API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-median", type=float, default=0.05)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=None)
+    parser.add_argument("--causas-per-litigante", type=int, default=20)
+    args = parser.parse_args()
+    upstream_config = UpstreamConfig(
+        latency_median=args.latency_median,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        causas_per_litigante=args.causas_per_litigante,
+    )
+    asyncio.run(serve(upstream_config, args.host, args.port))
@@ -0,0 +1,82 @@
+import asyncio
+import json
+from typing import AsyncIterator
+from unittest import mock
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from consulta_pj.client import CausasRequest, CausasResponse, ProcesosJudicialesClient
+from consulta_pj.crawler import LitiganteTipo
+from consulta_pj.db_service import JobStatus
+from consulta_pj.handler import LitiganteJobs
+from consulta_pj.routers import jobs_router, litigantes_router
+from tests.mocks.client import (
+    get_causas_mocked_data,
+    iter_causas_mocked_data,
+    mock_get_actuaciones_judiciales,
+    mock_get_movimientos,
+)
+
+app = FastAPI()
+app.include_router(litigantes_router)
+app.include_router(jobs_router)
+
+
+@pytest.fixture
+async def api(in_memory_db) -> AsyncIterator[httpx.AsyncClient]:
+    transport = httpx.ASGITransport(app=app)
+    async with LitiganteJobs(max_concurrency=1), httpx.AsyncClient(transport=transport, base_url="http://test") as api:
+        yield api
+
+
+async def test_api_job_reports_progress_and_result(api: httpx.AsyncClient):
+    with (
+        mock.patch.object(ProcesosJudicialesClient, "iter_causas", iter_causas_mocked_data),
+        mock_get_movimientos,
+        mock_get_actuaciones_judiciales,
+    ):
+        response = await api.post("/litigantes/actores/1234")
+        assert response.status_code == 202
+        job_id = response.json()["id"]
+        events = await api.get(f"/jobs/{job_id}/events", params={"interval": 0.01})
+
+    messages = [message.split("\n") for message in events.text.strip().split("\n\n")]
+    assert events.headers["content-type"].startswith("text/event-stream")
+    assert [event for event, _ in messages][-1] == "event: done"
+    assert all(event == "event: progress" for event, _ in messages[:-1])
+    job = (await api.get(f"/jobs/{job_id}")).json()
+    assert json.loads(messages[-1][1].removeprefix("data: ")) == job
+    assert job["status"] == JobStatus.DONE and job["tipo"] == LitiganteTipo.ACTOR
+    assert job["progress"] == {"causas_total": 3, "causas_done": 3, "errors": {}}
+    assert len(job["result"]["successful"]) == 3 and job["result"]["litigante_updated"]
+
+
+async def test_api_jobs_run_one_at_a_time_per_worker(api: httpx.AsyncClient):
+    release = asyncio.Event()
+
+    async def blocked_iter_causas(self, request: CausasRequest, *args, **kwargs) -> AsyncIterator[CausasResponse]:
+        await release.wait()
+        for causa in await get_causas_mocked_data(self, request):
+            yield causa
+
+    with (
+        mock.patch.object(ProcesosJudicialesClient, "iter_causas", blocked_iter_causas),
+        mock_get_movimientos,
+        mock_get_actuaciones_judiciales,
+    ):
+        first = (await api.post("/litigantes/", params={"cedula": "1234", "tipo": "ACTOR"})).json()
+        second = (await api.post("/litigantes/actores/1234")).json()
+        await asyncio.sleep(0.05)
+        statuses = [(await api.get(f"/jobs/{job['id']}")).json()["status"] for job in (first, second)]
+        release.set()
+        await api.get(f"/jobs/{second['id']}/events", params={"interval": 0.01})
+
+    assert statuses == [JobStatus.RUNNING, JobStatus.PENDING]
+    assert (await api.get(f"/jobs/{first['id']}")).json()["status"] == JobStatus.DONE
+
+
+async def test_api_job_not_found(api: httpx.AsyncClient):
+    assert (await api.get("/jobs/missing")).status_code == 404
+    assert (await api.get("/jobs/missing/events")).status_code == 404
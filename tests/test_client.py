@@ -0,0 +1,449 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator
+from unittest import mock
+
+import pytest
+
+from consulta_pj.client import (
+    AdaptiveLimiter,
+    Cassette,
+    CassetteMode,
+    CausasRequest,
+    CausasResponse,
+    ClientPool,
+    Lane,
+    ProcesosJudicialesClient,
+    ProcesosJudicialesClientException,
+    RateBudget,
+    ResponseCache,
+    RetryBudget,
+    SingleFlight,
+    client_pool,
+    get_client_pool,
+    upstream_priority,
+)
+from consulta_pj.crawler import InformacionLitigante, crawler
+from tests.mocks.upstream import UpstreamServer
+
+
+async def test_client_pool_shares_connector_between_clients():
+    async with ClientPool(limit=10, limit_per_host=5) as pool:
+        assert get_client_pool() is pool
+        async with ProcesosJudicialesClient(pool=pool) as client_1, ProcesosJudicialesClient(pool=pool) as client_2:
+            assert client_1.session is not None and client_2.session is not None
+            assert client_1.session.connector is client_2.session.connector is pool.connector
+        assert not pool.connector.closed
+        assert pool.connector.limit_per_host == 5
+
+    assert get_client_pool() is None
+
+
+async def test_client_pool_reuses_active_pool():
+    async with ClientPool() as pool:
+        async with client_pool() as borrowed_pool:
+            assert borrowed_pool is pool
+        assert not pool.connector.closed
+
+
+async def test_iter_causas_fetches_pages_until_short_page(causas_response: CausasResponse):
+    causas = [causas_response.model_copy(update={"idJuicio": str(index)}) for index in range(7)]
+    requested_pages: list[int] = []
+
+    async def get_causas_page(_, request: CausasRequest, page: int, size: int) -> list[CausasResponse]:
+        requested_pages.append(page)
+        await asyncio.sleep(0.01 * page)
+        return causas[(page - 1) * size : page * size]
+
+    with mock.patch.object(ProcesosJudicialesClient, "get_causas_page", get_causas_page):
+        client = ProcesosJudicialesClient()
+        result = [causa async for causa in client.iter_causas(CausasRequest(), page_size=3, pages_in_flight=2)]
+
+    assert [causa.idJuicio for causa in result] == [str(index) for index in range(7)]
+    assert requested_pages == [1, 2, 3, 4]
+
+
+async def test_iter_causas_stops_page_requests_when_closed(causas_response: CausasResponse):
+    fetches: list[asyncio.Future[bytes]] = []
+
+    async def fetch(_, method: str, url: str, data: str | None = None) -> bytes:
+        fetches.append(asyncio.ensure_future(asyncio.sleep(10, b"[]")))
+        return await fetches[-1]
+
+    with mock.patch.object(ProcesosJudicialesClient, "_fetch", fetch):
+        async with ProcesosJudicialesClient() as client:
+            causas = client.iter_causas(CausasRequest(), page_size=3, pages_in_flight=2)
+            next_causa = asyncio.create_task(anext(causas))
+            await asyncio.sleep(0.01)
+            next_causa.cancel()
+            await asyncio.gather(next_causa, return_exceptions=True)
+            await causas.aclose()
+
+            assert len(fetches) == 2 and all(fetch.done() for fetch in fetches)
+
+
+async def test_adaptive_limiter_grows_with_stable_latency():
+    limiter = AdaptiveLimiter(initial_limit=2, max_limit=4)
+
+    for _ in range(50):
+        limiter.on_success(0.1)
+
+    assert limiter.limit == 4
+
+
+async def test_adaptive_limiter_cuts_limit_on_overload():
+    limiter = AdaptiveLimiter(initial_limit=10)
+
+    with pytest.raises(ProcesosJudicialesClientException):
+        async with limiter.slot():
+            raise ProcesosJudicialesClientException("Too many requests", status=429)
+
+    assert limiter.limit == 5
+    assert limiter.in_flight == 0
+    assert limiter.stats().overloads == 1
+
+
+async def test_adaptive_limiter_ignores_client_errors():
+    limiter = AdaptiveLimiter(initial_limit=10)
+
+    with pytest.raises(ProcesosJudicialesClientException):
+        async with limiter.slot():
+            raise ProcesosJudicialesClientException("Not found", status=404)
+
+    assert limiter.limit == 10
+
+
+async def test_adaptive_limiter_cuts_limit_on_latency_spike():
+    limiter = AdaptiveLimiter(initial_limit=10)
+    limiter.on_success(0.1)
+
+    limiter.on_success(1.0)
+
+    assert limiter.limit == 5
+
+
+async def test_adaptive_limiter_bounds_in_flight_requests():
+    limiter = AdaptiveLimiter(initial_limit=2, max_limit=2)
+    max_in_flight = 0
+
+    async def request() -> None:
+        nonlocal max_in_flight
+        async with limiter.slot():
+            max_in_flight = max(max_in_flight, limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(request() for _ in range(10)))
+
+    assert max_in_flight == 2
+
+
+async def test_adaptive_limiter_serves_interactive_lane_then_recent_bulk_first():
+    limiter = AdaptiveLimiter(initial_limit=1, max_limit=1)
+    served: list[str] = []
+
+    async def request(name: str, lane: Lane, recency: datetime | None = None) -> None:
+        with upstream_priority(lane, recency):
+            async with limiter.slot():
+                served.append(name)
+
+    await limiter.acquire()
+    requests = [
+        asyncio.create_task(request("old causa", Lane.BULK, datetime(2015, 1, 1, tzinfo=timezone.utc))),
+        asyncio.create_task(request("recent causa", Lane.BULK, datetime(2024, 1, 1, tzinfo=timezone.utc))),
+        asyncio.create_task(request("listing", Lane.BULK)),
+        asyncio.create_task(request("api", Lane.INTERACTIVE)),
+    ]
+    await asyncio.sleep(0)
+    lanes = {lane.lane: lane for lane in limiter.stats().lanes}
+    assert (lanes[Lane.INTERACTIVE].queued, lanes[Lane.BULK].queued) == (1, 3)
+
+    await limiter.release()
+    await asyncio.gather(*requests)
+
+    assert served == ["api", "listing", "recent causa", "old causa"]
+    lanes = {lane.lane: lane for lane in limiter.stats().lanes}
+    assert (lanes[Lane.INTERACTIVE].requests, lanes[Lane.BULK].requests) == (1, 3)
+    assert lanes[Lane.INTERACTIVE].slo_attainment == 1.0
+    assert limiter.in_flight == 0
+
+
+async def test_interactive_caller_raises_the_priority_of_a_coalesced_bulk_request():
+    limiter = AdaptiveLimiter(initial_limit=1, max_limit=1)
+    singleflight: SingleFlight[str] = SingleFlight()
+    served: list[str] = []
+
+    async def request(name: str) -> str:
+        async with limiter.slot():
+            served.append(name)
+        return name
+
+    async def call(name: str, lane: Lane, recency: datetime | None = None) -> str:
+        with upstream_priority(lane, recency):
+            return await singleflight.do(name, lambda: request(name))
+
+    await limiter.acquire()
+    requests = [
+        asyncio.create_task(call("old causa", Lane.BULK, datetime(2015, 1, 1, tzinfo=timezone.utc))),
+        asyncio.create_task(call("recent causa", Lane.BULK, datetime(2024, 1, 1, tzinfo=timezone.utc))),
+    ]
+    await asyncio.sleep(0)
+    requests.append(asyncio.create_task(call("old causa", Lane.INTERACTIVE)))
+    await asyncio.sleep(0)
+
+    await limiter.release()
+    await asyncio.gather(*requests)
+
+    assert served == ["old causa", "recent causa"]
+    assert singleflight.stats().coalesced == 1
+    assert limiter.in_flight == 0
+
+
+async def test_adaptive_limiter_cancelled_waiter_keeps_no_slot():
+    limiter = AdaptiveLimiter(initial_limit=1, max_limit=1)
+    await limiter.acquire()
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await limiter.release()
+
+    await asyncio.wait_for(limiter.acquire(), timeout=1)
+    assert limiter.in_flight == 1
+
+
+@pytest.fixture
+async def response_cache(tmp_path: Path) -> AsyncIterator[ResponseCache]:
+    cache = ResponseCache(
+        str(tmp_path / "cache.sqlite"),
+        ttls={"getIncidenteJudicatura": 60, "actuacionesJudiciales": 60},
+        max_size_bytes=10_000,
+        dormant_after_days=365,
+        dormant_ttl=3600,
+    )
+    await cache.open()
+    yield cache
+    await cache.close()
+
+
+async def test_response_cache_serves_repeated_requests_locally(response_cache: ResponseCache):
+    fetched_urls: list[str] = []
+
+    async def fetch(_, method: str, url: str, data: str | None = None) -> bytes:
+        fetched_urls.append(url)
+        return b"[]"
+
+    async with ClientPool(cache=response_cache) as pool:
+        with mock.patch.object(ProcesosJudicialesClient, "_fetch", fetch):
+            async with ProcesosJudicialesClient(pool=pool) as client:
+                first_response = await client.get_movimientos("1234")
+                second_response = await client.get_movimientos("1234")
+
+    assert first_response == second_response
+    assert len(fetched_urls) == 1
+    assert response_cache.stats().hits == 1
+    assert response_cache.stats().misses == 1
+
+
+async def test_response_cache_expires_entries(response_cache: ResponseCache):
+    response_cache.ttls["actuacionesJudiciales"] = 0
+
+    await response_cache.set("key", "actuacionesJudiciales", b"payload")
+
+    assert await response_cache.get("key") is None
+    assert response_cache.stats().expired == 1
+
+
+async def test_response_cache_evicts_least_recently_used(response_cache: ResponseCache):
+    payloads = {f"key-{index}": os.urandom(4_000) for index in range(3)}
+    for key, payload in payloads.items():
+        await response_cache.set(key, "getIncidenteJudicatura", payload)
+
+    assert await response_cache.get("key-0") is None
+    assert await response_cache.get("key-2") == payloads["key-2"]
+    assert response_cache.stats().evictions == 1
+    assert response_cache.stats().size_bytes <= response_cache.max_size_bytes
+
+
+def test_response_cache_extends_ttl_for_dormant_causas(response_cache: ResponseCache):
+    recent = datetime.now(timezone.utc)
+    dormant = datetime(2015, 1, 1, tzinfo=timezone.utc)
+
+    assert response_cache.get_ttl("getIncidenteJudicatura", recent) == 60
+    assert response_cache.get_ttl("getIncidenteJudicatura", dormant) == 3600
+
+
+async def test_singleflight_coalesces_concurrent_identical_requests():
+    fetched_urls: list[str] = []
+
+    async def fetch(_, method: str, url: str, data: str | None = None) -> bytes:
+        fetched_urls.append(url)
+        await asyncio.sleep(0.01)
+        return b"[]"
+
+    async with ClientPool() as pool:
+        with mock.patch.object(ProcesosJudicialesClient, "_fetch", fetch):
+            async with (
+                ProcesosJudicialesClient(pool=pool) as client_1,
+                ProcesosJudicialesClient(pool=pool) as client_2,
+            ):
+                responses = await asyncio.gather(
+                    client_1.get_movimientos("1234"),
+                    client_2.get_movimientos("1234"),
+                    client_2.get_movimientos("5678"),
+                )
+
+    assert len(responses) == 3
+    assert len(fetched_urls) == 2
+    assert pool.singleflight.stats().coalesced == 1
+    assert pool.singleflight.stats().in_flight == 0
+
+
+async def test_singleflight_shares_failures():
+    singleflight: SingleFlight[bytes] = SingleFlight()
+
+    async def failing_request() -> bytes:
+        await asyncio.sleep(0.01)
+        raise ProcesosJudicialesClientException("Service unavailable", status=503)
+
+    results = await asyncio.gather(
+        singleflight.do("key", failing_request),
+        singleflight.do("key", failing_request),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(result, ProcesosJudicialesClientException) for result in results)
+    assert singleflight.stats().executed == 1
+    assert singleflight.stats().failures == 1
+
+
+async def test_singleflight_cancels_the_request_when_its_last_waiter_leaves():
+    singleflight: SingleFlight[bytes] = SingleFlight()
+    started, stopped = asyncio.Event(), asyncio.Event()
+
+    async def slow_request() -> bytes:
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        finally:
+            stopped.set()
+        return b"[]"
+
+    first = asyncio.create_task(singleflight.do("key", slow_request))
+    second = asyncio.create_task(singleflight.do("key", slow_request))
+    await started.wait()
+    first.cancel()
+    await asyncio.sleep(0.01)
+    assert not stopped.is_set()
+
+    second.cancel()
+    await asyncio.gather(first, second, return_exceptions=True)
+
+    assert stopped.is_set()
+    assert singleflight.stats().in_flight == 0
+
+
+async def test_cassette_replays_recorded_crawl(
+    tmp_path: Path, upstream: UpstreamServer, informacion_litigante_1234: InformacionLitigante
+):
+    cassette_path = str(tmp_path / "crawl.cassette.gz")
+    async with ClientPool(cassette=Cassette(cassette_path, CassetteMode.RECORD)) as pool:
+        recorded_result = await crawler.get_actor_info("1234")
+    recorded_requests = sum(upstream.requests.values())
+    await upstream.stop()
+
+    async with ClientPool(cassette=Cassette(cassette_path, CassetteMode.REPLAY)):
+        replayed_result = await crawler.get_actor_info("1234")
+
+    assert pool.cassette is not None and pool.cassette.recorded == recorded_requests
+    assert recorded_result == replayed_result == informacion_litigante_1234
+
+
+@pytest.mark.parametrize(
+    "failures,status,expected_calls,succeeds",
+    [(2, 503, 3, True), (1, 404, 1, False), (10, 429, 4, False)],
+)
+async def test_client_retries_failed_requests(failures: int, status: int, expected_calls: int, succeeds: bool):
+    calls = 0
+
+    async def send(_, session, method: str, url: str, data: str | None) -> bytes:
+        nonlocal calls
+        calls += 1
+        if calls <= failures:
+            raise ProcesosJudicialesClientException("Error", status=status)
+        return b"[]"
+
+    with mock.patch.object(ProcesosJudicialesClient, "_send", send):
+        async with ProcesosJudicialesClient() as client:
+            client.retry_budget = RetryBudget(max_retries=3, base_delay=0.001)
+            if succeeds:
+                await client.get_movimientos("1234")
+            else:
+                with pytest.raises(ProcesosJudicialesClientException):
+                    await client.get_movimientos("1234")
+
+    assert calls == expected_calls
+
+
+def test_retry_budget_is_shared_by_the_whole_crawl():
+    retry_budget = RetryBudget(budget_ratio=0.1, budget_min=1)
+    error = ProcesosJudicialesClientException("Error", status=503)
+    for _ in range(10):
+        retry_budget.on_request()
+
+    assert retry_budget.should_retry(error, attempt=0)
+    assert retry_budget.should_retry(error, attempt=0)
+    assert not retry_budget.should_retry(error, attempt=0)
+
+
+def drain_rate_budget(rate_budget: RateBudget, requests: int) -> None:
+    for _ in range(requests):
+        asyncio.run(rate_budget.acquire())
+
+
+async def test_rate_budget_is_shared_across_processes():
+    context = multiprocessing.get_context("spawn")
+    rate_budget = RateBudget(rate=1, burst=5, context=context)
+    process = context.Process(target=drain_rate_budget, args=(rate_budget, 5))
+    process.start()
+    await asyncio.to_thread(process.join)
+
+    start = time.monotonic()
+    async with ClientPool(rate_budget=rate_budget) as pool:
+        with mock.patch.object(ProcesosJudicialesClient, "_send", return_value=b"[]"):
+            async with ProcesosJudicialesClient(pool=pool) as client:
+                await client.get_movimientos("1234")
+
+    stats = pool.stats().rate
+    assert process.exitcode == 0
+    assert time.monotonic() - start >= 0.5
+    assert stats is not None and stats.granted == 6 and stats.throttled >= 1
+
+
+def drain_bulk_share(path: str, requests: int) -> None:
+    rate_budget = RateBudget(rate=1, burst=10, interactive_share=0.5, path=path)
+    for _ in range(requests):
+        asyncio.run(rate_budget.acquire())
+
+
+async def test_rate_budget_keeps_its_interactive_share_for_other_processes(tmp_path: Path):
+    path = str(tmp_path / "upstream_rate")
+    # A batch process draws from the budget file without having been handed the budget
+    process = multiprocessing.get_context("spawn").Process(target=drain_bulk_share, args=(path, 5))
+    process.start()
+    await asyncio.to_thread(process.join)
+    api_budget = RateBudget(rate=1, burst=10, interactive_share=0.5, path=path)
+
+    with pytest.raises(TimeoutError):
+        await asyncio.wait_for(api_budget.acquire(), timeout=0.2)
+    start = time.monotonic()
+    with upstream_priority(Lane.INTERACTIVE):
+        for _ in range(5):
+            await api_budget.acquire()
+
+    stats = api_budget.stats()
+    assert process.exitcode == 0
+    assert time.monotonic() - start < 0.1
+    assert (stats.reserved, stats.granted) == (5, 10) and stats.throttled >= 1
@@ -0,0 +1,105 @@
+import logging
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+import orjson
+import pytest
+from pydantic import TypeAdapter
+
+from consulta_pj.client import ActuacionesResponse, CausasResponse, MovimientosResponse
+from consulta_pj.client.decoding import (
+    ACTUACIONES_ADAPTER,
+    CAUSAS_ADAPTER,
+    decode_actuaciones,
+    decode_causas,
+    decode_movimientos,
+)
+from consulta_pj.client.schemas import MovimientoSchema
+
+ITERATIONS = 200
+ROUNDS = 10
+MOVIMIENTOS_ADAPTER = TypeAdapter(list[MovimientoSchema])
+
+
+def legacy_decode_causas(payload: bytes) -> list[CausasResponse]:
+    return [CausasResponse(**causa) for causa in orjson.loads(payload.decode())]
+
+
+def legacy_decode_movimientos(payload: bytes) -> MovimientosResponse:
+    return MovimientosResponse(movimientos=orjson.loads(payload.decode()))
+
+
+def legacy_decode_actuaciones(payload: bytes) -> ActuacionesResponse:
+    return ActuacionesResponse(actuaciones=orjson.loads(payload.decode()))
+
+
+def json_decode_causas(payload: bytes) -> list[CausasResponse]:
+    return CAUSAS_ADAPTER.validate_json(payload)
+
+
+def json_decode_movimientos(payload: bytes) -> MovimientosResponse:
+    return MovimientosResponse.model_construct(movimientos=MOVIMIENTOS_ADAPTER.validate_json(payload))
+
+
+def json_decode_actuaciones(payload: bytes) -> ActuacionesResponse:
+    return ActuacionesResponse.model_construct(actuaciones=ACTUACIONES_ADAPTER.validate_json(payload))
+
+
+def cpu_time_per_request(decoders: list[Callable[[bytes], Any]], payload: bytes) -> list[float]:
+    # Rounds interleave the decoders and the fastest round of each counts, so a noisy neighbour slows them all alike
+    times = [float("inf")] * len(decoders)
+    for _ in range(ROUNDS):
+        for index, decode in enumerate(decoders):
+            start = time.process_time()
+            for _ in range(ITERATIONS):
+                decode(payload)
+            times[index] = min(times[index], (time.process_time() - start) / ITERATIONS)
+    return times
+
+
+@pytest.mark.parametrize(
+    "fixture,legacy_decode,decode,json_decode",
+    [
+        ("causas_response_1234", legacy_decode_causas, decode_causas, json_decode_causas),
+        (
+            "movimientos_response_08256202400340",
+            legacy_decode_movimientos,
+            decode_movimientos,
+            json_decode_movimientos,
+        ),
+        (
+            "movimientos_response_17203202403044",
+            legacy_decode_movimientos,
+            decode_movimientos,
+            json_decode_movimientos,
+        ),
+        (
+            "actuaciones_judiciales_response_08256202400340",
+            legacy_decode_actuaciones,
+            decode_actuaciones,
+            json_decode_actuaciones,
+        ),
+        (
+            "actuaciones_judiciales_response_12283202402129",
+            legacy_decode_actuaciones,
+            decode_actuaciones,
+            json_decode_actuaciones,
+        ),
+    ],
+)
+def test_decoding_benchmark(
+    fixture: str,
+    legacy_decode: Callable[[bytes], Any],
+    decode: Callable[[bytes], Any],
+    json_decode: Callable[[bytes], Any],
+):
+    payload = Path(f"tests/fixtures/{fixture}.json").read_bytes()
+
+    assert decode(payload) == legacy_decode(payload) == json_decode(payload)
+
+    legacy_time, fast_time, json_time = cpu_time_per_request([legacy_decode, decode, json_decode], payload)
+    logging.info(
+        f"{fixture}: legacy {legacy_time * 1e6:.1f}us, bytes {fast_time * 1e6:.1f}us, "
+        f"validate_json {json_time * 1e6:.1f}us, saved {(legacy_time - fast_time) * 1e6:.1f}us per request"
+    )
@@ -1,11 +1,30 @@
+import asyncio
 from typing import Any
+from unittest import mock
 
-from consulta_pj.client import CausaActor, CausasRequest
-from consulta_pj.crawler import LitiganteSchema, LitiganteTipo, crawler
-from tests.mocks.client import mock_get_actuaciones_judiciales, mock_get_causas, mock_get_movimientos
+import pytest
 
+from consulta_pj.client import (
+    ActuacionesRequest,
+    ActuacionesResponse,
+    CausaActor,
+    CausasRequest,
+    MovimientosResponse,
+    ProcesosJudicialesClient,
+    ProcesosJudicialesClientException,
+)
+from consulta_pj.crawler import CausaSchema, InformacionLitigante, LitiganteSchema, LitiganteTipo, crawler
+from tests.mocks.client import (
+    get_actuaciones,
+    get_causas_mocked_data,
+    get_movimientos,
+    mock_get_actuaciones_judiciales,
+    mock_get_movimientos,
+    mock_iter_causas,
+)
 
-@mock_get_causas
+
+@mock_iter_causas
 @mock_get_movimientos
 @mock_get_actuaciones_judiciales
 async def test_crawler_get_litigante_info(informacion_litigante_1234: dict[str, Any]):
@@ -20,7 +39,7 @@ async def test_crawler_get_litigante_info(informacion_litigante_1234: dict[str,
     assert informacion_litigante_1234 == informacion_litigante_result
 
 
-@mock_get_causas
+@mock_iter_causas
 @mock_get_movimientos
 @mock_get_actuaciones_judiciales
 async def test_crawler_get_actor_info(informacion_litigante_1234: dict[str, Any]):
@@ -30,3 +49,90 @@ async def test_crawler_get_actor_info(informacion_litigante_1234: dict[str, Any]
     assert informacion_litigante_result.litigante.cedula == "1234"
     assert len(informacion_litigante_result.causas) == 3
     assert informacion_litigante_1234 == informacion_litigante_result
+
+
+@mock_iter_causas
+@mock_get_movimientos
+async def test_crawler_fetches_incidentes_in_parallel_keeping_order(
+    informacion_litigante_1234: InformacionLitigante,
+):
+    in_flight = 0
+    max_in_flight = 0
+
+    async def get_actuaciones_with_latency(client, request: ActuacionesRequest) -> ActuacionesResponse:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01 / request.incidente)
+        in_flight -= 1
+        return await get_actuaciones(client, request)
+
+    with mock.patch.object(ProcesosJudicialesClient, "get_actuaciones", get_actuaciones_with_latency):
+        result = await crawler.get_actor_info("1234", max_concurrency=4)
+
+    assert result == informacion_litigante_1234
+    assert 1 < max_in_flight <= 4
+
+
+@mock_iter_causas
+@mock_get_actuaciones_judiciales
+async def test_crawler_crawl_litigante_into_waits_for_full_queue(informacion_litigante_1234: InformacionLitigante):
+    crawled_causas: list[str] = []
+
+    async def get_movimientos_tracked(client, causa_id: str) -> MovimientosResponse:
+        crawled_causas.append(causa_id)
+        return await get_movimientos(client, causa_id)
+
+    litigante = LitiganteSchema(cedula="1234", tipo=LitiganteTipo.ACTOR)
+    queue: asyncio.Queue[CausaSchema] = asyncio.Queue(maxsize=1)
+    with mock.patch.object(ProcesosJudicialesClient, "get_movimientos", get_movimientos_tracked):
+        crawl = asyncio.create_task(
+            crawler.crawl_litigante_into(queue, litigante, crawler.get_causas_request(litigante), max_concurrency=1)
+        )
+        await asyncio.sleep(0.05)
+        # One causa waits in the queue and the next one waits to be put, the last one is not crawled yet
+        assert len(crawled_causas) == 2 and not crawl.done()
+
+        streamed_causas = [await queue.get() for _ in informacion_litigante_1234.causas]
+        unchanged_causas, failed_causas = await crawl
+
+    assert streamed_causas == informacion_litigante_1234.causas
+    assert unchanged_causas == [] and failed_causas == {}
+
+
+async def test_crawler_get_causa_cancels_sibling_requests_when_one_fails():
+    [causa, *_] = await get_causas_mocked_data(None, CausasRequest(actor=CausaActor(cedulaActor="1234")))
+    [movimiento] = (await get_movimientos(None, causa.idJuicio)).movimientos
+    [incidente] = movimiento.lstIncidenteJudicatura
+    incidentes = [incidente.model_copy(update={"incidente": number}) for number in range(1, 4)]
+    movimientos = MovimientosResponse(
+        movimientos=[movimiento.model_copy(update={"lstIncidenteJudicatura": incidentes})] * 2
+    )
+    started: list[int] = []
+    cancelled: list[int] = []
+
+    async def get_movimientos_with_incidentes(client, causa_id: str) -> MovimientosResponse:
+        return movimientos
+
+    async def get_actuaciones_failing_once(client, request: ActuacionesRequest) -> ActuacionesResponse:
+        started.append(request.incidente)
+        if len(started) == 1:
+            await asyncio.sleep(0.01)
+            raise ProcesosJudicialesClientException("Bad gateway", status=502)
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(request.incidente)
+            raise
+        return await get_actuaciones(client, request)
+
+    with (
+        mock.patch.object(ProcesosJudicialesClient, "get_movimientos", get_movimientos_with_incidentes),
+        mock.patch.object(ProcesosJudicialesClient, "get_actuaciones", get_actuaciones_failing_once),
+    ):
+        async with ProcesosJudicialesClient() as client:
+            with pytest.raises(ProcesosJudicialesClientException):
+                await crawler.get_causa(causa, client)
+
+    # Every other actuaciones request was cancelled before the failure reached the caller
+    assert len(started) == 6 and len(cancelled) == 5
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+import statistics
+import time
+from typing import AsyncIterator
+
+import pytest
+
+from consulta_pj.client import CausaActor, CausasRequest, ClientPool
+from consulta_pj.crawler import InformacionLitigante, LitiganteSchema, LitiganteTipo, crawler
+from consulta_pj.settings import get_settings
+from tests.conftest import start_upstream
+from tests.mocks.upstream import UpstreamConfig, UpstreamServer
+
+LITIGANTES = [f"BENCHMARK-{index}" for index in range(10)]
+
+
+@pytest.fixture
+async def slow_upstream(monkeypatch: pytest.MonkeyPatch) -> AsyncIterator[UpstreamServer]:
+    config = UpstreamConfig(latency_median=0.01, latency_sigma=0.5, causas_per_litigante=10, fixtures_path=None)
+    server = await start_upstream(config, monkeypatch)
+    yield server
+    await server.stop()
+    get_settings.cache_clear()
+
+
+async def test_crawler_against_local_upstream(
+    upstream: UpstreamServer, informacion_litigante_1234: InformacionLitigante
+):
+    result = await crawler.get_actor_info("1234")
+
+    assert result == informacion_litigante_1234
+    assert "contarCausas" not in upstream.requests
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 5, 15])
+async def test_crawler_throughput_benchmark(slow_upstream: UpstreamServer, max_concurrency: int):
+    durations: list[float] = []
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def timed_litigante_info(nombre: str) -> InformacionLitigante:
+        async with semaphore:
+            start = time.perf_counter()
+            litigante = LitiganteSchema(cedula="", nombre=nombre, tipo=LitiganteTipo.ACTOR)
+            causas_request = CausasRequest(actor=CausaActor(nombreActor=nombre))
+            result = await crawler.get_litigante_info(litigante, causas_request)
+            durations.append(time.perf_counter() - start)
+            return result
+
+    async with ClientPool():
+        start = time.perf_counter()
+        results = await asyncio.gather(*(timed_litigante_info(nombre) for nombre in LITIGANTES))
+        elapsed = time.perf_counter() - start
+
+    total_causas = sum(len(result.causas) for result in results)
+    percentiles = statistics.quantiles(durations, n=100, method="inclusive")
+    logging.info(
+        f"max_concurrency={max_concurrency}: {total_causas / elapsed:.1f} causas/s, "
+        f"p50={percentiles[49]:.3f}s, p99={percentiles[98]:.3f}s"
+    )
+    assert total_causas == len(LITIGANTES) * slow_upstream.config.causas_per_litigante
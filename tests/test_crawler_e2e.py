@@ -2,7 +2,7 @@ import logging
 
 import pytest
 
-from consulta_pj.client import CausaActor, CausasRequest
+from consulta_pj.client import CausaActor, CausasRequest, client_pool
 from consulta_pj.concurrency import gather_with_concurrency
 from consulta_pj.crawler import LitiganteSchema, LitiganteTipo, crawler
 from consulta_pj.time_decorator import time_async
@@ -36,7 +36,8 @@ async def run_multiple_litigantes(actores, max_concurrency):
     litigantes = [LitiganteSchema(cedula="", nombre=nombre, tipo=LitiganteTipo.ACTOR) for nombre in actores]
     causas = [CausasRequest(actor=CausaActor(nombreActor=nombre)) for nombre in actores]
     tasks = [crawler.get_litigante_info(litigante, causa, 1) for litigante, causa in zip(litigantes, causas)]
-    results = await gather_with_concurrency(max_concurrency, tasks)
+    async with client_pool():
+        results = await gather_with_concurrency(max_concurrency, tasks)
     logging.info(f"Results: {[len(result.causas) for result in results]}")
     return results
 
@@ -50,5 +51,6 @@ async def test_crawler_parallel_causas(max_concurrency):
 
 @time_async
 async def run_multiple_causas(actor_id, max_concurrency):
-    informacion_litigantes = await crawler.get_actor_info(actor_id, max_concurrency)
+    async with client_pool():
+        informacion_litigantes = await crawler.get_actor_info(actor_id, max_concurrency)
     return informacion_litigantes
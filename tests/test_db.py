@@ -1,13 +1,36 @@
+import asyncio
+import importlib
+import logging
+import random
+from datetime import datetime, timezone
+from unittest import mock
+
 import pytest
+from tortoise import Tortoise
+
+from consulta_pj.crawler.schemas import InformacionLitigante, JudicaturaSchema, LitiganteSchema, LitiganteTipo
+from consulta_pj.db_service import (
+    CreateActuacionRequest,
+    DBService,
+    UpsertResult,
+    WriteBuffer,
+    migrate,
+    tortoise_config,
+    write_connection,
+)
+from consulta_pj.db_service.models import Actuacion, Causa, Implicado, Incidente, Judicatura, Litigante, Movimiento
+from consulta_pj.db_service.upsert import COPY_MIN_ROWS, bulk_load
+from consulta_pj.handler import handler
+from consulta_pj.settings import get_settings
 
-from consulta_pj.crawler.schemas import InformacionLitigante, LitiganteSchema, LitiganteTipo
-from consulta_pj.db_service import DBService
-from consulta_pj.db_service.models import Causa, Litigante
+upsert_module = importlib.import_module("consulta_pj.db_service.upsert")
 
 
 @pytest.fixture(autouse=True)
-async def auto_in_memory_db(in_memory_db):
-    yield
+def auto_in_memory_db(request: pytest.FixtureRequest) -> None:
+    # Tests on PostgreSQL set up a database of their own
+    if "postgres_url" not in request.fixturenames:
+        request.getfixturevalue("in_memory_db")
 
 
 @pytest.mark.parametrize("tipo", [LitiganteTipo.ACTOR, LitiganteTipo.DEMANDADO])
@@ -60,3 +83,216 @@ async def test_create_litigante_with_previously_existing_causas(
 
     assert litigante_id == litigante.cedula == litigante_in_db.cedula
     assert {causa.idJuicio for causa in causas_in_db} == {existing_causa_id, new_causa_id}
+
+
+async def table_rows() -> dict[str, list[tuple]]:
+    rows = {}
+    for model in (Causa, Judicatura, Movimiento, Incidente, Actuacion, Implicado):
+        fields = sorted(field for field in model._meta.db_fields if field != "last_updated")
+        rows[model.__name__] = sorted(await model.all().values_list(*fields))
+    for relation in ("incidentes_actor", "incidentes_demandado"):
+        rows[relation] = sorted(await Implicado.all().values_list("id", f"{relation}__idIncidente"))
+    return rows
+
+
+async def test_persist_causas_writes_the_same_rows_as_process_causa(informacion_litigante_1234: InformacionLitigante):
+    for causa in informacion_litigante_1234.causas:
+        await handler.process_causa(causa)
+    expected = await table_rows()
+    for model in (Actuacion, Incidente, Movimiento, Judicatura, Causa, Implicado):
+        await model.all().delete()
+
+    id_causas = await DBService().persist_causas(informacion_litigante_1234.causas)
+
+    assert id_causas == [(causa.idJuicio, "") for causa in informacion_litigante_1234.causas]
+    assert await table_rows() == expected
+
+
+async def test_persist_causas_isolates_a_failing_causa(informacion_litigante_1234: InformacionLitigante):
+    causas = informacion_litigante_1234.causas
+    broken = causas[1].model_copy(update={"fechaIngreso": None})
+
+    id_causas = await DBService().persist_causas([causas[0], broken, causas[2]], chunk_size=2)
+
+    assert [causa_id for causa_id, error in id_causas if not error] == [causas[0].idJuicio, causas[2].idJuicio]
+    assert id_causas[1][0] == broken.idJuicio and "fechaIngreso" in id_causas[1][1]
+    assert set(await Causa.all().values_list("idJuicio", flat=True)) == {causas[0].idJuicio, causas[2].idJuicio}
+    assert not await Movimiento.filter(causa_id=broken.idJuicio).exists()
+    assert (await Causa.get(idJuicio=causas[0].idJuicio)).estadoActual == causas[0].estadoActual
+
+
+async def test_bulk_update_or_create_implicados(informacion_litigante_1234: InformacionLitigante):
+    await handler.persist_causas(informacion_litigante_1234)
+    incidentes = [
+        incidente
+        for causa in informacion_litigante_1234.causas
+        for movimiento in causa.movimientos
+        for incidente in movimiento.incidentes
+    ]
+    expected = await table_rows()
+    renamed = incidentes[0].actores[0].model_copy(update={"nombre": "Renombrado"})
+    incidentes[0] = incidentes[0].model_copy(update={"actores": [renamed, *incidentes[0].actores[1:]]})
+
+    implicados = await DBService().bulk_update_or_create_implicados(incidentes)
+
+    rows = await table_rows()
+    assert sorted(implicados) == sorted(row[0] for row in expected["Implicado"])
+    assert (await Implicado.get(id=renamed.idImplicado)).nombre == "Renombrado"
+    assert (rows["incidentes_actor"], rows["incidentes_demandado"]) == (
+        expected["incidentes_actor"],
+        expected["incidentes_demandado"],
+    )
+
+
+async def test_concurrent_bulk_associate_litigantes_link_each_pair_once(
+    informacion_litigante_1234: InformacionLitigante,
+):
+    await handler.persist_causas(informacion_litigante_1234)
+    causas_ids = [causa.idJuicio for causa in informacion_litigante_1234.causas]
+    db_service = DBService()
+
+    created = await asyncio.gather(
+        db_service.bulk_associate_litigantes(LitiganteTipo.ACTOR, {"1111": causas_ids, "2222": causas_ids[:1]}),
+        db_service.bulk_associate_litigantes(LitiganteTipo.ACTOR, {"1111": causas_ids}),
+    )
+
+    assert sum(created) == len(causas_ids) + 1
+    litigante = await Litigante.get(cedula="1111")
+    assert await litigante.causas_actor.all().count() == len(causas_ids)
+
+
+async def test_write_buffer_coalesces_concurrent_producers(informacion_litigante_1234: InformacionLitigante):
+    causas = informacion_litigante_1234.causas
+
+    async with WriteBuffer(max_delay=0.05) as buffer:
+        results = await asyncio.gather(DBService().persist_causas(causas[:1]), DBService().persist_causas(causas[1:]))
+        flushes = buffer.flushes
+
+    assert results == [[(causas[0].idJuicio, "")], [(causa.idJuicio, "") for causa in causas[1:]]]
+    assert flushes == 1
+    assert await Causa.all().count() == len(causas)
+
+
+async def test_write_buffer_flushes_when_full(informacion_litigante_1234: InformacionLitigante):
+    causas = informacion_litigante_1234.causas
+
+    async with WriteBuffer(max_rows=1, max_delay=60) as buffer:
+        first = await asyncio.wait_for(DBService().persist_causas(causas[:1]), timeout=5)
+        assert await Causa.filter(idJuicio=causas[0].idJuicio).exists()
+        second = await asyncio.wait_for(DBService().persist_causas(causas[1:]), timeout=5)
+
+    assert buffer.flushes == 2
+    assert [error for _, error in first + second] == ["", "", ""]
+
+
+def judicaturas_and_actuaciones(
+    informacion_litigante: InformacionLitigante,
+) -> tuple[list[JudicaturaSchema], list[CreateActuacionRequest]]:
+    movimientos = [movimiento for causa in informacion_litigante.causas for movimiento in causa.movimientos]
+    actuaciones = [
+        CreateActuacionRequest(
+            actuacion=actuacion, judicatura_id=movimiento.judicatura.idJudicatura, incidente_id=incidente.idIncidente
+        )
+        for movimiento in movimientos
+        for incidente in movimiento.incidentes
+        for actuacion in incidente.actuaciones
+    ]
+    return [movimiento.judicatura for movimiento in movimientos], actuaciones
+
+
+async def test_bulk_upsert_counts_inserted_updated_and_unchanged(informacion_litigante_1234: InformacionLitigante):
+    judicaturas, actuaciones = judicaturas_and_actuaciones(informacion_litigante_1234)
+    judicatura_ids = {judicatura.idJudicatura for judicatura in judicaturas}
+    db_service = DBService()
+
+    inserted = await db_service.bulk_upsert_judicatura(judicaturas)
+    unchanged = await db_service.bulk_upsert_judicatura(judicaturas)
+    renamed = judicaturas[0].model_copy(update={"nombre": "Unidad Judicial Renombrada"})
+    updated = await db_service.bulk_upsert_judicatura([renamed, *judicaturas[1:]])
+
+    assert inserted == UpsertResult(inserted=len(judicatura_ids))
+    assert unchanged == UpsertResult(unchanged=len(judicatura_ids))
+    assert updated == UpsertResult(updated=1, unchanged=len(judicatura_ids) - 1)
+    assert (await Judicatura.get(idJudicatura=renamed.idJudicatura)).nombreJudicatura == "Unidad Judicial Renombrada"
+
+    await handler.persist_causas(informacion_litigante_1234)
+    changed = actuaciones[0].model_copy(
+        update={"actuacion": actuaciones[0].actuacion.model_copy(update={"nombreArchivo": None})}
+    )
+    assert await db_service.bulk_upsert_actuacion([changed, *actuaciones[1:]]) == UpsertResult(
+        updated=1, unchanged=len(actuaciones) - 1
+    )
+    assert (await Actuacion.get(uuid=changed.actuacion.uuid)).nombreArchivo is None
+
+
+async def test_bulk_upsert_writes_rows_in_primary_key_order(caplog: pytest.LogCaptureFixture):
+    judicaturas = [
+        JudicaturaSchema(idJudicatura=id_judicatura, nombre="Unidad Judicial", ciudad="Quito")
+        for id_judicatura in ("J3", "J1", "J2", "J1")
+    ]
+
+    with caplog.at_level(logging.DEBUG, logger="tortoise.db_client"):
+        await DBService().bulk_upsert_judicatura(judicaturas)
+
+    [values] = [
+        record.args[1]
+        for record in caplog.records
+        if isinstance(record.args, tuple) and record.args[0].startswith('INSERT INTO "judicatura"')
+    ]
+    assert values[:: len(values) // 3] == ["J1", "J2", "J3"]
+
+
+async def test_persist_causas_updates_changed_rows_on_recrawl(informacion_litigante_1234: InformacionLitigante):
+    await handler.persist_causas(informacion_litigante_1234)
+    causa = informacion_litigante_1234.causas[0]
+    movimiento = causa.movimientos[0]
+    incidente = movimiento.incidentes[0].model_copy(update={"fechaCrea": datetime(2020, 1, 1, tzinfo=timezone.utc)})
+    recrawled = causa.model_copy(
+        update={"movimientos": [movimiento.model_copy(update={"incidentes": [incidente]}), *causa.movimientos[1:]]}
+    )
+
+    assert await DBService().persist_causas([recrawled]) == [(causa.idJuicio, "")]
+    assert (await Incidente.get(idIncidente=incidente.idIncidente)).fechaCrea == incidente.fechaCrea
+
+
+async def test_bulk_load_copies_large_sets_through_a_staging_table_on_postgres(postgres_url: str):
+    await Tortoise.init(config=tortoise_config(get_settings()))
+    await migrate()
+    connection = write_connection()
+    judicaturas = [
+        Judicatura(idJudicatura=f"J{index:05}", nombreJudicatura="Unidad Judicial", ciudad="Quito")
+        for index in range(COPY_MIN_ROWS)
+    ]
+    shuffled = random.sample(judicaturas, len(judicaturas))
+
+    async def row_versions() -> dict[str, str]:
+        _, rows = await connection.execute_query('SELECT "idJudicatura", xmin::text AS xmin FROM "judicatura"')
+        return {row["idJudicatura"]: row["xmin"] for row in rows}
+
+    def changed(index: int, **values: str | None) -> Judicatura:
+        return Judicatura(**{"idJudicatura": judicaturas[index].idJudicatura, "ciudad": "Quito", **values})
+
+    with mock.patch.object(upsert_module, "copy_upsert", wraps=upsert_module.copy_upsert) as copy_upsert:
+        inserted = await bulk_load(connection, Judicatura, [*shuffled, judicaturas[0]])
+        # The merge inserts in primary key order, which is the order of the new rows in the heap
+        _, heap_rows = await connection.execute_query('SELECT "idJudicatura" FROM "judicatura" ORDER BY ctid')
+        inserted_versions = await row_versions()
+        unchanged = await bulk_load(connection, Judicatura, shuffled)
+        unchanged_versions = await row_versions()
+        with_nulls = [changed(0, nombreJudicatura=None), changed(1, nombreJudicatura=None), *judicaturas[2:]]
+        nulled = await bulk_load(connection, Judicatura, with_nulls)
+        nulled_again = await bulk_load(
+            connection, Judicatura, [with_nulls[0], changed(1, nombreJudicatura="Unidad Judicial"), *judicaturas[2:]]
+        )
+
+    assert copy_upsert.call_count == 4
+    assert inserted == UpsertResult(inserted=COPY_MIN_ROWS)
+    assert [row["idJudicatura"] for row in heap_rows] == [judicatura.idJudicatura for judicatura in judicaturas]
+    # IS DISTINCT FROM leaves unchanged rows alone instead of writing a new version of each, NULLs included
+    assert unchanged == UpsertResult(unchanged=COPY_MIN_ROWS)
+    assert unchanged_versions == inserted_versions
+    assert nulled == UpsertResult(updated=2, unchanged=COPY_MIN_ROWS - 2)
+    assert nulled_again == UpsertResult(updated=1, unchanged=COPY_MIN_ROWS - 1)
+    assert await Judicatura.filter(nombreJudicatura__isnull=True).values_list("idJudicatura", flat=True) == [
+        judicaturas[0].idJudicatura
+    ]
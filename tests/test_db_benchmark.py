@@ -0,0 +1,63 @@
+import logging
+import time
+from datetime import datetime, timezone
+
+from tortoise import Tortoise
+
+from consulta_pj.crawler.schemas import ActuacionSchema
+from consulta_pj.db_service import CreateActuacionRequest, DBService, UpsertResult
+from consulta_pj.db_service.models import Actuacion, Causa, Incidente, Judicatura, Movimiento
+
+ROWS = 20_000
+
+
+async def create_parents() -> None:
+    await Judicatura.create(idJudicatura="BENCH", ciudad="Quito", nombreJudicatura="Unidad Judicial")
+    await Causa.create(idJuicio="BENCH", nombreDelito="Cobro", fechaIngreso=datetime(2024, 1, 1, tzinfo=timezone.utc))
+    await Movimiento.create(idMovimientoJuicioIncidente=1, causa_id="BENCH")
+    await Incidente.create(
+        idIncidente=1, fechaCrea=datetime(2024, 1, 1, tzinfo=timezone.utc), judicatura_id="BENCH", movimiento_id=1
+    )
+
+
+def actuacion_requests(rows: int) -> list[CreateActuacionRequest]:
+    return [
+        CreateActuacionRequest(
+            actuacion=ActuacionSchema(
+                uuid=f"bench-{index}",
+                codigo=index,
+                fecha=datetime(2024, 1, 1, tzinfo=timezone.utc),
+                tipo="PROVIDENCIA",
+                actividad=f"Actividad {index} " * 10,
+                nombreArchivo=None,
+            ),
+            judicatura_id="BENCH",
+            incidente_id=1,
+        )
+        for index in range(rows)
+    ]
+
+
+async def test_db_bulk_load_benchmark(in_memory_db):
+    # Set TORTOISE_TEST_DB=asyncpg://... to measure the COPY path, SQLite measures the multi-row upsert fallback
+    await create_parents()
+    requests = actuacion_requests(ROWS)
+    db_service = DBService()
+    dialect = Tortoise.get_connection("models").capabilities.dialect
+
+    start = time.perf_counter()
+    await db_service.bulk_create_actuacion(requests)
+    bulk_create_time = time.perf_counter() - start
+    assert await Actuacion.all().count() == ROWS
+    await Actuacion.all().delete()
+
+    start = time.perf_counter()
+    result = await db_service.bulk_upsert_actuacion(requests)
+    bulk_load_time = time.perf_counter() - start
+
+    assert result == UpsertResult(inserted=ROWS)
+    assert await Actuacion.all().count() == ROWS
+    logging.info(
+        f"{dialect}: bulk_create_actuacion {ROWS / bulk_create_time:.0f} rows/s, "
+        f"bulk_upsert_actuacion {ROWS / bulk_load_time:.0f} rows/s"
+    )
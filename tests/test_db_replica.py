@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import math
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator
+
+import pytest
+from tortoise import Tortoise, connections
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+from consulta_pj.crawler import LitiganteTipo
+from consulta_pj.crawler.schemas import InformacionLitigante
+from consulta_pj.db_service import DBService, migrate, tortoise_config
+from consulta_pj.db_service import replica as replica_module
+from consulta_pj.db_service.models import Causa
+from consulta_pj.db_service.replica import REPLICA_CONNECTION, measure_replica_lag
+from consulta_pj.handler import handler
+from consulta_pj.settings import get_settings
+from tests.conftest import database_url
+
+
+@pytest.fixture
+async def primary_and_replica(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> AsyncIterator[None]:
+    # Two independent SQLite files stand in for a primary and a replica that has not caught up yet
+    monkeypatch.setenv("DB_URL", f"sqlite://{tmp_path / 'primary.sqlite3'}")
+    monkeypatch.setenv("DB_REPLICA_URL", f"sqlite://{tmp_path / 'replica.sqlite3'}")
+    monkeypatch.setenv("DB_REPLICA_MAX_LAG", "5")
+    monkeypatch.setenv("DB_REPLICA_LAG_CHECK_INTERVAL", "0")
+    get_settings.cache_clear()
+    await Tortoise.init(config=tortoise_config(get_settings()))
+    await migrate()
+    await migrate(connections.get(REPLICA_CONNECTION))
+    await connections.get(REPLICA_CONNECTION).execute_query(
+        'INSERT INTO "causa" ("idJuicio", "nombreDelito", "fechaIngreso") VALUES (?, ?, ?)',
+        ["REPLICA", "Robo", datetime(2024, 1, 1, tzinfo=timezone.utc).isoformat()],
+    )
+    try:
+        yield
+    finally:
+        await Tortoise.close_connections()
+        get_settings.cache_clear()
+
+
+async def test_read_only_methods_read_from_the_replica(
+    informacion_litigante_1234: InformacionLitigante, primary_and_replica
+):
+    await handler.persist_causas(informacion_litigante_1234)
+    await DBService().bulk_associate_litigantes(
+        LitiganteTipo.ACTOR, {"1234": [causa.idJuicio for causa in informacion_litigante_1234.causas]}
+    )
+    db_service = DBService()
+
+    assert await db_service.get_all_causas_ids() == ["REPLICA"]
+    assert [causa.idJuicio for causa in await db_service.get_serialized_causas_by_id(["REPLICA"])] == ["REPLICA"]
+    assert await db_service.get_causas_by_cedula("1234", LitiganteTipo.ACTOR) == []
+    # Writes and the reads of the crawler stay on the primary
+    assert await Causa.all().count() == len(informacion_litigante_1234.causas)
+    assert len(await db_service.get_causas_markers_by_cedula("1234", LitiganteTipo.ACTOR)) == len(
+        informacion_litigante_1234.causas
+    )
+
+
+async def test_reads_fall_back_to_the_primary_when_the_replica_lags(
+    informacion_litigante_1234: InformacionLitigante, primary_and_replica, monkeypatch: pytest.MonkeyPatch
+):
+    await handler.persist_causas(informacion_litigante_1234)
+    lag = 60.0
+
+    async def measure_replica_lag(connection) -> float:
+        return lag
+
+    monkeypatch.setattr(replica_module, "measure_replica_lag", measure_replica_lag)
+    lagging = await DBService().get_all_causas_ids()
+    lag = 1.0
+    caught_up = await DBService().get_all_causas_ids()
+
+    assert sorted(lagging) == sorted(causa.idJuicio for causa in informacion_litigante_1234.causas)
+    assert caught_up == ["REPLICA"]
+
+
+@pytest.fixture
+async def streaming_replica(postgres_replica_url: str, monkeypatch: pytest.MonkeyPatch) -> BaseDBAsyncClient:
+    monkeypatch.setenv("DB_REPLICA_URL", postgres_replica_url)
+    monkeypatch.setenv("DB_REPLICA_LAG_CHECK_INTERVAL", "0")
+    get_settings.cache_clear()
+    await Tortoise.init(config=tortoise_config(get_settings()))
+    await migrate()
+    replica = connections.get(REPLICA_CONNECTION)
+    await wait_for_wal(replica, "pg_last_wal_replay_lsn()")
+    return replica
+
+
+async def wait_for_wal(replica: BaseDBAsyncClient, position: str) -> None:
+    """Waits until ``position`` of the replica, e.g. ``pg_last_wal_replay_lsn()``, reaches the WAL of the primary."""
+    _, [primary] = await connections.get("default").execute_query("SELECT pg_current_wal_lsn()::text AS lsn")
+    for _ in range(100):
+        _, [row] = await replica.execute_query(f"SELECT {position} >= $1::text::pg_lsn AS reached", [primary["lsn"]])
+        if row["reached"]:
+            return
+        await asyncio.sleep(0.1)
+    pytest.fail(f"{position} of the replica did not reach {primary['lsn']}")
+
+
+def set_max_lag(monkeypatch: pytest.MonkeyPatch, max_lag: float) -> None:
+    monkeypatch.setenv("DB_REPLICA_MAX_LAG", str(max_lag))
+    get_settings.cache_clear()
+
+
+async def test_reads_go_to_a_streaming_replica_only_within_the_max_lag(
+    informacion_litigante_1234: InformacionLitigante, streaming_replica, monkeypatch: pytest.MonkeyPatch
+):
+    await streaming_replica.execute_query("SELECT pg_wal_replay_pause()")
+    await handler.persist_causas(informacion_litigante_1234)
+    # The replica received the new causas but does not replay them, it falls further behind while it waits
+    await wait_for_wal(streaming_replica, "pg_last_wal_receive_lsn()")
+    await asyncio.sleep(0.5)
+
+    set_max_lag(monkeypatch, 60)
+    stale = await DBService().get_all_causas_ids()
+    set_max_lag(monkeypatch, 0.2)
+    current = await DBService().get_all_causas_ids()
+    lag = await measure_replica_lag(streaming_replica)
+
+    assert stale == []
+    assert sorted(current) == sorted(causa.idJuicio for causa in informacion_litigante_1234.causas)
+    assert 0.5 <= lag < 60
+
+
+async def test_reads_fall_back_to_the_primary_when_the_replica_lag_check_fails(
+    informacion_litigante_1234: InformacionLitigante,
+    postgres_replica_url: str,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+):
+    monkeypatch.setenv("DB_REPLICA_URL", database_url(postgres_replica_url, "consulta_pj_missing"))
+    monkeypatch.setenv("DB_REPLICA_LAG_CHECK_INTERVAL", "0")
+    get_settings.cache_clear()
+    await Tortoise.init(config=tortoise_config(get_settings()))
+    await migrate()
+    await handler.persist_causas(informacion_litigante_1234)
+
+    with caplog.at_level(logging.WARNING):
+        causas_ids = await DBService().get_all_causas_ids()
+
+    assert sorted(causas_ids) == sorted(causa.idJuicio for causa in informacion_litigante_1234.causas)
+    assert replica_module._replica_lag.lag == math.inf
+    assert "Measuring the replica lag failed, reading from the primary" in caplog.text
@@ -1,6 +1,31 @@
-from consulta_pj.crawler.schemas import InformacionLitigante
+import asyncio
+import importlib
+from datetime import datetime, timezone
+from typing import AsyncIterator
+from unittest import mock
+
+import pytest
+
+from consulta_pj.client import (
+    CausaActor,
+    CausasRequest,
+    CausasResponse,
+    MovimientosResponse,
+    ProcesosJudicialesClient,
+    ProcesosJudicialesClientException,
+)
+from consulta_pj.crawler.schemas import CrawlProgress, InformacionLitigante, LitiganteSchema, LitiganteTipo
 from consulta_pj.db_service.models import Litigante
-from consulta_pj.handler import handler
+from consulta_pj.handler import handler, planner
+from tests.mocks.client import (
+    get_causas_mocked_data,
+    get_movimientos,
+    mock_get_actuaciones_judiciales,
+    mock_get_movimientos,
+    mock_iter_causas,
+)
+
+write_buffer_module = importlib.import_module("consulta_pj.db_service.write_buffer")
 
 
 async def test_handler_persist_causas(informacion_litigante_1234: InformacionLitigante, in_memory_db):
@@ -10,3 +35,134 @@ async def test_handler_persist_causas(informacion_litigante_1234: InformacionLit
     causas_in_db = await litigante.causas_actor.all()
 
     assert len(causas_in_db) == len(informacion_litigante_1234.causas)
+
+
+async def test_handler_incremental_skips_unchanged_causas(in_memory_db):
+    fecha_providencia = datetime(2024, 7, 1, 12, 30, tzinfo=timezone.utc)
+    upstream_causas = await get_causas_mocked_data(None, CausasRequest(actor=CausaActor(cedulaActor="1234")))
+    upstream_causas = [causa.model_copy(update={"fechaProvidencia": fecha_providencia}) for causa in upstream_causas]
+    crawled_causas: list[str] = []
+
+    async def iter_causas(_, request: CausasRequest, *args, **kwargs) -> AsyncIterator[CausasResponse]:
+        for causa in upstream_causas:
+            yield causa
+
+    async def get_movimientos_tracked(client, causa_id: str) -> MovimientosResponse:
+        crawled_causas.append(causa_id)
+        return await get_movimientos(client, causa_id)
+
+    with (
+        mock.patch.object(ProcesosJudicialesClient, "iter_causas", iter_causas),
+        mock.patch.object(ProcesosJudicialesClient, "get_movimientos", get_movimientos_tracked),
+        mock_get_actuaciones_judiciales,
+    ):
+        first_response = await handler.process_litigante("1234", LitiganteTipo.ACTOR, incremental=True)
+        upstream_causas[0] = upstream_causas[0].model_copy(update={"fechaProvidencia": datetime.now(timezone.utc)})
+        crawled_causas.clear()
+        second_response = await handler.process_litigante("1234", LitiganteTipo.ACTOR, incremental=True)
+
+    litigante = await Litigante.get(cedula="1234")
+    assert first_response is not None and second_response is not None
+    assert (first_response.new, first_response.refreshed, first_response.skipped) == (3, 0, 0)
+    assert (second_response.new, second_response.refreshed, second_response.skipped) == (0, 1, 2)
+    assert crawled_causas == [upstream_causas[0].idJuicio]
+    assert second_response.litigante_updated
+    assert await litigante.causas_actor.all().count() == 3
+
+
+@mock_iter_causas
+@mock_get_actuaciones_judiciales
+async def test_handler_records_a_failing_causa_and_persists_the_others(in_memory_db):
+    causas = await get_causas_mocked_data(None, CausasRequest(actor=CausaActor(cedulaActor="1234")))
+
+    async def get_movimientos_failing(client, causa_id: str) -> MovimientosResponse:
+        if causa_id == causas[1].idJuicio:
+            raise ProcesosJudicialesClientException("Bad gateway", status=502)
+        return await get_movimientos(client, causa_id)
+
+    progress = CrawlProgress()
+    with mock.patch.object(ProcesosJudicialesClient, "get_movimientos", get_movimientos_failing):
+        response = await handler.process_litigante("1234", LitiganteTipo.ACTOR, progress=progress)
+
+    assert response is not None
+    assert sorted(response.successful) == sorted([causas[0].idJuicio, causas[2].idJuicio])
+    assert response.error == {causas[1].idJuicio: "Bad gateway"} == progress.errors
+    assert progress.causas_done == progress.causas_total == 3
+    assert response.litigante_updated
+    litigante = await Litigante.get(cedula="1234")
+    assert await litigante.causas_actor.all().count() == 2
+
+
+@mock_get_actuaciones_judiciales
+async def test_handler_stops_crawling_causas_before_closing_the_client(in_memory_db):
+    causas = await get_causas_mocked_data(None, CausasRequest(actor=CausaActor(cedulaActor="1234")))
+    crawling: set[str] = set()
+
+    async def iter_causas_failing(_, request: CausasRequest, *args, **kwargs) -> AsyncIterator[CausasResponse]:
+        yield causas[0]
+        yield causas[1]
+        await asyncio.sleep(0.01)
+        raise ProcesosJudicialesClientException("Bad gateway", status=502)
+
+    async def get_movimientos_slow(client, causa_id: str) -> MovimientosResponse:
+        crawling.add(causa_id)
+        try:
+            await asyncio.sleep(10)
+        finally:
+            crawling.discard(causa_id)
+        return await get_movimientos(client, causa_id)
+
+    litigante = LitiganteSchema(cedula="1234", tipo=LitiganteTipo.ACTOR)
+    with (
+        mock.patch.object(ProcesosJudicialesClient, "iter_causas", iter_causas_failing),
+        mock.patch.object(ProcesosJudicialesClient, "get_movimientos", get_movimientos_slow),
+    ):
+        with pytest.raises(ProcesosJudicialesClientException):
+            await handler.crawl_and_persist(litigante)
+
+    assert crawling == set()
+
+
+async def test_process_batch_crawls_each_shared_causa_once(in_memory_db):
+    shared_causas = await get_causas_mocked_data(None, CausasRequest(actor=CausaActor(cedulaActor="1234")))
+    causas_by_cedula = {"1111": shared_causas, "2222": shared_causas, "3333": shared_causas[:1]}
+    crawled_causas: list[str] = []
+
+    async def iter_causas(_, request: CausasRequest, *args, **kwargs) -> AsyncIterator[CausasResponse]:
+        for causa in causas_by_cedula[request.actor.cedulaActor]:
+            yield causa
+
+    async def get_movimientos_tracked(client, causa_id: str) -> MovimientosResponse:
+        crawled_causas.append(causa_id)
+        return await get_movimientos(client, causa_id)
+
+    with (
+        mock.patch.object(ProcesosJudicialesClient, "iter_causas", iter_causas),
+        mock.patch.object(ProcesosJudicialesClient, "get_movimientos", get_movimientos_tracked),
+        mock_get_actuaciones_judiciales,
+        mock.patch.object(write_buffer_module, "write_causas", wraps=write_buffer_module.write_causas) as write_causas,
+    ):
+        response = await planner.process_actores(["1111", "2222", "3333", "1111"])
+
+    assert sorted(crawled_causas) == sorted(causa.idJuicio for causa in shared_causas)
+    # The causas crawled together are written in one set-based transaction
+    assert write_causas.call_count == 1
+    assert (response.litigantes, response.causas_referenced, response.causas_crawled) == (3, 7, 3)
+    assert response.dedup_ratio == 7 / 3
+    assert response.associations_created == 7
+    assert not response.error and not response.litigantes_error
+    for cedula, causas in causas_by_cedula.items():
+        litigante = await Litigante.get(cedula=cedula)
+        assert await litigante.causas_actor.all().count() == len(causas)
+
+
+async def test_process_batch_keeps_existing_associations(in_memory_db, informacion_litigante_1234):
+    await handler.persist_causas(informacion_litigante_1234)
+    causas = await get_causas_mocked_data(None, CausasRequest(actor=CausaActor(cedulaActor="1234")))
+
+    with mock_iter_causas, mock_get_movimientos, mock_get_actuaciones_judiciales:
+        response = await planner.process_actores(["1234"])
+
+    litigante = await Litigante.get(cedula="1234")
+    assert response.associations_created == 0
+    assert await litigante.causas_actor.all().count() == len(causas)
@@ -0,0 +1,164 @@
+import asyncio
+from datetime import timedelta
+from pathlib import Path
+from typing import AsyncIterator
+from unittest import mock
+
+import pytest
+from tortoise import Tortoise, timezone
+
+from consulta_pj.client import CausaActor, CausasRequest, CausasResponse, MovimientosResponse, ProcesosJudicialesClient
+from consulta_pj.crawler import InformacionLitigante, LitiganteTipo
+from consulta_pj.db_service import migrate
+from consulta_pj.db_service.models import CrawlJob, Litigante
+from consulta_pj.handler import handler
+from consulta_pj.jobs import JobKind, JobQueue, JobStatus, enqueue_batch, run_batch, run_sharded_batch
+from consulta_pj.settings import get_settings
+from tests.conftest import start_upstream
+from tests.mocks.client import get_causas_mocked_data, get_movimientos, mock_get_actuaciones_judiciales
+from tests.mocks.upstream import UpstreamConfig
+
+
+async def shared_causas() -> list[CausasResponse]:
+    return await get_causas_mocked_data(None, CausasRequest(actor=CausaActor(cedulaActor="1234")))
+
+
+async def test_jobs_run_batch_crawls_each_causa_once(in_memory_db):
+    causas = await shared_causas()
+    causas_by_cedula = {"1111": causas, "2222": causas[1:]}
+    crawled_causas: list[str] = []
+
+    async def iter_causas(_, request: CausasRequest, *args, **kwargs) -> AsyncIterator[CausasResponse]:
+        for causa in causas_by_cedula[request.actor.cedulaActor]:
+            yield causa
+
+    async def get_movimientos_tracked(client, causa_id: str) -> MovimientosResponse:
+        crawled_causas.append(causa_id)
+        return await get_movimientos(client, causa_id)
+
+    batch = await enqueue_batch(list(causas_by_cedula), LitiganteTipo.ACTOR)
+    with (
+        mock.patch.object(ProcesosJudicialesClient, "iter_causas", iter_causas),
+        mock.patch.object(ProcesosJudicialesClient, "get_movimientos", get_movimientos_tracked),
+        mock_get_actuaciones_judiciales,
+    ):
+        stats = await run_batch(batch, workers=3)
+
+    assert sorted(crawled_causas) == sorted(causa.idJuicio for causa in causas)
+    assert (stats.litigantes.done, stats.causas.done, stats.backlog) == (2, 3, 0)
+    assert stats.done_per_minute == 5
+    for cedula, litigante_causas in causas_by_cedula.items():
+        litigante = await Litigante.get(cedula=cedula)
+        assert await litigante.causas_actor.all().count() == len(litigante_causas)
+
+
+async def test_jobs_claim_is_exclusive(in_memory_db):
+    queue = JobQueue()
+    await queue.enqueue_litigantes("batch", ["1111", "2222", "3333"], LitiganteTipo.ACTOR)
+
+    first = await queue.claim("batch", "worker-1", limit=2)
+    second = await queue.claim("batch", "worker-2", limit=2)
+
+    assert [job.key for job in first] == ["1111", "2222"]
+    assert [job.key for job in second] == ["3333"]
+    assert await queue.claim("batch", "worker-3") == []
+    assert all(job.attempts == 1 and job.status == JobStatus.RUNNING for job in first + second)
+
+
+async def test_jobs_failed_job_is_retried_until_max_attempts(in_memory_db):
+    queue = JobQueue(max_attempts=2)
+    await queue.enqueue_litigantes("batch", ["1111"], LitiganteTipo.ACTOR)
+
+    [job] = await queue.claim("batch", "worker")
+    assert await queue.fail(job, "timeout") == JobStatus.PENDING
+    [job] = await queue.claim("batch", "worker")
+    assert await queue.fail(job, "timeout") == JobStatus.FAILED
+
+    assert await queue.claim("batch", "worker") == []
+    assert not await queue.has_unfinished("batch")
+
+
+async def test_jobs_lease_is_renewed_while_the_job_runs(in_memory_db):
+    queue = JobQueue(lease_timeout=0.3)
+    await queue.enqueue_litigantes("batch", ["1111", "2222"], LitiganteTipo.ACTOR)
+    [running, abandoned] = await queue.claim("batch", "worker", limit=2)
+
+    async with queue.leased(running):
+        await asyncio.sleep(0.5)
+        assert await queue.requeue_stale("batch") == 1
+
+    [reclaimed] = await queue.claim("batch", "other-worker")
+    assert reclaimed.key == abandoned.key
+    assert await queue.complete(running)
+    assert not await queue.complete(abandoned)
+    assert await queue.fail(abandoned, "timeout") is None
+    assert (await CrawlJob.get(id=abandoned.id)).worker == "other-worker"
+
+
+async def test_jobs_run_batch_resumes_interrupted_batch(
+    informacion_litigante_1234: InformacionLitigante, in_memory_db
+):
+    causas = await shared_causas()
+    queue = JobQueue()
+    batch = await enqueue_batch(["1234"], LitiganteTipo.ACTOR)
+    # A previous run listed the causas, finished the first one and died while crawling the second one
+    [litigante_job] = await queue.claim(batch, "dead-worker")
+    await queue.enqueue_causas(batch, causas)
+    await queue.complete(litigante_job, [causa.idJuicio for causa in causas])
+    causa_jobs = await queue.claim(batch, "dead-worker", limit=2)
+    await handler.process_causa(informacion_litigante_1234.causas[0])
+    await queue.complete(causa_jobs[0])
+    await CrawlJob.filter(id=causa_jobs[1].id).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+    crawled_causas: list[str] = []
+
+    async def get_movimientos_tracked(client, causa_id: str) -> MovimientosResponse:
+        crawled_causas.append(causa_id)
+        return await get_movimientos(client, causa_id)
+
+    with (
+        mock.patch.object(ProcesosJudicialesClient, "get_movimientos", get_movimientos_tracked),
+        mock_get_actuaciones_judiciales,
+    ):
+        stats = await run_batch(batch, workers=2)
+
+    resumed = await CrawlJob.get(id=causa_jobs[1].id)
+    assert crawled_causas == [causa.idJuicio for causa in causas[1:]]
+    assert resumed.status == JobStatus.DONE and resumed.attempts == 2
+    assert (stats.causas.done, stats.backlog) == (3, 0)
+    litigante = await Litigante.get(cedula="1234")
+    assert await litigante.causas_actor.all().count() == 3
+    assert await CrawlJob.filter(batch=batch, kind=JobKind.CAUSA).count() == 3
+
+
+async def test_jobs_run_sharded_batch(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    server = await start_upstream(UpstreamConfig(causas_per_litigante=3, fixtures_path=None), monkeypatch)
+    db_url = f"sqlite://{tmp_path / 'jobs.sqlite3'}"
+    monkeypatch.setenv("DB_URL", db_url)
+    monkeypatch.setenv("UPSTREAM_RATE_LIMIT", "1000")
+    monkeypatch.setenv("UPSTREAM_RATE_BUDGET_PATH", str(tmp_path / "upstream_rate"))
+    monkeypatch.setenv("JOBS_POLL_INTERVAL", "0.05")
+    get_settings.cache_clear()
+    await Tortoise.init(db_url=db_url, modules={"models": ["consulta_pj.db_service.models"]})
+    await migrate()
+    try:
+        batch = await enqueue_batch([f"SHARD-{index}" for index in range(4)], LitiganteTipo.ACTOR)
+        stats = await run_sharded_batch(batch, processes=2, workers=2, report_interval=0.2)
+        litigantes = await Litigante.all().count()
+    finally:
+        await Tortoise.close_connections()
+        await server.stop()
+        get_settings.cache_clear()
+
+    assert (stats.batch.litigantes.done, stats.batch.causas.done, stats.batch.backlog) == (4, 12, 0)
+    assert [shard.shard for shard in stats.shards] == [0, 1]
+    assert all(shard.finished for shard in stats.shards)
+    assert stats.work.done == 16 and stats.work.failed == 0
+    assert stats.associations == 12 and litigantes == 4
+    # Pages requested ahead of the last page of a litigante are cancelled in flight, every other request succeeds
+    successes = sum(shard.upstream.limiter.successes for shard in stats.shards)
+    assert sum(server.requests.values()) - server.requests["buscarCausas"] + 4 <= successes
+    assert successes <= sum(server.requests.values())
+    # Every shard reports the same shared rate budget, the last one to finish has seen all the requests
+    assert max(shard.upstream.rate.granted for shard in stats.shards if shard.upstream.rate) == sum(
+        server.requests.values()
+    )
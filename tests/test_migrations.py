@@ -0,0 +1,169 @@
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+from tortoise import Tortoise
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.utils import get_schema_sql
+
+from consulta_pj.crawler import InformacionLitigante, LitiganteTipo
+from consulta_pj.db_service import DBService, migrate, sequential_scans
+from consulta_pj.db_service.migrations import load_migrations
+from consulta_pj.db_service.models import Actuacion, Causa, Implicado, Incidente, Judicatura, Movimiento
+from consulta_pj.db_service.rows import CausaRows
+from consulta_pj.handler import handler
+
+CAUSAS = 300
+MOVIMIENTOS_PER_CAUSA = 3
+INCIDENTES_PER_MOVIMIENTO = 2
+ACTUACIONES_PER_INCIDENTE = 5
+LITIGANTES = 1000
+BASELINE_SCHEMA = Path("tests/fixtures/baseline_schema_sqlite.sql")
+
+
+async def schema_columns(connection: BaseDBAsyncClient) -> set[tuple[str, str]]:
+    if connection.capabilities.dialect == "sqlite":
+        query = (
+            "SELECT m.name AS table_name, p.name AS column_name FROM sqlite_master m "
+            "JOIN pragma_table_info(m.name) p WHERE m.type = 'table'"
+        )
+    else:
+        query = "SELECT table_name, column_name FROM information_schema.columns WHERE table_schema = current_schema()"
+    _, rows = await connection.execute_query(query)
+    return {(row["table_name"], row["column_name"]) for row in rows}
+
+
+async def test_migrate_creates_the_schema_of_the_models(in_memory_db):
+    connection = Causa._meta.db
+    migrated = await schema_columns(connection)
+
+    # A model changed without a migration would make generate_schemas create tables or columns
+    await connection.execute_script(get_schema_sql(connection, safe=True))
+
+    assert await schema_columns(connection) == migrated
+    assert await migrate() == []
+
+
+async def test_migrate_adopts_a_database_created_by_generate_schemas(
+    informacion_litigante_1234: InformacionLitigante, tmp_path: Path
+):
+    await Tortoise.init(
+        db_url=f"sqlite://{tmp_path / 'legacy.sqlite3'}", modules={"models": ["consulta_pj.db_service.models"]}
+    )
+    try:
+        connection = Causa._meta.db
+        # The schema generate_schemas created for the models of the baseline, before versioned migrations
+        await connection.execute_script(BASELINE_SCHEMA.read_text())
+        await connection.execute_query(
+            'INSERT INTO "causa" ("idJuicio", "nombreDelito", "fechaIngreso") VALUES (?, ?, ?)',
+            ["1234", "Robo", datetime(2024, 1, 1, tzinfo=timezone.utc).isoformat()],
+        )
+
+        applied = await migrate()
+        columns = await schema_columns(connection)
+        _, indexes = await connection.execute_query(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'"
+        )
+        await handler.persist_causas(informacion_litigante_1234)
+        causa = informacion_litigante_1234.causas[0]
+        persisted = await Causa.get(idJuicio=causa.idJuicio)
+
+        assert applied == [migration.version for migration in load_migrations()]
+        assert await migrate() == []
+        assert {("causa", "fechaProvidencia"), ("causa", "idEstadoJuicio"), ("causa", "estadoActual")} <= columns
+        assert ("crawl_job", "heartbeat_at") in columns
+        assert {"idx_movimiento_causa", "idx_actuacion_incidente"} <= {row["name"] for row in indexes}
+        assert await Causa.filter(idJuicio="1234", estadoActual=None).exists()
+        assert (persisted.estadoActual, persisted.idEstadoJuicio) == (causa.estadoActual, causa.idEstadoJuicio)
+        assert causa.estadoActual is not None
+    finally:
+        await Tortoise.close_connections()
+
+
+async def seed_large_dataset() -> None:
+    rows = CausaRows()
+    fecha = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for causa_index in range(CAUSAS):
+        id_juicio = f"{causa_index:014d}"
+        rows.causas[id_juicio] = Causa(idJuicio=id_juicio, nombreDelito="Cobro", fechaIngreso=fecha)
+        id_judicatura = f"J{causa_index}"
+        rows.judicaturas[id_judicatura] = Judicatura(
+            idJudicatura=id_judicatura, nombreJudicatura="Unidad Judicial", ciudad="Quito"
+        )
+        for movimiento_index in range(MOVIMIENTOS_PER_CAUSA):
+            id_movimiento = causa_index * MOVIMIENTOS_PER_CAUSA + movimiento_index
+            rows.movimientos[id_movimiento] = Movimiento(idMovimientoJuicioIncidente=id_movimiento, causa_id=id_juicio)
+            for incidente_index in range(INCIDENTES_PER_MOVIMIENTO):
+                id_incidente = id_movimiento * INCIDENTES_PER_MOVIMIENTO + incidente_index
+                rows.incidentes[id_incidente] = Incidente(
+                    idIncidente=id_incidente, fechaCrea=fecha, judicatura_id=id_judicatura, movimiento_id=id_movimiento
+                )
+                rows.implicados[id_incidente] = Implicado(id=id_incidente, nombre="Implicado")
+                rows.incidentes_actor.add((id_incidente, id_incidente))
+                rows.incidentes_demandado.add((id_incidente, id_incidente))
+                for actuacion_index in range(ACTUACIONES_PER_INCIDENTE):
+                    uuid = f"{id_incidente}-{actuacion_index}"
+                    rows.actuaciones[uuid] = Actuacion(
+                        uuid=uuid,
+                        codigo=actuacion_index,
+                        fecha=fecha,
+                        tipo="PROVIDENCIA",
+                        actividad="Actividad",
+                        judicatura_id=id_judicatura,
+                        incidente_id=id_incidente,
+                    )
+    await rows.write(Causa._meta.db)
+    causas_by_cedula = {
+        f"{index:010d}": [f"{(index + offset) % CAUSAS:014d}" for offset in range(3)] for index in range(LITIGANTES)
+    }
+    for tipo in LitiganteTipo:
+        await DBService().bulk_associate_litigantes(tipo, causas_by_cedula)
+    await Causa._meta.db.execute_script("ANALYZE")
+
+
+async def read_path_scans(caplog: pytest.LogCaptureFixture) -> dict[str, list[str]]:
+    """Sequential scans of every SELECT the read methods of ``DBService`` issue on the seeded dataset."""
+    id_juicio = f"{CAUSAS // 2:014d}"
+    cedula = f"{LITIGANTES // 2:010d}"
+    db_service = DBService()
+    caplog.clear()
+    with caplog.at_level(logging.DEBUG, logger="tortoise.db_client"):
+        await db_service.get_actuaciones_by_causa_id(id_juicio)
+        await db_service.get_serialized_causas_by_id([id_juicio])
+        await db_service.get_actuaciones_by_incidente(CAUSAS)
+        for tipo in LitiganteTipo:
+            await db_service.get_causas_by_cedula(cedula, tipo)
+            await db_service.get_causas_markers_by_cedula(cedula, tipo)
+    queries = {
+        record.args[0]: list(record.args[1] or [])
+        for record in caplog.records
+        if record.name == "tortoise.db_client"
+        and isinstance(record.args, tuple)
+        and record.args[0].startswith("SELECT")
+    }
+    assert len(queries) > 10
+    return {sql: await sequential_scans(Causa._meta.db, sql, values) for sql, values in queries.items()}
+
+
+async def test_read_path_queries_use_indexes(in_memory_db, caplog: pytest.LogCaptureFixture):
+    await seed_large_dataset()
+
+    scans = await read_path_scans(caplog)
+
+    assert {sql: tables for sql, tables in scans.items() if tables} == {}
+
+
+@pytest.mark.parametrize(
+    "index,table",
+    [("idx_movimiento_causa", "movimiento"), ("idx_actuacion_incidente", "actuacion")],
+)
+async def test_read_path_check_detects_a_missing_index(
+    index: str, table: str, in_memory_db, caplog: pytest.LogCaptureFixture
+):
+    await seed_large_dataset()
+    await Causa._meta.db.execute_script(f'DROP INDEX "{index}"')
+
+    scans = await read_path_scans(caplog)
+
+    assert table in {scanned for tables in scans.values() for scanned in tables}